@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import random
+import time
+from pathlib import Path
+from typing import AsyncIterator, Dict, Iterable, Optional, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from html_cache import CacheEntry, HtmlCache
+from proxy_pool import ProxyPool
+from rate_limiter import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class _HostLimiter:
+    """Caps in-flight requests and spaces request starts for a single host."""
+
+    def __init__(self, concurrency: int, rate: Optional[float]):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait_turn(self) -> None:
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class AsyncHtmlFetcher:
+    """
+    asyncio counterpart of ``ProxyHtmlFetcher``: same cache layout and proxy pool hooks, but every
+    request shares one aiohttp connection pool and runs as a coroutine instead of a thread.
+
+    Requests are limited per host (``per_host_concurrency`` in flight, at most ``per_host_rate``
+    starts per second) and retried with jittered exponential backoff. Use as an async context manager.
+    """
+
+    def __init__(self,
+                 cache_root: Path,
+                 pool: Optional[ProxyPool] = None,
+                 per_request_timeout: float = 7.0,
+                 max_retries: int = 3,
+                 per_host_concurrency: int = 4,
+                 per_host_rate: Optional[float] = None,
+                 max_connections: int = 100,
+                 backoff_base: float = 0.5,
+                 backoff_max: float = 30.0,
+                 limiter: Optional[RateLimiter] = None):
+        self.cache = HtmlCache(cache_root)
+        self.pool = pool
+        self.per_request_timeout = per_request_timeout
+        self.max_retries = max_retries
+        self.per_host_concurrency = per_host_concurrency
+        self.per_host_rate = per_host_rate
+        self.max_connections = max_connections
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.limiter = limiter
+        self._hosts: Dict[str, _HostLimiter] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.per_host_concurrency)
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.per_request_timeout),
+            headers={"User-Agent": "Mozilla/5.0"},
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._session.close()
+        self._session = None
+
+    def _limiter(self, url: str) -> _HostLimiter:
+        host = urlsplit(url).netloc
+        if host not in self._hosts:
+            self._hosts[host] = _HostLimiter(self.per_host_concurrency, self.per_host_rate)
+        return self._hosts[host]
+
+    def _backoff(self, attempt: int) -> float:
+        # "full jitter": uniform over [0, base * 2^attempt], capped
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def fetch_and_cache(self, url: str, force: bool = False, max_age: Optional[float] = None) -> Path:
+        """Same contract as ``ProxyHtmlFetcher.fetch_and_cache``, including conditional revalidation."""
+        entry = self.cache.lookup(url)
+        fresh = entry is not None and entry.path.exists() and (
+            max_age is None or time.time() - entry.fetched_at <= max_age
+        )
+        if fresh and not force:
+            return entry.path
+
+        # single flight: every caller awaits the same task; shield so one cancelled caller
+        # does not cancel the fetch for the others
+        task = self._inflight.get(url)
+        if task is None:
+            task = self._inflight[url] = asyncio.create_task(self._fetch(url, entry))
+            task.add_done_callback(lambda _: self._inflight.pop(url, None))
+        return await asyncio.shield(task)
+
+    async def _fetch(self, url: str, entry: Optional[CacheEntry]) -> Path:
+        headers = {}
+        # validators only while the body is still on disk, otherwise a 304 would return a missing path
+        if entry is not None and entry.path.exists():
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+        limiter = self._limiter(url)
+        last_exc = None
+        for attempt in range(1, self.max_retries + 1):
+            proxy = None
+            if self.pool is not None:
+                # ProxyPool.get may wait for a proxy (or refill inline without its thread), keep it off the event loop
+                proxy = await asyncio.to_thread(self.pool.get)
+                if not proxy:
+                    await asyncio.sleep(self._backoff(attempt))
+                    continue
+            limiter_key = f"{urlsplit(url).netloc}@{proxy}" if proxy else urlsplit(url).netloc
+            try:
+                async with limiter.semaphore:
+                    await limiter.wait_turn()
+                    if self.limiter:
+                        # reserve/report may block on the shared SQLite bucket, keep them off the event loop
+                        await asyncio.sleep(await asyncio.to_thread(self.limiter.reserve, limiter_key))
+                    started = time.monotonic()
+                    async with self._session.get(url, proxy=f"http://{proxy}" if proxy else None,
+                                                 headers=headers) as resp:
+                        body = await resp.text() if resp.status == 200 else None
+                        status = resp.status
+                        validators = resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+                    elapsed = time.monotonic() - started
+                if self.limiter:
+                    await asyncio.to_thread(self.limiter.report, limiter_key, status)
+                if status == 304:
+                    await asyncio.to_thread(self.cache.touch, url, *validators)
+                    if proxy:
+                        self.pool.mark_good(proxy, elapsed)
+                    return entry.path
+                if body:
+                    path = await asyncio.to_thread(self.cache.put, url, body, status, *validators)
+                    if proxy:
+                        self.pool.mark_good(proxy, elapsed)
+                    return path
+                if proxy:
+                    self.pool.mark_bad(proxy)
+                last_exc = RuntimeError(f"HTTP {status} for {url}")
+                if status not in RETRY_STATUSES:
+                    break
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                last_exc = e
+                if proxy:
+                    self.pool.mark_bad(proxy)
+            await asyncio.sleep(self._backoff(attempt))
+
+        if last_exc:
+            raise last_exc
+        raise RuntimeError(f"Failed to fetch {url} after {self.max_retries} attempts")
+
+    async def iter_fetch(self, urls: Iterable[str], max_in_flight: int = 200,
+                         force: bool = False) -> AsyncIterator[Tuple[str, Path]]:
+        """
+        Yield ``(url, path)`` as pages complete, in completion order. At most ``max_in_flight`` tasks
+        exist at a time, so memory stays flat however many URLs are passed. Failures are logged and skipped.
+        """
+        url_iter = iter(urls)
+        in_flight: Dict[asyncio.Task, str] = {}
+
+        def top_up():
+            for url in url_iter:
+                in_flight[asyncio.create_task(self.fetch_and_cache(url, force))] = url
+                if len(in_flight) >= max_in_flight:
+                    break
+
+        top_up()
+        while in_flight:
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                url = in_flight.pop(task)
+                try:
+                    yield url, task.result()
+                except Exception as e:
+                    logger.warning("Failed to cache %s: %s", url, e)
+            top_up()
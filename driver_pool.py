@@ -0,0 +1,191 @@
+import atexit
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from queue import Queue, Empty
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _PooledDriver:
+    """A WebDriver plus the bookkeeping needed to decide when to recycle it."""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.created_at = time.time()
+        self.pages = 0
+        self.baseline_heap = None
+
+
+class DriverPool:
+    """
+    Bounded pool of long-lived Selenium drivers.
+
+    Drivers are created lazily up to ``max_size`` and handed out with ``checkout()``. A driver is
+    recycled (quit and replaced on next demand) once it has served ``max_pages`` pages, when its JS
+    heap has grown more than ``max_heap_growth_mb`` since it was created, or when it fails a health
+    check.
+    """
+
+    def __init__(self,
+                 factory: Callable,
+                 max_size: int = 2,
+                 max_pages: int = 200,
+                 max_heap_growth_mb: float = 512.0,
+                 checkout_timeout: float = 300.0):
+        self.factory = factory
+        self.max_size = max_size
+        self.max_pages = max_pages
+        self.max_heap_growth_mb = max_heap_growth_mb
+        self.checkout_timeout = checkout_timeout
+
+        self._lock = threading.Lock()
+        self._idle: Queue = Queue()
+        self._created = 0
+        self._all = set()
+        self._closed = False
+
+    def _new_driver(self) -> _PooledDriver:
+        started = time.time()
+        item = _PooledDriver(self.factory())
+        item.baseline_heap = self._heap_mb(item)
+        logger.debug("Started driver in %.2fs", time.time() - started)
+        return item
+
+    @staticmethod
+    def _heap_mb(item: _PooledDriver) -> Optional[float]:
+        try:
+            used = item.driver.execute_script(
+                "return window.performance && performance.memory ? performance.memory.usedJSHeapSize : null"
+            )
+        except Exception:
+            return None
+        return used / (1024 * 1024) if used else None
+
+    def _is_healthy(self, item: _PooledDriver) -> bool:
+        try:
+            # cheap round-trip that fails if the browser or session has died
+            item.driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def _needs_recycle(self, item: _PooledDriver) -> bool:
+        if item.pages >= self.max_pages:
+            logger.debug("Recycling driver after %d pages", item.pages)
+            return True
+        heap = self._heap_mb(item)
+        if heap is not None and item.baseline_heap is not None:
+            if heap - item.baseline_heap > self.max_heap_growth_mb:
+                logger.debug("Recycling driver after heap grew to %.0f MB", heap)
+                return True
+        return False
+
+    def _discard(self, item: _PooledDriver) -> None:
+        with self._lock:
+            if item not in self._all:
+                return
+            self._all.discard(item)
+            self._created -= 1
+        try:
+            item.driver.quit()
+        except Exception:
+            logger.debug("Error while quitting driver", exc_info=True)
+
+    def _acquire(self) -> _PooledDriver:
+        deadline = time.time() + self.checkout_timeout
+        while True:
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("DriverPool is closed")
+            try:
+                item = self._idle.get_nowait()
+            except Empty:
+                item = None
+                with self._lock:
+                    can_create = self._created < self.max_size
+                    if can_create:
+                        self._created += 1
+                if can_create:
+                    try:
+                        item = self._new_driver()
+                    except Exception:
+                        with self._lock:
+                            self._created -= 1
+                        raise
+                    with self._lock:
+                        self._all.add(item)
+                    return item
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise TimeoutError("Timed out waiting for a free driver")
+                try:
+                    item = self._idle.get(timeout=min(remaining, 1.0))
+                except Empty:
+                    continue
+            if self._is_healthy(item):
+                return item
+            logger.info("Discarding unhealthy driver")
+            self._discard(item)
+
+    def _release(self, item: _PooledDriver, broken: bool = False) -> None:
+        item.pages += 1
+        with self._lock:
+            closed = self._closed
+        if broken or closed or self._needs_recycle(item):
+            self._discard(item)
+        else:
+            self._idle.put(item)
+
+    @contextmanager
+    def checkout(self):
+        """Borrow a driver for the duration of the ``with`` block."""
+        item = self._acquire()
+        broken = False
+        try:
+            yield item.driver
+        except Exception:
+            # the page may have left the browser in a bad state, let the health check decide
+            broken = not self._is_healthy(item)
+            raise
+        finally:
+            self._release(item, broken)
+
+    def close(self) -> None:
+        """Quit every driver, idle or not, and refuse further checkouts."""
+        with self._lock:
+            self._closed = True
+            items = list(self._all)
+        for item in items:
+            self._discard(item)
+        while True:
+            try:
+                self._idle.get_nowait()
+            except Empty:
+                break
+
+
+_default_pool: Optional[DriverPool] = None
+_default_lock = threading.Lock()
+
+
+def get_driver_pool(factory: Optional[Callable] = None, **kwargs) -> DriverPool:
+    """Return the process-wide pool, creating it on first use."""
+    global _default_pool
+    with _default_lock:
+        if _default_pool is None:
+            if factory is None:
+                raise ValueError("factory is required to create the driver pool")
+            _default_pool = DriverPool(factory, **kwargs)
+            atexit.register(shutdown_driver_pool)
+        return _default_pool
+
+
+def shutdown_driver_pool() -> None:
+    global _default_pool
+    with _default_lock:
+        pool, _default_pool = _default_pool, None
+    if pool is not None:
+        pool.close()
@@ -0,0 +1,299 @@
+"""
+Static-HTML parsers for fbref pages.
+
+These work on raw page HTML (from ``driver.page_source``, ``ProxyHtmlFetcher`` or a saved file) and walk
+the tree once with lxml/XPath, so parsing a match report costs milliseconds instead of hundreds of
+WebDriver round-trips.
+"""
+import logging
+import re
+from urllib.parse import urljoin
+
+from lxml import html as lxml_html
+
+logger = logging.getLogger(__name__)
+
+BASE_URL = "https://fbref.com"
+
+STAT_KEYS = [
+    "xg",
+    "xga",
+    "shots",
+    "shots_on_target",
+    "shots_on_target_pct",
+    "corners",
+    "fouls",
+    "yellow",
+    "red",
+    "possession",
+    "crosses",
+    "touches",
+    "tackles",
+    "interceptions",
+    "aerials_won",
+    "clearances",
+    "long_balls",
+    "passes",
+    "passes_completed",
+    "pass_accuracy",
+    "saves",
+    "saves_total",
+    "save_pct",
+]
+
+# labels of the team_stats_extra grid mapped to our column names
+EXTRA_LABELS = {
+    "fouls": "fouls",
+    "corners": "corners",
+    "crosses": "crosses",
+    "touches": "touches",
+    "tackles": "tackles",
+    "interceptions": "interceptions",
+    "aerials won": "aerials_won",
+    "clearances": "clearances",
+    "long balls": "long_balls",
+}
+
+# label in team_stats -> (made, total, pct) column names
+RATIO_LABELS = {
+    "passing accuracy": ("passes_completed", "passes", "pass_accuracy"),
+    "shots on target": ("shots_on_target", "shots", "shots_on_target_pct"),
+    "saves": ("saves", "saves_total", "save_pct"),
+}
+
+_COMMENT_RE = re.compile(r"<!--|-->")
+
+
+def parse_document(page_html: str):
+    """
+    Parse a page into an lxml tree. fbref ships several tables inside HTML comments and un-comments
+    them with JS, so the comment markers are dropped before parsing.
+    """
+    return lxml_html.fromstring(_COMMENT_RE.sub("", page_html))
+
+
+def _text(el) -> str:
+    return el.text_content().replace("\xa0", " ").strip()
+
+
+def _has_class(cls: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {cls} ')"
+
+
+def _parse_percent(text: str) -> float | None:
+    match = re.search(r"(\d+(?:\.\d+)?)", text)
+    return float(match.group(1)) if match else None
+
+
+def _parse_ratio(text: str):
+    # fbref writes "403 of 497 — 81%" for the home side and "81% — 403 of 497" for the away side
+    of_match = re.search(r"(\d+)\s+of\s+(\d+)", text)
+    pct_match = re.search(r"(\d+(?:\.\d+)?)\s*%", text)
+    if of_match:
+        made, total = int(of_match.group(1)), int(of_match.group(2))
+    else:
+        nums = re.findall(r"\d+", text)
+        made = int(nums[0]) if len(nums) > 0 else None
+        total = int(nums[1]) if len(nums) > 1 else None
+    if pct_match:
+        pct = float(pct_match.group(1))
+    else:
+        pct = (made / total * 100) if made is not None and total else None
+    return made, total, pct
+
+
+def _parse_number(text: str) -> int | None:
+    match = re.search(r"\d+", text)
+    return int(match.group(0)) if match else None
+
+
+def _parse_score(score_text: str, home: str, away: str):
+    # drop shootout annotations such as "(4) 1–1 (3)"
+    score_text = re.sub(r"\(\d+\)", "", score_text).strip()
+    if not score_text:
+        return None, None
+    parts = re.split(r"[-–—]", score_text)
+    if len(parts) < 2:
+        logger.warning("Unexpected score format '%s' for %s vs %s", score_text, home, away)
+        return None, None
+    try:
+        return int(parts[0]), int(parts[1])
+    except ValueError:
+        logger.warning("Invalid score numbers '%s' for %s vs %s", score_text, home, away)
+        return None, None
+
+
+def parse_league_links_html(page_html: str, base_url: str = BASE_URL):
+    """Return ``(men, women)`` dicts of league name -> {url, gender} from the competitions index."""
+    doc = parse_document(page_html)
+    men_league_dict, women_league_dict = {}, {}
+    for table_id in ["comps_1_fa_club_league_senior", "comps_2_fa_club_league_senior"]:
+        for row in doc.xpath(f"//table[@id='{table_id}']/tbody/tr"):
+            cols = row.xpath("./td")
+            links = row.xpath("./th[1]//a")
+            if not cols or not links:
+                continue
+            gender = _text(cols[0])
+            target = men_league_dict if gender == "M" else women_league_dict
+            target[_text(links[0])] = {"url": urljoin(base_url, links[0].get("href")), "gender": gender}
+    return men_league_dict, women_league_dict
+
+
+def parse_season_links_html(page_html: str, base_url: str = BASE_URL) -> dict:
+    """Return season name -> season URL from a competition history page."""
+    doc = parse_document(page_html)
+    return {
+        _text(link): urljoin(base_url, link.get("href"))
+        for link in doc.xpath("//table[@id='seasons']/tbody//th//a[1]")
+    }
+
+
+def parse_scores_and_fixtures_link(page_html: str, base_url: str = BASE_URL) -> str | None:
+    """Return the Scores & Fixtures URL linked from a season page's navigation bar."""
+    doc = parse_document(page_html)
+    hrefs = doc.xpath("//*[@id='inner_nav']//a[normalize-space(.)='Scores & Fixtures']/@href")
+    return urljoin(base_url, hrefs[0]) if hrefs else None
+
+
+def parse_fixtures_html(page_html: str, base_url: str = BASE_URL) -> list:
+    """Return the list of fixture dicts from a Scores & Fixtures page."""
+    doc = parse_document(page_html)
+    fixtures = []
+    tables = doc.xpath("//table[contains(@id,'sched')][.//th[@data-stat='home_team']]")
+    if not tables:
+        logger.warning("No fixtures table found")
+        return fixtures
+    rows = tables[0].xpath(
+        ".//tbody/tr[not(contains(@class,'spacer')) and not(contains(@class,'thead'))]"
+    )
+    for row in rows:
+        cells = {c.get("data-stat"): c for c in row.xpath("./*[@data-stat]")}
+        date_cell = cells.get("date")
+        if date_cell is None:
+            continue
+        match_date = _text(date_cell)
+        if not match_date:
+            continue
+        home = _text(cells["home_team"]) if "home_team" in cells else ""
+        away = _text(cells["away_team"]) if "away_team" in cells else ""
+        score_cell = cells.get("score")
+        home_g, away_g = _parse_score(_text(score_cell), home, away) if score_cell is not None else (None, None)
+        report_url = None
+        report_cell = cells.get("match_report")
+        if report_cell is not None:
+            # unplayed fixtures link to a head-to-head page instead of a match report
+            hrefs = report_cell.xpath(".//a[contains(@href,'/matches/')]/@href")
+            if hrefs:
+                report_url = urljoin(base_url, hrefs[0])
+        fixtures.append(
+            {
+                "date": match_date,
+                "home": home,
+                "away": away,
+                "home_g": home_g,
+                "away_g": away_g,
+                "url": report_url,
+            }
+        )
+    return fixtures
+
+
+def _parse_scorebox(doc, stats: dict):
+    penalties = (None, None)
+    scoreboxes = doc.xpath(f"//div[{_has_class('scorebox')}]")
+    if not scoreboxes:
+        return penalties
+    scorebox = scoreboxes[0]
+
+    xg_divs = scorebox.xpath(f".//div[{_has_class('score_xg')}]")
+    if len(xg_divs) >= 2:
+        try:
+            stats["home"]["xg"] = float(_text(xg_divs[0]))
+            stats["away"]["xg"] = float(_text(xg_divs[1]))
+        except ValueError:
+            logger.debug("Unparseable score_xg values")
+
+    pen_divs = scorebox.xpath(f".//div[{_has_class('score_pen')}]")
+    if len(pen_divs) >= 2:
+        home_pen, away_pen = _parse_number(_text(pen_divs[0])), _parse_number(_text(pen_divs[1]))
+        if home_pen is not None and away_pen is not None:
+            return home_pen, away_pen
+    # innermost div that mentions the shootout, e.g. "Chelsea won 4-3 on penalties"
+    for div in scorebox.xpath(".//div[contains(., 'enalties') and not(.//div[contains(., 'enalties')])]"):
+        nums = re.findall(r"\d+", _text(div))
+        if len(nums) >= 2:
+            penalties = (int(nums[0]), int(nums[1]))
+        break
+    return penalties
+
+
+def _count_cards(cell, cls: str) -> int:
+    return len(cell.xpath(f".//*[{_has_class(cls)}]"))
+
+
+def _parse_team_stats(doc, stats: dict) -> bool:
+    tables = doc.xpath("//div[@id='team_stats']//table")
+    if not tables:
+        return False
+    rows = tables[0].xpath(".//tr")
+    i = 0
+    while i < len(rows):
+        ths = rows[i].xpath("./th")
+        tds = rows[i].xpath("./td")
+        if len(ths) == 1 and not tds and i + 1 < len(rows):
+            # label row followed by data row
+            label = _text(ths[0]).lower()
+            cells = rows[i + 1].xpath("./td")
+            i += 2
+        elif len(ths) == 1 and len(tds) >= 2:
+            # label and data in same row
+            label = _text(ths[0]).lower()
+            cells = tds
+            i += 1
+        else:
+            i += 1
+            continue
+        if len(cells) < 2:
+            continue
+        home_cell, away_cell = cells[0], cells[-1]
+        if label == "possession":
+            stats["home"]["possession"] = _parse_percent(_text(home_cell))
+            stats["away"]["possession"] = _parse_percent(_text(away_cell))
+        elif label in RATIO_LABELS:
+            keys = RATIO_LABELS[label]
+            for side, cell in (("home", home_cell), ("away", away_cell)):
+                stats[side].update(zip(keys, _parse_ratio(_text(cell))))
+        elif label == "cards":
+            for side, cell in (("home", home_cell), ("away", away_cell)):
+                second_yellow = _count_cards(cell, "yellow_red_card")
+                stats[side]["yellow"] = _count_cards(cell, "yellow_card") + second_yellow
+                stats[side]["red"] = _count_cards(cell, "red_card") + second_yellow
+    return True
+
+
+def _parse_team_stats_extra(doc, stats: dict) -> bool:
+    extra = doc.xpath("//div[@id='team_stats_extra']")
+    if not extra:
+        return False
+    # each group is a flat grid of divs: three header cells, then (home value, label, away value) triples
+    for group in extra[0].xpath("./div"):
+        cells = [_text(c) for c in group.xpath(f"./div[not({_has_class('th')})]")]
+        for j in range(0, len(cells) - 2, 3):
+            key = EXTRA_LABELS.get(cells[j + 1].lower())
+            if key is None:
+                continue
+            stats["home"][key] = _parse_number(cells[j])
+            stats["away"][key] = _parse_number(cells[j + 2])
+    return True
+
+
+def parse_match_report_html(page_html: str, source: str = ""):
+    """Return ``(stats, penalties)`` for a match report page, in the shape used by ``scrape_league``."""
+    stats = {"home": {}, "away": {}}
+    doc = parse_document(page_html)
+    penalties = _parse_scorebox(doc, stats)
+    if not _parse_team_stats(doc, stats):
+        logger.warning("team_stats table not found on %s", source)
+    if not _parse_team_stats_extra(doc, stats):
+        logger.warning("team_stats_extra table not found on %s", source)
+    return stats, penalties
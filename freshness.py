@@ -0,0 +1,76 @@
+import re
+import time
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Iterable, Optional
+
+# page classes, from the slowest to the fastest changing
+PAGE_INDEX = "index"        # competitions list, a league's list of seasons
+PAGE_SEASON = "season"      # a season's overview page (links to its fixtures)
+PAGE_FIXTURES = "fixtures"  # a season's Scores & Fixtures page
+PAGE_REPORT = "report"      # a played match's report
+
+_YEAR_RE = re.compile(r"\b((?:19|20)\d{2})(?:-((?:19|20)\d{2}))?\b")
+
+
+def is_current_season(season: str, today: Optional[date] = None) -> bool:
+    """
+    Whether ``season`` (a season name such as ``2024-2025`` / ``2025`` or a URL containing one) may still
+    change. fbref's current-season URLs carry no year at all, so text without a year counts as current.
+    Split seasons are treated as over from August of their end year, calendar-year seasons after December.
+    """
+    today = today or date.today()
+    matches = _YEAR_RE.findall(season or "")
+    if not matches:
+        return True
+    start, end = max((int(s), int(e) if e else None) for s, e in matches)
+    if end is None:
+        return today.year <= start
+    return today < date(end, 8, 1)
+
+
+@dataclass
+class FreshnessPolicy:
+    """
+    How long a cached page (or the JSON parsed from it) may be used before it is fetched again.
+
+    Index pages expire after ``index_ttl``. Season and fixtures pages of past seasons, and match reports,
+    never change. The current season's fixtures expire after ``current_fixtures_ttl``, and earlier than
+    that once a scheduled fixture is ``result_delay`` past its date, so results are picked up after kickoff.
+    """
+
+    index_ttl: float = 7 * 86400
+    current_fixtures_ttl: float = 6 * 3600
+    result_delay: float = 86400  # fixtures only carry a date, expect the result by the end of the day
+
+    def max_age(self, page_class: str, season: Optional[str] = None) -> Optional[float]:
+        """Seconds a page of ``page_class`` stays fresh, None if it never goes stale."""
+        if page_class == PAGE_INDEX:
+            return self.index_ttl
+        if page_class == PAGE_SEASON:
+            return self.index_ttl if is_current_season(season) else None
+        if page_class == PAGE_FIXTURES:
+            return self.current_fixtures_ttl if is_current_season(season) else None
+        return None
+
+    def _result_due(self, fixtures: Iterable[dict], fetched_at: float, now: float) -> bool:
+        for f in fixtures:
+            if f.get("home_g") is not None or not f.get("date"):
+                continue
+            try:
+                due = datetime.strptime(f["date"], "%Y-%m-%d").timestamp() + self.result_delay
+            except ValueError:
+                continue
+            if fetched_at < due <= now:
+                return True
+        return False
+
+    def is_fresh(self, page_class: str, fetched_at: float, season: Optional[str] = None,
+                 fixtures: Optional[Iterable[dict]] = None, now: Optional[float] = None) -> bool:
+        now = now or time.time()
+        max_age = self.max_age(page_class, season)
+        if max_age is not None and now - fetched_at > max_age:
+            return False
+        if page_class == PAGE_FIXTURES and fixtures and is_current_season(season):
+            return not self._result_due(fixtures, fetched_at, now)
+        return True
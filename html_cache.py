@@ -0,0 +1,297 @@
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # optional, gzip is used instead
+    zstandard = None
+
+
+class CacheMiss(KeyError):
+    """Raised when a page is required from the cache but was never stored."""
+
+
+@dataclass
+class CacheEntry:
+    url: str
+    path: Path
+    fetched_at: float
+    size: int                        # bytes on disk (compressed)
+    raw_size: Optional[int] = None
+    status: Optional[int] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    content_hash: Optional[str] = None
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+@contextmanager
+def open_page(path: Path) -> Iterator[BinaryIO]:
+    """Open a cached body for streaming reads, decompressing according to its suffix."""
+    path = Path(path)
+    if path.suffix == ".zst":
+        if zstandard is None:
+            raise RuntimeError(f"{path} is zstd-compressed but the zstandard package is not installed")
+        with path.open("rb") as raw, zstandard.ZstdDecompressor().stream_reader(raw) as fh:
+            yield fh
+    elif path.suffix == ".gz":
+        with gzip.open(path, "rb") as fh:
+            yield fh
+    else:
+        with path.open("rb") as fh:
+            yield fh
+
+
+def read_page(path: Path) -> str:
+    """Return the HTML stored at ``path`` (compressed or a legacy plain ``.html`` file)."""
+    with open_page(path) as fh:
+        return fh.read().decode("utf-8")
+
+
+class HtmlCache:
+    """
+    On-disk store of fetched pages.
+
+    Bodies are compressed (zstd when ``zstandard`` is installed, gzip otherwise) and stored by content
+    hash under two levels of shard directories, ``<root>/ab/cd/<sha256>.html.zst``, so identical pages
+    share one file and no directory grows past a few thousand entries. ``index.sqlite`` maps every URL
+    to its body with fetch time, size, HTTP status, validators and content hash, and backs eviction.
+
+    Caches written by older versions (flat ``<sha256(url)>.html`` files listed in ``index.jsonl``) are
+    still readable; the old index is imported on first open.
+    """
+
+    INDEX_NAME = "index.sqlite"
+    LEGACY_INDEX_NAME = "index.jsonl"
+
+    def __init__(self, root: Path, compress_level: int = 3):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.compress_level = compress_level
+        self._index_path = self.root / self.INDEX_NAME
+        self._local = threading.local()
+        with self._connect() as con:
+            con.execute("""
+            CREATE TABLE IF NOT EXISTS page (
+              url           TEXT PRIMARY KEY,
+              file          TEXT NOT NULL,      -- relative to the cache root
+              fetched_at    REAL NOT NULL,
+              size          INTEGER NOT NULL,
+              raw_size      INTEGER,
+              status        INTEGER,
+              etag          TEXT,
+              last_modified TEXT,
+              content_hash  TEXT
+            )
+            """)
+            con.execute("CREATE INDEX IF NOT EXISTS idx_page_fetched_at ON page (fetched_at)")
+            con.execute("CREATE INDEX IF NOT EXISTS idx_page_content_hash ON page (content_hash)")
+        self._import_legacy_index()
+
+    def _connect(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self._index_path, timeout=30)
+            con.execute("PRAGMA journal_mode = WAL;")
+            self._local.con = con
+        return con
+
+    def _import_legacy_index(self) -> None:
+        legacy = self.root / self.LEGACY_INDEX_NAME
+        if not legacy.exists():
+            return
+        rows = []
+        with legacy.open(encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn last line after a crash
+                path = self.root / entry["file"]
+                if path.exists():
+                    st = path.stat()
+                    rows.append((entry["url"], entry["file"], st.st_mtime, st.st_size, st.st_size))
+        with self._connect() as con:
+            con.executemany(
+                "INSERT OR IGNORE INTO page (url, file, fetched_at, size, raw_size) VALUES (?, ?, ?, ?, ?)", rows
+            )
+        legacy.rename(legacy.with_suffix(".jsonl.imported"))
+
+    def _legacy_path(self, url: str) -> Path:
+        return self.root / f"{_sha256(url.encode('utf-8'))}.html"
+
+    def _blob_path(self, content_hash: str) -> Path:
+        suffix = ".html.zst" if zstandard is not None else ".html.gz"
+        return self.root / content_hash[:2] / content_hash[2:4] / f"{content_hash}{suffix}"
+
+    def _compress(self, data: bytes) -> bytes:
+        if zstandard is not None:
+            return zstandard.ZstdCompressor(level=self.compress_level).compress(data)
+        return gzip.compress(data, compresslevel=min(self.compress_level * 2, 9))
+
+    @staticmethod
+    def _write_atomic(path: Path, data: bytes) -> None:
+        # readers never see a partial body: write next to the target, then rename over it
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    # -- lookups --
+
+    def lookup(self, url: str) -> Optional[CacheEntry]:
+        """Index entry of ``url`` without touching the body, or None if it is not cached."""
+        row = self._connect().execute(
+            "SELECT file, fetched_at, size, raw_size, status, etag, last_modified, content_hash"
+            " FROM page WHERE url = ?", (url,)
+        ).fetchone()
+        if row is not None:
+            return CacheEntry(url, self.root / row[0], *row[1:])
+        legacy = self._legacy_path(url)
+        if legacy.exists():
+            st = legacy.stat()
+            return CacheEntry(url, legacy, st.st_mtime, st.st_size, st.st_size)
+        return None
+
+    def path_for(self, url: str) -> Path:
+        """Where the body of ``url`` is stored (the legacy flat path if it was never indexed)."""
+        entry = self.lookup(url)
+        return entry.path if entry is not None else self._legacy_path(url)
+
+    def __contains__(self, url: str) -> bool:
+        entry = self.lookup(url)
+        return entry is not None and entry.path.exists()
+
+    @contextmanager
+    def open(self, url: str) -> Iterator[BinaryIO]:
+        """Stream the decompressed body of ``url``; raises ``CacheMiss`` if it is not cached."""
+        entry = self.lookup(url)
+        if entry is None or not entry.path.exists():
+            raise CacheMiss(url)
+        with open_page(entry.path) as fh:
+            yield fh
+
+    def get(self, url: str) -> Optional[str]:
+        try:
+            with self.open(url) as fh:
+                return fh.read().decode("utf-8")
+        except CacheMiss:
+            return None
+
+    def put(self, url: str, page_html: str, status: Optional[int] = 200,
+            etag: Optional[str] = None, last_modified: Optional[str] = None) -> Path:
+        data = page_html.encode("utf-8")
+        content_hash = _sha256(data)
+        path = self._blob_path(content_hash)
+        file = path.relative_to(self.root).as_posix()
+        body = self._compress(data)
+        con = self._connect()
+        with con:
+            # holding the index write lock, so a concurrent evict cannot unlink a shared body under us
+            con.execute("BEGIN IMMEDIATE")
+            old = con.execute("SELECT file FROM page WHERE url = ?", (url,)).fetchone()
+            if not path.exists():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                self._write_atomic(path, body)
+            con.execute(
+                "INSERT OR REPLACE INTO page"
+                " (url, file, fetched_at, size, raw_size, status, etag, last_modified, content_hash)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, file, time.time(), path.stat().st_size, len(data), status, etag, last_modified, content_hash),
+            )
+            if old is not None and old[0] != file:
+                self._release(con, old[0])  # the previous body of this URL, unless another URL shares it
+        return path
+
+    def touch(self, url: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        """Mark ``url`` as fetched now without changing its body, e.g. after a 304 Not Modified."""
+        with self._connect() as con:
+            con.execute(
+                "UPDATE page SET fetched_at = ?, etag = COALESCE(?, etag),"
+                " last_modified = COALESCE(?, last_modified) WHERE url = ?",
+                (time.time(), etag, last_modified, url),
+            )
+
+    def entries(self) -> Iterator[CacheEntry]:
+        """Stream every index entry, oldest first, without loading the index into memory."""
+        cursor = self._connect().execute(
+            "SELECT url, file, fetched_at, size, raw_size, status, etag, last_modified, content_hash"
+            " FROM page ORDER BY fetched_at"
+        )
+        for row in cursor:
+            yield CacheEntry(row[0], self.root / row[1], *row[2:])
+
+    def items(self) -> Iterator[Tuple[str, Path]]:
+        """Yield ``(url, path)`` for every indexed page that is still on disk."""
+        for entry in self.entries():
+            if entry.path.exists():
+                yield entry.url, entry.path
+
+    def __len__(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM page").fetchone()[0]
+
+    def total_size(self) -> int:
+        """Bytes on disk of all indexed bodies (shared bodies counted once)."""
+        return self._connect().execute(
+            "SELECT COALESCE(SUM(size), 0) FROM (SELECT file, MAX(size) AS size FROM page GROUP BY file)"
+        ).fetchone()[0]
+
+    # -- eviction --
+
+    def _remove(self, con: sqlite3.Connection, url: str, file: str) -> int:
+        con.execute("DELETE FROM page WHERE url = ?", (url,))
+        return self._release(con, file)
+
+    def _release(self, con: sqlite3.Connection, file: str) -> int:
+        """Delete the body ``file`` once no index row references it. Returns the bytes freed."""
+        if con.execute("SELECT 1 FROM page WHERE file = ? LIMIT 1", (file,)).fetchone():
+            return 0  # body still referenced by another URL
+        path = self.root / file
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except FileNotFoundError:
+            return 0
+        return size
+
+    def evict(self, max_bytes: Optional[int] = None, max_age: Optional[float] = None) -> int:
+        """
+        Drop entries fetched more than ``max_age`` seconds ago, then the oldest entries until the cache
+        fits in ``max_bytes``. Returns the number of bytes freed.
+        """
+        freed = 0
+        con = self._connect()
+        with con:
+            if max_age is not None:
+                cutoff = time.time() - max_age
+                for url, file in con.execute("SELECT url, file FROM page WHERE fetched_at < ?", (cutoff,)).fetchall():
+                    freed += self._remove(con, url, file)
+            if max_bytes is not None:
+                excess = self.total_size() - max_bytes
+                if excess > 0:
+                    for url, file, size in con.execute(
+                        "SELECT url, file, size FROM page ORDER BY fetched_at"
+                    ).fetchall():
+                        if excess <= 0:
+                            break
+                        removed = self._remove(con, url, file)
+                        freed += removed
+                        excess -= removed
+        return freed
@@ -0,0 +1,426 @@
+"""
+Persistent work queue for the crawl.
+
+The crawl is split into jobs (``league`` -> ``season`` -> ``fixtures`` -> ``report``) stored in a SQLite
+file. Any number of worker processes lease jobs from it, so leagues are scraped in parallel and a
+crashed worker's jobs go back to the queue once their lease expires. Usage::
+
+    python job_queue.py enqueue                       # every league in league_mapping
+    python job_queue.py enqueue --league "Serie A"
+    python job_queue.py drain --workers 4
+    python job_queue.py inspect
+    python job_queue.py retry-failed
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUE_DB = Path("data/cache/jobs.sqlite")
+
+JOB_KINDS = ("league", "season", "fixtures", "report")
+# deeper jobs first so started seasons finish before new ones open; the current season jumps the queue
+_DEPTH = {kind: depth for depth, kind in enumerate(JOB_KINDS)}
+CURRENT_SEASON_BOOST = 100
+
+
+@dataclass
+class Job:
+    id: int
+    kind: str
+    key: str
+    payload: dict
+    priority: int
+    attempts: int
+    owner: Optional[str] = None
+
+
+class JobQueue:
+    """
+    SQLite-backed queue with priorities, leases and retries.
+
+    ``lease`` hands out the highest-priority runnable job and marks it leased for ``lease_seconds``;
+    the worker then calls ``complete`` or ``fail``. A failed job is retried after an exponential,
+    jittered backoff until ``max_attempts`` is reached. A job whose lease expired (worker crashed or
+    hung) counts as a failed attempt and is handed out again; ``complete``/``fail`` from the worker
+    that lost the lease are ignored. Jobs are unique per ``(kind, key)``, so enqueueing twice is
+    harmless; ``requeue=True`` queues a finished job again, for recurring crawls of the current season.
+    """
+
+    def __init__(self, path: Path = JOB_QUEUE_DB, lease_seconds: float = 600.0, max_attempts: int = 5,
+                 backoff_base: float = 30.0, backoff_max: float = 3600.0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._local = threading.local()
+        con = self._connect()
+        con.execute("""
+        CREATE TABLE IF NOT EXISTS job (
+          id            INTEGER PRIMARY KEY,
+          kind          TEXT NOT NULL,
+          key           TEXT NOT NULL,
+          payload       TEXT NOT NULL,
+          priority      INTEGER NOT NULL DEFAULT 0,
+          status        TEXT NOT NULL DEFAULT 'queued',  -- 'queued'|'leased'|'done'|'failed'
+          attempts      INTEGER NOT NULL DEFAULT 0,
+          not_before    REAL NOT NULL DEFAULT 0,
+          lease_owner   TEXT,
+          lease_expires REAL,
+          last_error    TEXT,
+          created_at    REAL NOT NULL,
+          updated_at    REAL NOT NULL,
+          UNIQUE (kind, key)
+        )
+        """)
+        con.execute("CREATE INDEX IF NOT EXISTS idx_job_runnable ON job (status, priority DESC, not_before)")
+
+    def _connect(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None or getattr(self._local, "pid", None) != os.getpid():
+            con = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            con.execute("PRAGMA journal_mode = WAL;")
+            self._local.con = con
+            self._local.pid = os.getpid()
+        return con
+
+    def enqueue(self, kind: str, key: str, payload: dict, priority: int = 0, requeue: bool = False) -> bool:
+        """
+        Add a job; returns False if a job with the same kind and key already exists. With ``requeue``
+        an existing job that is done or failed is queued again (a queued or leased one is left alone).
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind {kind!r}")
+        now = time.time()
+        sql = (
+            "INSERT INTO job (kind, key, payload, priority, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (kind, key) DO "
+        )
+        if requeue:
+            sql += (
+                "UPDATE SET status = 'queued', attempts = 0, not_before = 0, last_error = NULL,"
+                " payload = excluded.payload, priority = excluded.priority, updated_at = excluded.updated_at"
+                " WHERE job.status IN ('done', 'failed')"
+            )
+        else:
+            sql += "NOTHING"
+        cur = self._connect().execute(sql, (kind, key, json.dumps(payload), priority + _DEPTH[kind], now, now))
+        return cur.rowcount > 0
+
+    def lease(self, owner: str) -> Optional[Job]:
+        """Take the next runnable job, or None if nothing is runnable right now."""
+        con = self._connect()
+        now = time.time()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            while True:
+                row = con.execute(
+                    "SELECT id, kind, key, payload, priority, attempts, status FROM job"
+                    " WHERE (status = 'queued' AND not_before <= ?) OR (status = 'leased' AND lease_expires < ?)"
+                    " ORDER BY priority DESC, id LIMIT 1",
+                    (now, now),
+                ).fetchone()
+                if row is None or row[6] == "queued":
+                    break
+                # the previous worker crashed or hung: that counts as an attempt, so the job cannot loop forever
+                attempts = row[5] + 1
+                if attempts < self.max_attempts:
+                    row = row[:5] + (attempts,)
+                    con.execute("UPDATE job SET attempts = ? WHERE id = ?", (attempts, row[0]))
+                    break
+                logger.error("Job %s %s failed for good: lease expired %d times", row[1], row[2], attempts)
+                con.execute(
+                    "UPDATE job SET status = 'failed', attempts = ?, lease_owner = NULL, lease_expires = NULL,"
+                    " last_error = 'lease expired', updated_at = ? WHERE id = ?",
+                    (attempts, now, row[0]),
+                )
+            if row is not None:
+                con.execute(
+                    "UPDATE job SET status = 'leased', lease_owner = ?, lease_expires = ?, updated_at = ?"
+                    " WHERE id = ?",
+                    (owner, now + self.lease_seconds, now, row[0]),
+                )
+            con.execute("COMMIT")
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        return Job(row[0], row[1], row[2], json.loads(row[3]), row[4], row[5], owner)
+
+    def _finish(self, job: Job, sql: str, params: tuple) -> bool:
+        """Run a status update only if ``job`` is still leased by the worker that holds it."""
+        cur = self._connect().execute(
+            sql + " WHERE id = ? AND lease_owner = ? AND status = 'leased'", params + (job.id, job.owner)
+        )
+        if cur.rowcount == 0:
+            logger.warning("Lease on job %s %s was lost; result of %s discarded", job.kind, job.key, job.owner)
+            return False
+        return True
+
+    def complete(self, job: Job) -> bool:
+        return self._finish(
+            job,
+            "UPDATE job SET status = 'done', lease_owner = NULL, lease_expires = NULL, last_error = NULL, updated_at = ?",
+            (time.time(),),
+        )
+
+    def fail(self, job: Job, error: str) -> bool:
+        """Record a failure; the job is queued again after a backoff or marked failed for good."""
+        now = time.time()
+        attempts = job.attempts + 1
+        if attempts >= self.max_attempts:
+            status, not_before = "failed", 0.0
+        else:
+            status = "queued"
+            not_before = now + random.uniform(0.5, 1.0) * min(self.backoff_max, self.backoff_base * 2 ** attempts)
+        finished = self._finish(
+            job,
+            "UPDATE job SET status = ?, attempts = ?, not_before = ?, lease_owner = NULL, lease_expires = NULL,"
+            " last_error = ?, updated_at = ?",
+            (status, attempts, not_before, error, now),
+        )
+        if finished and status == "failed":
+            logger.error("Job %s %s failed for good: %s", job.kind, job.key, error)
+        return finished
+
+    def retry_failed(self) -> int:
+        """Queue every permanently failed job again with a fresh attempt count."""
+        cur = self._connect().execute(
+            "UPDATE job SET status = 'queued', attempts = 0, not_before = 0, updated_at = ? WHERE status = 'failed'",
+            (time.time(),),
+        )
+        return cur.rowcount
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        """``{kind: {status: count}}``; expired leases are reported as 'stale'."""
+        now = time.time()
+        rows = self._connect().execute(
+            "SELECT kind, CASE WHEN status = 'leased' AND lease_expires < ? THEN 'stale' ELSE status END, COUNT(*)"
+            " FROM job GROUP BY 1, 2",
+            (now,),
+        ).fetchall()
+        counts: Dict[str, Dict[str, int]] = {}
+        for kind, status, n in rows:
+            counts.setdefault(kind, {})[status] = n
+        return counts
+
+    def failures(self, limit: int = 20):
+        return self._connect().execute(
+            "SELECT kind, key, attempts, last_error FROM job WHERE status = 'failed' ORDER BY updated_at DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+
+    def pending(self) -> int:
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM job WHERE status IN ('queued', 'leased')"
+        ).fetchone()[0]
+
+
+# -- job handlers; the scraper is imported lazily so inspecting the queue needs no browser --
+
+def _is_current(season: str) -> bool:
+    from freshness import is_current_season
+    return is_current_season(season)
+
+
+def _season_priority(season: str) -> int:
+    return CURRENT_SEASON_BOOST if _is_current(season) else 0
+
+
+def handle_league(queue: JobQueue, payload: dict) -> None:
+    from scrape_fbref import START_SEASON_YEAR, resolve_league
+    from src.db import get_engine, upsert_league
+
+    resolved = resolve_league(payload["league"], payload["gender"])
+    if resolved is None:
+        raise LookupError(f"Unknown league {payload['league']}")
+    gender_full, closest, league_alias, league_dir, seasons = resolved
+    with get_engine(gender_full.lower()).begin() as conn:
+        upsert_league(conn, league_alias, closest)
+    for season_name, season_url in seasons.items():
+        if int(season_name.split("-")[0]) < START_SEASON_YEAR:
+            continue
+        queue.enqueue(
+            "season",
+            season_url,
+            {"gender": gender_full, "league_id": league_alias, "season": season_name, "url": season_url,
+             "league_dir": str(league_dir)},
+            _season_priority(season_name),
+            requeue=_is_current(season_name),  # finished past seasons stay done, the current one is crawled again
+        )
+
+
+def handle_season(queue: JobQueue, payload: dict) -> None:
+    from utils import get_scores_and_fixtures_url
+
+    fixtures_url = get_scores_and_fixtures_url(payload["url"])
+    if not fixtures_url:
+        logger.warning("No fixtures URL found for season %s", payload["season"])
+        return
+    queue.enqueue("fixtures", fixtures_url, payload | {"url": fixtures_url}, _season_priority(payload["season"]),
+                  requeue=_is_current(payload["season"]))
+
+
+def handle_fixtures(queue: JobQueue, payload: dict) -> None:
+    """Write every fixture's team and match rows, then queue the reports that are not done yet."""
+    from scrape_fbref import fixture_match_row, load_season_fixtures
+    from src.db import BulkLoader, get_engine
+    from src.ledger import completed_keys
+
+    season_dir = Path(payload["league_dir"]) / payload["season"]
+    season_dir.mkdir(parents=True, exist_ok=True)
+    fixtures = load_season_fixtures(season_dir / "match_links.json", payload["url"], False)
+    priority = _season_priority(payload["season"])
+    reports = []
+    with get_engine(payload["gender"].lower()).connect() as conn:
+        with conn.begin():
+            done = completed_keys(conn, payload["league_id"], payload["season"])
+        with BulkLoader(conn) as loader:
+            for f in fixtures:
+                match_row = fixture_match_row(payload["league_id"], payload["season"], f)
+                if match_row["match_id"] in done:
+                    continue
+                loader.add_team(match_row["home_team_id"], f["home"])
+                loader.add_team(match_row["away_team_id"], f["away"])
+                loader.add_match(match_row)
+                loader.end_match()
+                if f["url"]:
+                    reports.append(match_row)
+    # only once the teams and matches are committed, another worker may pick the reports up right away
+    for match_row in reports:
+        # not in the ledger as done, so a report job that finished or failed earlier is due again
+        queue.enqueue("report", match_row["match_id"], {"gender": payload["gender"], "match_row": match_row}, priority,
+                      requeue=True)
+
+
+def handle_report(queue: JobQueue, payload: dict) -> None:
+    from scrape_fbref import fetch_report_stage, parse_report_stage, write_report
+    from src.db import BulkLoader, get_engine
+
+    record = parse_report_stage(fetch_report_stage(payload["match_row"]))
+    with get_engine(payload["gender"].lower()).connect() as conn:
+        # one report, written in the single flush on leaving the block
+        with BulkLoader(conn) as loader:
+            write_report(loader, record)
+    # raised only once the loader has committed, so the 'failed' ledger row and its error are kept
+    if record["error"] is not None:
+        raise RuntimeError(record["error"])
+
+
+HANDLERS: Dict[str, Callable[[JobQueue, dict], None]] = {
+    "league": handle_league,
+    "season": handle_season,
+    "fixtures": handle_fixtures,
+    "report": handle_report,
+}
+
+
+def drain(queue_path: Path = JOB_QUEUE_DB, idle_timeout: float = 30.0, poll_interval: float = 2.0) -> int:
+    """
+    Work off the queue in this process until nothing has been runnable for ``idle_timeout`` seconds
+    and no job is pending elsewhere. Returns the number of jobs completed.
+    """
+    from driver_pool import shutdown_driver_pool
+
+    queue = JobQueue(queue_path)
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    completed = 0
+    idle_since = None
+    try:
+        while True:
+            job = queue.lease(owner)
+            if job is None:
+                if queue.pending() == 0:
+                    break
+                idle_since = idle_since or time.monotonic()
+                if time.monotonic() - idle_since > idle_timeout:
+                    break
+                time.sleep(poll_interval)
+                continue
+            idle_since = None
+            try:
+                HANDLERS[job.kind](queue, job.payload)
+            except Exception as e:
+                logger.exception("Job %s %s failed", job.kind, job.key)
+                queue.fail(job, repr(e))
+            else:
+                queue.complete(job)
+                completed += 1
+    finally:
+        shutdown_driver_pool()
+    logger.info("Worker %s completed %d jobs", owner, completed)
+    return completed
+
+
+def _drain_worker(queue_path: str, idle_timeout: float) -> None:
+    logging.basicConfig(level=logging.INFO)
+    drain(Path(queue_path), idle_timeout)
+
+
+def main(argv=None) -> None:
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Persistent job queue for the fbref crawl")
+    parser.add_argument("--db", type=Path, default=JOB_QUEUE_DB, help="Queue database file")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = sub.add_parser("enqueue", help="Queue league jobs")
+    enqueue.add_argument("--league", action="append", help="League name (repeatable, default: all mapped leagues)")
+    enqueue.add_argument("--gender", choices=["M", "F"], default="M")
+
+    drain_cmd = sub.add_parser("drain", help="Run workers until the queue is empty")
+    drain_cmd.add_argument("--workers", type=int, default=1, help="Worker processes")
+    drain_cmd.add_argument("--idle-timeout", type=float, default=30.0,
+                           help="Stop after this many seconds without a runnable job")
+
+    sub.add_parser("inspect", help="Show job counts per kind and status, and recent failures")
+    sub.add_parser("retry-failed", help="Queue permanently failed jobs again")
+
+    args = parser.parse_args(argv)
+    queue = JobQueue(args.db)
+    if args.command == "enqueue":
+        if args.league:
+            leagues = args.league
+        else:
+            from utils import league_mapping
+            leagues = list(league_mapping)
+        added = sum(queue.enqueue("league", f"{args.gender}:{name}", {"league": name, "gender": args.gender},
+                                  requeue=True)
+                    for name in leagues)
+        print(f"Queued {added} league jobs ({len(leagues) - added} already queued)")
+    elif args.command == "drain":
+        if args.workers <= 1:
+            drain(args.db, args.idle_timeout)
+        else:
+            procs = [
+                multiprocessing.Process(target=_drain_worker, args=(str(args.db), args.idle_timeout))
+                for _ in range(args.workers)
+            ]
+            for p in procs:
+                p.start()
+            for p in procs:
+                p.join()
+    elif args.command == "inspect":
+        for kind, statuses in sorted(queue.counts().items(), key=lambda kv: _DEPTH[kv[0]]):
+            print(f"{kind:<9} " + "  ".join(f"{status}={n}" for status, n in sorted(statuses.items())))
+        for kind, key, attempts, error in queue.failures():
+            print(f"FAILED {kind} {key} after {attempts} attempts: {error}")
+    elif args.command == "retry-failed":
+        print(f"Requeued {queue.retry_failed()} failed jobs")
+
+
+if __name__ == "__main__":
+    main()
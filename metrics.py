@@ -0,0 +1,195 @@
+import heapq
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+METRICS_FILE = Path("data/metrics/scrape_run.json")
+PROMETHEUS_PREFIX = "fbref_scrape_"
+SLOWEST_KEPT = 10
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+@dataclass
+class Timing:
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    slowest: List[Tuple[float, str]] = field(default_factory=list)  # min-heap of (seconds, url)
+
+    def add(self, seconds: float, url: Optional[str]) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        if url:
+            if len(self.slowest) < SLOWEST_KEPT:
+                heapq.heappush(self.slowest, (seconds, url))
+            elif seconds > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, (seconds, url))
+
+
+class Metrics:
+    """
+    Process-wide counters and timings for a scrape run.
+
+    ``observe``/``timer`` record durations per stage (driver startup, page load, parse, DB write,
+    rate-limiter wait, ...) and keep the slowest URLs of each stage; ``incr`` bumps counters such as
+    cache hits. ``write`` dumps everything as JSON, or in the Prometheus textfile format when the
+    path ends in ``.prom``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.timings: Dict[str, Timing] = {}
+        self.counters: Dict[str, int] = {}
+
+    def observe(self, name: str, seconds: float, url: Optional[str] = None) -> None:
+        with self._lock:
+            self.timings.setdefault(name, Timing()).add(seconds, url)
+
+    @contextmanager
+    def timer(self, name: str, url: Optional[str] = None):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, url)
+
+    def incr(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def count(self, name: str) -> int:
+        with self._lock:
+            return self.counters.get(name, 0)
+
+    def summary(self) -> dict:
+        with self._lock:
+            timings = {
+                name: {
+                    "count": t.count,
+                    "total_seconds": round(t.total, 3),
+                    "mean_seconds": round(t.total / t.count, 4) if t.count else None,
+                    "max_seconds": round(t.max, 3),
+                    "slowest": [{"seconds": round(s, 3), "url": u} for s, u in sorted(t.slowest, reverse=True)],
+                }
+                for name, t in self.timings.items()
+            }
+            counters = dict(self.counters)
+        ratios = {}
+        for ratio, good, bad in [("cache_hit_rate", "cache_hits", "cache_misses"),
+                                 ("proxy_success_rate", "proxy_successes", "proxy_failures")]:
+            good, bad = counters.get(good, 0), counters.get(bad, 0)
+            if good + bad:
+                ratios[ratio] = round(good / (good + bad), 4)
+        return {
+            "started": self.started,
+            "elapsed_seconds": round(time.time() - self.started, 3),
+            "counters": counters,
+            "ratios": ratios,
+            "timings": timings,
+        }
+
+    def to_prometheus(self) -> str:
+        summary = self.summary()
+        lines = [f"{PROMETHEUS_PREFIX}elapsed_seconds {summary['elapsed_seconds']}"]
+        for name, value in sorted(summary["counters"].items()):
+            lines += [f"# TYPE {PROMETHEUS_PREFIX}{name}_total counter", f"{PROMETHEUS_PREFIX}{name}_total {value}"]
+        for name, value in sorted(summary["ratios"].items()):
+            lines += [f"# TYPE {PROMETHEUS_PREFIX}{name} gauge", f"{PROMETHEUS_PREFIX}{name} {value}"]
+        for name, t in sorted(summary["timings"].items()):
+            metric = f"{PROMETHEUS_PREFIX}{name}_seconds"
+            lines += [
+                f"# TYPE {metric} summary",
+                f"{metric}_count {t['count']}",
+                f"{metric}_sum {t['total_seconds']}",
+                f"# TYPE {PROMETHEUS_PREFIX}{name}_max_seconds gauge",
+                f"{PROMETHEUS_PREFIX}{name}_max_seconds {t['max_seconds']}",
+            ]
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: Path = METRICS_FILE) -> Path:
+        """Write the run summary atomically (node_exporter's textfile collector may read it at any time)."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        body = self.to_prometheus() if path.suffix == ".prom" else json.dumps(self.summary(), indent=2)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            fh.write(body)
+        os.replace(tmp, path)
+        return path
+
+    def log_summary(self) -> None:
+        summary = self.summary()
+        for name, t in sorted(summary["timings"].items(), key=lambda kv: -kv[1]["total_seconds"]):
+            logger.info("%-18s n=%-7d total=%8.1fs mean=%.3fs max=%.1fs", name, t["count"], t["total_seconds"],
+                        t["mean_seconds"] or 0.0, t["max_seconds"])
+        logger.info("counters: %s %s", summary["counters"], summary["ratios"])
+
+
+def get_metrics() -> Metrics:
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = Metrics()
+    return _metrics
+
+
+class ProgressLine:
+    """
+    Single self-overwriting status line: items done, items/min and ETA. ``total`` can grow while the
+    run discovers more work (each season adds its fixtures).
+    """
+
+    def __init__(self, label: str = "fixtures", total: int = 0, interval: float = 2.0, stream=None):
+        self.label = label
+        self.total = total
+        self.done = 0
+        self.interval = interval
+        self.stream = stream or sys.stderr
+        self.started = time.monotonic()
+        self._last_draw = 0.0
+        self._lock = threading.Lock()
+
+    def add_total(self, n: int) -> None:
+        with self._lock:
+            self.total += n
+
+    def advance(self, n: int = 1) -> None:
+        with self._lock:
+            self.done += n
+            now = time.monotonic()
+            if now - self._last_draw >= self.interval:
+                self._last_draw = now
+                self._draw(now)
+
+    def _draw(self, now: float) -> None:
+        elapsed = max(now - self.started, 1e-9)
+        per_min = self.done / elapsed * 60
+        remaining = max(self.total - self.done, 0)
+        if per_min > 0 and remaining:
+            minutes, seconds = divmod(int(remaining / per_min * 60), 60)
+            eta = f"{minutes // 60}:{minutes % 60:02d}:{seconds:02d}"
+        else:
+            eta = "--:--:--"
+        self.stream.write(f"\r{self.done}/{self.total} {self.label}  {per_min:.1f}/min  ETA {eta}  ")
+        self.stream.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._draw(time.monotonic())
+        self.stream.write("\n")
+        self.stream.flush()
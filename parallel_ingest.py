@@ -0,0 +1,100 @@
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, Optional, Tuple
+
+from fbref_parser import STAT_KEYS, parse_match_report_html
+from html_cache import read_page
+
+logger = logging.getLogger(__name__)
+
+# (key, home stat values, away stat values, (home_penalty, away_penalty), parse ms, error) with stat
+# values ordered as STAT_KEYS; error is None on success
+StatRecord = Tuple[str, tuple, tuple, tuple, float, Optional[str]]
+
+
+def parse_cached_report(item: Tuple[str, str]) -> StatRecord:
+    """Worker: parse one cached match report and return a compact, cheap-to-pickle record."""
+    key, path = item
+    started = time.perf_counter()
+    try:
+        page_html = read_page(path)
+        stats, penalties = parse_match_report_html(page_html, path)
+    except Exception as e:
+        logging.getLogger(__name__).exception("Failed to parse cached report %s", path)
+        return key, (), (), (None, None), (time.perf_counter() - started) * 1000, repr(e)
+    stats["home"]["xga"] = stats["away"].get("xg")
+    stats["away"]["xga"] = stats["home"].get("xg")
+    return (
+        key,
+        tuple(stats["home"].get(k) for k in STAT_KEYS),
+        tuple(stats["away"].get(k) for k in STAT_KEYS),
+        tuple(penalties),
+        (time.perf_counter() - started) * 1000,
+        None,
+    )
+
+
+def record_to_stats(record: StatRecord):
+    """Expand a worker record back into the ``(stats, penalties)`` shape of ``parse_match_report_html``."""
+    _, home, away, penalties, _, _ = record
+    return {"home": dict(zip(STAT_KEYS, home)), "away": dict(zip(STAT_KEYS, away))}, penalties
+
+
+class ThroughputCounter:
+    """Counts processed pages and logs the running pages/sec every ``log_every`` pages."""
+
+    def __init__(self, label: str = "pages", log_every: int = 500):
+        self.label = label
+        self.log_every = log_every
+        self.count = 0
+        self.started = time.perf_counter()
+
+    def tick(self, n: int = 1) -> None:
+        before = self.count
+        self.count += n
+        if self.count // self.log_every > before // self.log_every:
+            logger.info("Parsed %d %s (%.1f/sec)", self.count, self.label, self.rate)
+
+    @property
+    def rate(self) -> float:
+        elapsed = time.perf_counter() - self.started
+        return self.count / elapsed if elapsed > 0 else 0.0
+
+
+class CachedReportIngest:
+    """
+    Fans cached match-report files out to a process pool. Workers only parse; the caller stays the
+    single writer and commits the returned records to SQLite.
+
+    Use as a context manager so the worker processes are started once per run, not once per season.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, chunksize: int = 16):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.chunksize = chunksize
+        self.counter = ThroughputCounter("match reports")
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def __enter__(self):
+        self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self
+
+    def __exit__(self, *exc):
+        self._executor.shutdown()
+        self._executor = None
+        logger.info(
+            "Parsed %d match reports at %.1f/sec with %d workers",
+            self.counter.count,
+            self.counter.rate,
+            self.max_workers,
+        )
+
+    def parse(self, items: Iterable[Tuple[str, str]]) -> Iterator[StatRecord]:
+        """Yield a record per ``(key, path)`` item; failed parses carry the error in their last field."""
+        if self._executor is None:
+            raise RuntimeError("CachedReportIngest must be used as a context manager")
+        for record in self._executor.map(parse_cached_report, items, chunksize=self.chunksize):
+            self.counter.tick()
+            yield record
@@ -0,0 +1,91 @@
+import logging
+import queue
+import threading
+from typing import Callable, Iterable, Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class StagePipeline:
+    """
+    Runs items through a chain of stages, each on its own pool of threads, connected by bounded queues.
+
+    ``stages`` is a list of ``(name, fn, workers)``; every stage calls ``fn`` on each item and passes the
+    return value on. Because the queues hold at most ``queue_size`` items, a slow stage throttles the ones
+    before it (backpressure) instead of letting work pile up in memory. ``run`` yields the output of the
+    last stage in the calling thread, so that stage's consumer (the database writer) keeps its own
+    connection and transaction. Stage functions should turn per-item failures into results; an exception
+    that escapes is logged and the item is dropped.
+    """
+
+    def __init__(self, stages: List[Tuple[str, Callable, int]], queue_size: int = 64):
+        self.stages = stages
+        self.queue_size = queue_size
+        self._stop = threading.Event()
+
+    def _put(self, q: queue.Queue, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _feed(self, items: Iterable, outbox: queue.Queue) -> None:
+        try:
+            for item in items:
+                if not self._put(outbox, item):
+                    return
+        finally:
+            self._put(outbox, _DONE)
+
+    def _work(self, name: str, fn: Callable, inbox: queue.Queue, outbox: queue.Queue, remaining: list,
+              lock: threading.Lock) -> None:
+        while not self._stop.is_set():
+            try:
+                item = inbox.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                inbox.put(_DONE)  # let the sibling workers see it too
+                break
+            try:
+                result = fn(item)
+            except Exception:
+                logger.exception("Stage %s failed on %r", name, item)
+                continue
+            if not self._put(outbox, result):
+                return
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            self._put(outbox, _DONE)
+
+    def run(self, items: Iterable) -> Iterator:
+        self._stop.clear()
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        threads = [threading.Thread(target=self._feed, args=(items, queues[0]), name="pipeline-feed", daemon=True)]
+        for i, (name, fn, workers) in enumerate(self.stages):
+            remaining, lock = [max(1, workers)], threading.Lock()
+            for n in range(max(1, workers)):
+                threads.append(threading.Thread(
+                    target=self._work, args=(name, fn, queues[i], queues[i + 1], remaining, lock),
+                    name=f"pipeline-{name}-{n}", daemon=True,
+                ))
+        for t in threads:
+            t.start()
+        try:
+            while True:
+                item = queues[-1].get()
+                if item is _DONE:
+                    break
+                yield item
+        finally:
+            # also reached when the consumer stops early: unblock and wind down every stage
+            self._stop.set()
+            for t in threads:
+                t.join(timeout=5)
@@ -1,54 +1,118 @@
-import hashlib
+import threading
 import time
+from concurrent.futures import Future
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional
+from urllib.parse import urlsplit
 import requests
+from html_cache import HtmlCache
+from metrics import get_metrics
+from proxy_pool import ProxyPool
+from rate_limiter import RateLimiter
 
 class ProxyHtmlFetcher:
     def __init__(self,
-    cache_root: Path,
-    pool: Optional[ProxyPool] = None;
-    per_request_timeout: float = 7.0,
-    max_retries: int = 3):
+                 cache_root: Path,
+                 pool: Optional[ProxyPool] = None,
+                 per_request_timeout: float = 7.0,
+                 max_retries: int = 3,
+                 limiter: Optional[RateLimiter] = None):
 
-    self.cache_root = cache_root
-    self.pool = pool
-    self.per_request_timeout = per_request_timeout
-    self.max_retries = max_retries
+        self.cache_root = cache_root
+        self.pool = pool
+        self.per_request_timeout = per_request_timeout
+        self.max_retries = max_retries
+        self.limiter = limiter
 
-    self.cache_root.mkdir(parents=True, exist_ok=True)
+        self.cache = HtmlCache(cache_root)
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
 
     def _cache_path_for(self, url: str) -> Path:
-        h = hashlib.sha256(url.encode("utf-8")).hexdigest()
-        return self.cache_root / f"{h}.html"
-
-    def fetch_and_cache(self, url: str, force: bool = False) -> Path:
-        path = self._cache_path_for(url)
-        if path.exists() and not force:
-            return path
-        
+        return self.cache.path_for(url)
+
+    def _is_fresh(self, url: str, max_age: Optional[float]) -> bool:
+        entry = self.cache.lookup(url)
+        if entry is None or not entry.path.exists():
+            return False
+        return max_age is None or time.time() - entry.fetched_at <= max_age
+
+    @staticmethod
+    def _conditional_headers(entry) -> dict:
+        # validators only make sense while we still hold the body a 304 would point to
+        headers = {}
+        if entry is None or not entry.path.exists():
+            return headers
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def fetch_and_cache(self, url: str, force: bool = False, max_age: Optional[float] = None) -> Path:
+        """
+        Return the cache path of ``url``, fetching it if it is missing, ``force`` is set or the cached copy
+        is older than ``max_age`` seconds (``None``: cached copies never expire). A stale copy is
+        revalidated with a conditional GET and only downloaded again if it changed.
+        """
+        if not force and self._is_fresh(url, max_age):
+            get_metrics().incr("cache_hits")
+            return self._cache_path_for(url)
+        get_metrics().incr("cache_misses")
+
+        # single flight: concurrent calls for the same URL wait for the first one instead of refetching
+        with self._inflight_lock:
+            flight = self._inflight.get(url)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[url] = Future()
+        if not leader:
+            return flight.result()
+        try:
+            flight.set_result(self._fetch(url))
+        except BaseException as e:
+            flight.set_exception(e)
+        finally:
+            with self._inflight_lock:
+                del self._inflight[url]
+        return flight.result()
+
+    def _fetch(self, url: str) -> Path:
+        headers = {"User-Agent": "Mozilla/5.0"} | self._conditional_headers(self.cache.lookup(url))
         last_exc = None
         for attempt in range(1, self.max_retries + 1):
             proxy = self.pool.get()
             if not proxy:
                 time.sleep(1.0)
                 continue
-        proxies = {"http": f"http://{proxy}", "https": f"http://{proxy}"}
-        try:
-            resp = requests.get(url, proxies=proxies, timeout=self.per_request_timeout, headers={"User-Agent": "Mozilla/5.0"})
-            if resp.ok and resp.text:
-                path.write_text(resp.text, encoding="utf-8")
-                # return proxy to pool as good
-                self.pool.mark_good(proxy)
-                return path
-            else:
+            proxies = {"http": f"http://{proxy}", "https": f"http://{proxy}"}
+            # each proxy is a separate client to the site, so it gets its own bucket
+            limiter_key = f"{urlsplit(url).netloc}@{proxy}"
+            if self.limiter:
+                get_metrics().observe("rate_limit_wait", self.limiter.acquire(limiter_key), url)
+            try:
+                with get_metrics().timer("proxy_fetch", url):
+                    resp = requests.get(url, proxies=proxies, timeout=self.per_request_timeout, headers=headers)
+                if self.limiter:
+                    self.limiter.report(limiter_key, resp.status_code)
+                if resp.status_code == 304:
+                    get_metrics().incr("cache_not_modified")
+                    self.cache.touch(url, resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+                    self.pool.mark_good(proxy, resp.elapsed.total_seconds())
+                    return self._cache_path_for(url)
+                if resp.ok and resp.text:
+                    path = self.cache.put(url, resp.text, resp.status_code,
+                                          resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+                    # return proxy to pool as good, ranked by how fast it answered
+                    self.pool.mark_good(proxy, resp.elapsed.total_seconds())
+                    return path
+                else:
+                    self.pool.mark_bad(proxy)
+            except Exception as e:
+                last_exc = e
                 self.pool.mark_bad(proxy)
-        except Exception as e:
-            last_exc = e
-            self.pool.mark_bad(proxy)
-            time.sleep(0.2 * attempt)
-            
+                time.sleep(0.2 * attempt)
+
         if last_exc:
             raise last_exc
         raise RuntimeError(f"Failed to fetch {url} after {self.max_retries} attempts")
-    
\ No newline at end of file
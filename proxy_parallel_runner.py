@@ -1,22 +1,25 @@
+import asyncio
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Iterable, List
+from typing import Iterable, List, Optional
 import logging
-from proxy_pool import ProxyPool
+from proxy_pool import PROXY_STATE_DB, ProxyPool
 from proxy_html_cache import ProxyHtmlFetcher
 
 logger = logging.getLogger(__name__)
 
 def prefetch_urls(
-    urls: Iterable[str], 
+    urls: Iterable[str],
     cache_dir: Path,
     max_workers: int = 20) -> List[Path]:
 
-    pool = ProxyPool()
-    fetcher = ProxyHtmlFetcher(cache_dir, pool)
+    from utils import get_rate_limiter
+
+    pool = ProxyPool(state_path=PROXY_STATE_DB)
+    fetcher = ProxyHtmlFetcher(cache_dir, pool, limiter=get_rate_limiter())
     results: List[Path] = []
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = [executor.submit(fetcher.fetch_and_cache, url) for url in urls]
+    with pool, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(fetcher.fetch_and_cache, url): url for url in urls}
         for fut in as_completed(futures):
             url = futures[fut]
             try:
@@ -27,4 +30,32 @@ def prefetch_urls(
                 logger.warning("Failed to cache %s: %s", url, e)
 
     return results
-    
\ No newline at end of file
+
+
+async def _prefetch_async(urls, cache_dir, pool, per_host_concurrency, per_host_rate) -> List[Path]:
+    from async_html_fetcher import AsyncHtmlFetcher
+    from utils import get_rate_limiter
+
+    results: List[Path] = []
+    # the shared limiter keeps this loop inside the request budget of every other scraper process
+    async with AsyncHtmlFetcher(
+        cache_dir, pool, per_host_concurrency=per_host_concurrency, per_host_rate=per_host_rate,
+        limiter=get_rate_limiter(),
+    ) as fetcher:
+        async for url, path in fetcher.iter_fetch(urls):
+            results.append(path)
+            logger.info("Cached %s -> %s", url, path)
+    return results
+
+
+def prefetch_urls_async(
+    urls: Iterable[str],
+    cache_dir: Path,
+    per_host_concurrency: int = 20,
+    per_host_rate: Optional[float] = None,
+    use_proxies: bool = True) -> List[Path]:
+    """Same as ``prefetch_urls`` but on a single asyncio event loop instead of a thread per request."""
+    if not use_proxies:
+        return asyncio.run(_prefetch_async(urls, cache_dir, None, per_host_concurrency, per_host_rate))
+    with ProxyPool(state_path=PROXY_STATE_DB) as pool:
+        return asyncio.run(_prefetch_async(urls, cache_dir, pool, per_host_concurrency, per_host_rate))
@@ -1,9 +1,21 @@
+import heapq
+import itertools
+import logging
+import random
+import re
+import sqlite3
 import threading
 import time
-import random
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import astuple, dataclass, fields
+from pathlib import Path
+from typing import Optional, Dict, Iterable, List
+
 import requests
-from queue import Queue, Empty
-from typing import Optional, Dict, List
+
+from metrics import get_metrics
+
+logger = logging.getLogger(__name__)
 
 DEFAULT_SOURCES = [
     "https://api.proxyscrape.com/v2/?request=getproxies&protocol=http&timeout=7000&country=all&ssl=all&anonymity=all",
@@ -20,6 +32,11 @@ VALIDATION_URLS = [
     "https://www.google.com/generate_204",
 ]
 
+PROXY_STATE_DB = Path("data/cache/proxies.sqlite")
+
+_PROXY_RE = re.compile(r"\b(\d{1,3}(?:\.\d{1,3}){3}):(\d{2,5})\b")
+
+
 def _parse_candidates(text: str) -> List[str]:
     candidates = []
     for line in text.splitlines():
@@ -27,35 +44,227 @@ def _parse_candidates(text: str) -> List[str]:
         if not line or line.startswith("#"):
             continue
         # accept IP:PORT tokens anywhere in the line
-        parts = [p for p in line.replace(",", ":").split(":") if ":" in p]
-        for p in parts:
-            host, _, port = p.partition(":")
-            if host and port.isdigit():
-                candidates.append(f"{host.strip()}:{port.strip()}")
+        for host, port in _PROXY_RE.findall(line):
+            candidates.append(f"{host}:{port}")
     return candidates
 
+
+@dataclass
+class ProxyStats:
+    proxy: str
+    successes: int = 0
+    failures: int = 0
+    latency: Optional[float] = None   # EWMA of response time in seconds
+    last_failure: float = 0.0
+    cooldown_until: float = 0.0
+    strikes: int = 0                  # consecutive failures, drives the quarantine length
+    last_checked: float = 0.0         # last validation or successful use
+
+    @property
+    def success_rate(self) -> float:
+        # Laplace smoothing so a fresh proxy starts at 0.5 instead of 0 or 1
+        return (self.successes + 1) / (self.successes + self.failures + 2)
+
+    def score(self, default_latency: float) -> float:
+        """Higher is better: expected successes per second of waiting."""
+        return self.success_rate / max(self.latency or default_latency, 0.05)
+
+
+class _ReputationStore:
+    """``ProxyStats`` rows in a small SQLite file so validation results survive between runs."""
+
+    COLUMNS = [f.name for f in fields(ProxyStats)]
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._connect().execute("""
+        CREATE TABLE IF NOT EXISTS proxy (
+          proxy          TEXT PRIMARY KEY,
+          successes      INTEGER NOT NULL DEFAULT 0,
+          failures       INTEGER NOT NULL DEFAULT 0,
+          latency        REAL,
+          last_failure   REAL NOT NULL DEFAULT 0,
+          cooldown_until REAL NOT NULL DEFAULT 0,
+          strikes        INTEGER NOT NULL DEFAULT 0,
+          last_checked   REAL NOT NULL DEFAULT 0
+        )
+        """)
+
+    def _connect(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=30)
+            con.execute("PRAGMA journal_mode = WAL;")
+            self._local.con = con
+        return con
+
+    def load(self, forget_after: float) -> List[ProxyStats]:
+        """Return every remembered proxy, dropping those not seen for ``forget_after`` seconds."""
+        con = self._connect()
+        cutoff = time.time() - forget_after
+        with con:
+            con.execute("DELETE FROM proxy WHERE max(last_checked, last_failure) < ?", (cutoff,))
+            # written by older versions, which also kept candidates that never passed validation
+            con.execute("DELETE FROM proxy WHERE successes = 0 AND latency IS NULL")
+        rows = con.execute(f"SELECT {', '.join(self.COLUMNS)} FROM proxy").fetchall()
+        return [ProxyStats(*row) for row in rows]
+
+    def save(self, stats: Iterable[ProxyStats]) -> None:
+        rows = [astuple(s) for s in stats]
+        if not rows:
+            return
+        con = self._connect()
+        placeholders = ", ".join("?" for _ in self.COLUMNS)
+        with con:
+            con.executemany(
+                f"INSERT OR REPLACE INTO proxy ({', '.join(self.COLUMNS)}) VALUES ({placeholders})", rows
+            )
+
+
 class ProxyPool:
-    def __init__(self, 
-    min_pool_size: int = 100, 
-    max_pool_size: int = 500, 
-    validate_urls: None,
-    target_probe_url: str | None = "https://fbref.com/robots.txt"):
-
-    self.min_pool_size = min_pool_size
-    self.max_pool_size = max_pool_size
-    self.validate_urls = validate_urls or VALIDATION_URLS
-    self.target_probe_url = target_probe_url
-
-    self._lock = threading.Lock()
-    self._seen = set()
-    self._pool = Queue()
-    self._last_refill = 0.0
+    """
+    Pool of validated HTTP proxies that hands out the best-scoring proxy first.
+
+    Each proxy keeps success/failure counts and an EWMA latency; ``get`` pops the highest
+    ``success_rate / latency``. ``mark_bad`` puts a proxy in quarantine for an exponentially growing
+    cooldown instead of dropping it, and once the cooldown has passed the proxy is re-validated on the
+    next refill (probation) and rejoins the pool if it passes. Candidates are validated concurrently.
+
+    After ``start()`` a background thread keeps the pool between ``min_pool_size`` (low watermark, triggers
+    a refill from ``DEFAULT_SOURCES``) and ``max_pool_size`` (high watermark) and re-validates proxies that
+    have sat idle for ``revalidate_after`` seconds, ``revalidate_batch`` per tick and without taking them
+    out of the pool, so ``get()`` is a plain dequeue in steady state.
+    Without the thread, ``get()`` refills inline as before.
+
+    Pass ``state_path`` to remember the stats of proxies that passed validation at least once. On startup,
+    proxies that were confirmed within ``revalidate_after`` seconds go straight into the pool (no source
+    download is needed when they fill it); the others wait in quarantine. Quarantined proxies are
+    re-validated at most ``probation_batch`` at a time, best score first: after the fresh candidates of a
+    refill, or on a maintenance tick once the pool is usable.
+    """
+
+    def __init__(self,
+                 min_pool_size: int = 100,
+                 max_pool_size: int = 500,
+                 validate_urls: Optional[List[str]] = None,
+                 target_probe_url: str | None = "https://fbref.com/robots.txt",
+                 validation_workers: int = 64,
+                 validation_timeout: float = 7.0,
+                 ewma_alpha: float = 0.3,
+                 base_cooldown: float = 60.0,
+                 max_cooldown: float = 3600.0,
+                 revalidate_after: float = 600.0,
+                 maintenance_interval: float = 5.0,
+                 state_path: Optional[Path] = None,
+                 forget_after: float = 7 * 86400,
+                 probation_batch: int = 32,
+                 revalidate_batch: int = 16):
+
+        self.min_pool_size = min_pool_size
+        self.max_pool_size = max_pool_size
+        self.validation_urls = validate_urls or VALIDATION_URLS
+        self.target_probe_url = target_probe_url
+        self.validation_workers = validation_workers
+        self.validation_timeout = validation_timeout
+        self.ewma_alpha = ewma_alpha
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self.revalidate_after = revalidate_after
+        self.maintenance_interval = maintenance_interval
+        self.probation_batch = probation_batch
+        self.revalidate_batch = revalidate_batch
+
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._seen = set()
+        self._stats: Dict[str, ProxyStats] = {}
+        self._heap = []          # (-score, seq, proxy); stale entries are skipped on pop
+        self._queued = set()     # proxies that currently have a live heap entry
+        self._quarantine = set()
+        self._seq = itertools.count()
+        self._last_refill = 0.0
+        self._refill_lock = threading.Lock()  # one refill at a time, inline or background
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._health = {
+            "refills": 0,
+            "last_refill_seconds": 0.0,
+            "validated": 0,
+            "passed": 0,
+            "revalidated": 0,
+            "warm_started": 0,
+        }
+        self._dirty = set()      # proxies whose stats changed since the last save
+        self._store = _ReputationStore(state_path) if state_path else None
+        if self._store is not None:
+            self._warm_start(self._store.load(forget_after))
+
+    def _warm_start(self, remembered: List[ProxyStats]) -> None:
+        now = time.time()
+        trusted = 0
+        with self._lock:
+            for stats in remembered:
+                self._seen.add(stats.proxy)
+                self._stats[stats.proxy] = stats
+                if stats.strikes == 0 and now - stats.last_checked < self.revalidate_after:
+                    self._push(stats.proxy)
+                    trusted += 1
+                else:
+                    # on probation: re-validated in batches once the pool is usable
+                    self._quarantine.add(stats.proxy)
+            self._health["warm_started"] = trusted
+        logger.info("Loaded %d known proxies, %d trusted without revalidation", len(remembered), trusted)
+
+    def save(self) -> None:
+        """Write changed proxy stats to ``state_path`` (no-op without one)."""
+        if self._store is None:
+            return
+        with self._lock:
+            # candidates that never passed are not worth probing again next run
+            changed = [ProxyStats(*astuple(self._stats[p])) for p in self._dirty
+                       if self._stats[p].successes or self._stats[p].latency is not None]
+            self._dirty.clear()
+        self._store.save(changed)
+
+    # -- bookkeeping (caller holds self._lock) --
+
+    def _push(self, proxy: str) -> None:
+        stats = self._stats[proxy]
+        if proxy not in self._queued and len(self._queued) >= self.max_pool_size:
+            # above the high watermark: park it for a later refill instead of growing the pool
+            stats.cooldown_until = 0.0
+            self._quarantine.add(proxy)
+            return
+        heapq.heappush(self._heap, (-stats.score(self.validation_timeout), next(self._seq), proxy))
+        self._queued.add(proxy)
+        self._quarantine.discard(proxy)
+        self._available.notify()
+
+    def _record_latency(self, stats: ProxyStats, latency: Optional[float]) -> None:
+        if latency is None:
+            return
+        if stats.latency is None:
+            stats.latency = latency
+        else:
+            stats.latency = self.ewma_alpha * latency + (1 - self.ewma_alpha) * stats.latency
+
+    def _pop_best(self) -> Optional[str]:
+        while self._heap:
+            _, _, proxy = heapq.heappop(self._heap)
+            if proxy in self._queued:
+                self._queued.discard(proxy)
+                return proxy
+        return None
+
+    # -- sources and validation --
 
     def _fetch_from_sources(self) -> List[str]:
         candidates: List[str] = []
         for source in DEFAULT_SOURCES:
             try:
-                resp = requests.get(url, timeout=10)
+                resp = requests.get(source, timeout=10)
                 if resp.ok and resp.text:
                     candidates.extend(_parse_candidates(resp.text))
             except Exception:
@@ -63,12 +272,15 @@ class ProxyPool:
         random.shuffle(candidates)
         return candidates[:self.max_pool_size]
 
-    def _validate_proxy(self, proxy: str, timeout: float = 7.0) -> bool:
+    def _validate_proxy(self, proxy: str, timeout: Optional[float] = None) -> Optional[float]:
+        """Return the probe latency in seconds if the proxy works, otherwise None."""
+        timeout = timeout or self.validation_timeout
         proxies = {"http": f"http://{proxy}", "https": f"http://{proxy}"}
         s = requests.Session()
         s.headers.update({"User-Agent": "Mozilla/5.0"})
-        #generic connectivity/IP check (any one success is fine)
-        for url in self.validation_urls:
+        started = time.perf_counter()
+        # generic connectivity/IP check (any one success is fine); two random endpoints are plenty
+        for url in random.sample(self.validation_urls, k=min(2, len(self.validation_urls))):
             try:
                 resp = s.get(url, proxies=proxies, timeout=timeout, allow_redirects=False)
                 if resp.status_code in (200, 204) and (resp.text is not None):
@@ -76,50 +288,231 @@ class ProxyPool:
             except Exception:
                 continue
         else:
-            return False
-        
+            return None
+        latency = time.perf_counter() - started
+
         if self.target_probe_url:
             try:
+                started = time.perf_counter()
                 r2 = s.head(self.target_probe_url, proxies=proxies, timeout=timeout, allow_redirects=True)
                 if r2.status_code >= 400:
-                    return False
+                    return None
+                latency = time.perf_counter() - started
             except Exception:
-                return False
-        return True
+                return None
+        return latency
+
+    def _validate_many(self, proxies: List[str], requeue: bool = True) -> int:
+        """
+        Validate concurrently; each proxy joins the pool as soon as it passes. With ``requeue=False`` a
+        passing proxy only gets its stats refreshed (and re-ranked if it is still queued), so a proxy that
+        is checked out meanwhile is not handed out twice. Returns the pass count.
+        """
+        if not proxies:
+            return 0
+        passed = 0
+        with ThreadPoolExecutor(max_workers=self.validation_workers) as executor:
+            futures = {executor.submit(self._validate_proxy, p): p for p in proxies}
+            for fut in as_completed(futures):
+                proxy = futures[fut]
+                try:
+                    latency = fut.result()
+                except Exception:
+                    latency = None
+                with self._lock:
+                    stats = self._stats.setdefault(proxy, ProxyStats(proxy))
+                    self._dirty.add(proxy)
+                    if latency is None:
+                        self._penalize(stats)
+                        continue
+                    self._record_latency(stats, latency)
+                    stats.strikes = 0
+                    stats.last_checked = time.time()
+                    if requeue or proxy in self._queued:
+                        self._push(proxy)
+                passed += 1
+        with self._lock:
+            self._health["validated"] += len(proxies)
+            self._health["passed"] += passed
+        get_metrics().incr("proxy_validated", len(proxies))
+        get_metrics().incr("proxy_validation_passed", passed)
+        return passed
+
+    def _probation_candidates(self) -> List[str]:
+        """
+        The best-scoring ``probation_batch`` quarantined proxies whose cooldown has passed. Only proxies that
+        passed validation before qualify; candidates that never worked are not probed again.
+        """
+        now = time.time()
+        with self._lock:
+            due = [st for st in map(self._stats.get, self._quarantine)
+                   if st.cooldown_until <= now and (st.successes or st.latency is not None)]
+            best = heapq.nlargest(self.probation_batch, due, key=lambda st: st.score(self.validation_timeout))
+        return [st.proxy for st in best]
+
+    def _probe_quarantine(self) -> None:
+        """Give a batch of quarantined proxies another chance while the pool has room for them."""
+        with self._lock:
+            if len(self._queued) >= self.max_pool_size:
+                return
+        if not self._refill_lock.acquire(blocking=False):
+            return
+        try:
+            self._validate_many(self._probation_candidates())
+        finally:
+            self._refill_lock.release()
 
     def _refill_if_needed(self) -> None:
         with self._lock:
-            should_refill = (self._pool.qsize() < self.min_pool_size) and (time.time() - self._last_refill > 2.0)
+            should_refill = (len(self._queued) < self.min_pool_size) and (time.time() - self._last_refill > 2.0)
             if not should_refill:
                 return
             self._last_refill = time.time()
-        candidates = self._fetch_from_sources()
-        for proxy in candidates:
+        if not self._refill_lock.acquire(blocking=False):
+            return  # another thread is already refilling
+        try:
+            started = time.perf_counter()
+            candidates = []
+            for proxy in self._fetch_from_sources():
+                with self._lock:
+                    if proxy in self._seen:
+                        continue
+                    self._seen.add(proxy)
+                candidates.append(proxy)
+            passed = self._validate_many(candidates)
             with self._lock:
-                if proxy in self._seen:
-                    continue
-                self._seen.add(proxy)
-            if self._validate_proxy(proxy):
-                self._pool.put(proxy)
+                topped_up = len(self._queued) >= self.min_pool_size
+            if not topped_up:
+                # sources came up short: a bounded batch of quarantined proxies gets another chance
+                probation = self._probation_candidates()
+                passed += self._validate_many(probation)
+                candidates += probation
+            self.save()
+            elapsed = time.perf_counter() - started
+            get_metrics().observe("proxy_refill", elapsed)
+            with self._lock:
+                self._health["refills"] += 1
+                self._health["last_refill_seconds"] = elapsed
+            logger.info("Validated %d/%d proxy candidates in %.1fs", passed, len(candidates), elapsed)
+        finally:
+            self._refill_lock.release()
+
+    def _revalidate_idle(self) -> None:
+        """
+        Re-validate the ``revalidate_batch`` proxies that have gone longest without a check past
+        ``revalidate_after`` seconds. They stay in the pool meanwhile: one that fails is quarantined, one
+        that passes is re-ranked, so ``get()`` never runs dry because a whole batch is being checked.
+        """
+        cutoff = time.time() - self.revalidate_after
+        with self._lock:
+            stale = heapq.nsmallest(
+                self.revalidate_batch,
+                (p for p in self._queued if self._stats[p].last_checked < cutoff),
+                key=lambda p: self._stats[p].last_checked,
+            )
+            self._health["revalidated"] += len(stale)
+        if stale:
+            self._validate_many(stale, requeue=False)
+
+    def _maintain(self) -> None:
+        while not self._stop.wait(self.maintenance_interval):
+            try:
+                self._refill_if_needed()
+                self._probe_quarantine()
+                self._revalidate_idle()
+                self.save()
+            except Exception:
+                logger.exception("Proxy pool maintenance failed")
+
+    def start(self) -> "ProxyPool":
+        """Start the background maintenance thread (idempotent) and return the pool."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._maintain, name="proxy-pool-maintenance", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.save()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def health(self) -> dict:
+        """Counters for monitoring: pool size, quarantine size, refill timing and validation pass rate."""
+        with self._lock:
+            health = dict(self._health)
+            health["size"] = len(self._queued)
+            health["quarantined"] = len(self._quarantine)
+            health["known"] = len(self._stats)
+        health["pass_rate"] = health["passed"] / health["validated"] if health["validated"] else None
+        health["background"] = self._thread is not None and self._thread.is_alive()
+        return health
+
+    # -- public API --
 
     def get(self, wait: float = 5.0) -> Optional[str]:
+        if self._thread is not None and self._thread.is_alive():
+            # the maintenance thread keeps the pool topped up; just dequeue
+            with self._available:
+                proxy = self._pop_best()
+                if proxy is None and self._available.wait(timeout=wait):
+                    proxy = self._pop_best()
+            return proxy
         self._refill_if_needed()
-        try:
-            return self._pool.get(timeout=wait)
-        except Empty:
+        with self._available:
+            proxy = self._pop_best()
+            if proxy is None:
+                self._available.wait(timeout=wait)
+                proxy = self._pop_best()
+        if proxy is None:
             # last-resort refill and try again quickly
             self._refill_if_needed()
-            try:
-                return self._pool.get(timeout=wait)
-            except Empty:
-                return None
-            
+            with self._available:
+                proxy = self._pop_best()
+                if proxy is None and self._available.wait(timeout=wait):
+                    proxy = self._pop_best()
+        return proxy
+
+    def _penalize(self, stats: ProxyStats) -> None:
+        stats.failures += 1
+        stats.strikes += 1
+        stats.last_failure = time.time()
+        cooldown = min(self.max_cooldown, self.base_cooldown * 2 ** (stats.strikes - 1))
+        stats.cooldown_until = stats.last_failure + cooldown
+        self._dirty.add(stats.proxy)
+        self._queued.discard(stats.proxy)
+        self._quarantine.add(stats.proxy)
+
     def mark_bad(self, proxy: str) -> None:
-            # Do not reinsert; it's implicitly dropped
-            pass
-
-        def mark_good(self, proxy: str) -> None:
-            # Optionally reinsert good proxies to keep pool healthy
-            if proxy:
-                self._pool.put(proxy)
-            
\ No newline at end of file
+        # quarantined with a growing cooldown, re-validated on a later refill
+        if not proxy:
+            return
+        get_metrics().incr("proxy_failures")
+        with self._lock:
+            self._penalize(self._stats.setdefault(proxy, ProxyStats(proxy)))
+
+    def mark_good(self, proxy: str, latency: Optional[float] = None) -> None:
+        # back into the pool, ranked by its updated score
+        if not proxy:
+            return
+        get_metrics().incr("proxy_successes")
+        with self._lock:
+            stats = self._stats.setdefault(proxy, ProxyStats(proxy))
+            stats.successes += 1
+            stats.strikes = 0
+            stats.last_checked = time.time()
+            self._record_latency(stats, latency)
+            self._dirty.add(proxy)
+            self._push(proxy)
+
+    def stats(self, proxy: str) -> Optional[ProxyStats]:
+        with self._lock:
+            return self._stats.get(proxy)
@@ -0,0 +1,183 @@
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+THROTTLE_STATUSES = {403, 429}
+
+
+@dataclass
+class BucketState:
+    tokens: float
+    updated: float
+    rate: float                 # tokens per second
+    blocked_until: float = 0.0  # set after a 429/403, nothing goes out before this
+
+
+@dataclass
+class LimiterStats:
+    acquired: int = 0
+    waited: float = 0.0
+    throttled: int = 0
+
+
+class _MemoryStore:
+    """Bucket state shared by the threads of one process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, BucketState] = {}
+
+    def update(self, key: str, default: BucketState, fn):
+        with self._lock:
+            state = self._buckets.get(key) or default
+            state, result = fn(state)
+            self._buckets[key] = state
+            return result
+
+
+class _SqliteStore:
+    """
+    Bucket state in a small SQLite file so several scraper processes draw from one budget. Every
+    update runs in a ``BEGIN IMMEDIATE`` transaction, which serialises writers across processes.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as con:
+            con.execute("""
+            CREATE TABLE IF NOT EXISTS bucket (
+              key           TEXT PRIMARY KEY,
+              tokens        REAL NOT NULL,
+              updated       REAL NOT NULL,
+              rate          REAL NOT NULL,
+              blocked_until REAL NOT NULL DEFAULT 0
+            )
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            con.execute("PRAGMA journal_mode = WAL;")
+            self._local.con = con
+        return con
+
+    def update(self, key: str, default: BucketState, fn):
+        con = self._connect()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            row = con.execute(
+                "SELECT tokens, updated, rate, blocked_until FROM bucket WHERE key = ?", (key,)
+            ).fetchone()
+            state = BucketState(*row) if row else default
+            state, result = fn(state)
+            con.execute(
+                "INSERT OR REPLACE INTO bucket (key, tokens, updated, rate, blocked_until) VALUES (?, ?, ?, ?, ?)",
+                (key, state.tokens, state.updated, state.rate, state.blocked_until),
+            )
+            con.execute("COMMIT")
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        return result
+
+
+class RateLimiter:
+    """
+    Token bucket per key (a host, or host plus proxy) with adaptive rate.
+
+    ``reserve`` takes a token and returns how long the caller must wait before using it, so the sync
+    ``acquire`` and async callers share one implementation. The rate starts at ``rate``; a 429/403
+    reported through ``report`` multiplies it by ``backoff_factor`` (down to ``min_rate``) and blocks
+    the key for ``cooldown`` seconds, and every success adds ``recovery_step`` back up to ``max_rate``.
+
+    Pass ``state_path`` to keep the buckets in SQLite and share them between processes.
+    """
+
+    def __init__(self,
+                 rate: float = 10 / 60,
+                 burst: float = 1.0,
+                 min_rate: float = 1 / 60,
+                 max_rate: Optional[float] = None,
+                 backoff_factor: float = 0.5,
+                 recovery_step: Optional[float] = None,
+                 cooldown: float = 60.0,
+                 state_path: Optional[Path] = None):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate or rate
+        self.backoff_factor = backoff_factor
+        self.recovery_step = recovery_step if recovery_step is not None else self.max_rate / 20
+        self.cooldown = cooldown
+        self._store = _SqliteStore(state_path) if state_path else _MemoryStore()
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, LimiterStats] = {}
+
+    def _default(self, now: float) -> BucketState:
+        return BucketState(tokens=self.burst, updated=now, rate=self.rate)
+
+    def _stat(self, key: str) -> LimiterStats:
+        # caller holds _stats_lock
+        return self._stats.setdefault(key, LimiterStats())
+
+    def reserve(self, key: str) -> float:
+        """Take a token for ``key`` and return the seconds to wait before it may be used."""
+        now = time.time()
+
+        def take(state: BucketState):
+            # tokens only accrue from the end of a block, so callers queued behind a 429 leave one
+            # per 1/rate after the cooldown instead of all at once
+            start = max(state.updated, state.blocked_until)
+            tokens = state.tokens
+            if now > start:
+                tokens = min(self.burst, tokens + (now - start) * state.rate)
+                start = now
+            tokens -= 1
+            wait = (start - now) + (-tokens / state.rate if tokens < 0 else 0.0)
+            return BucketState(tokens, start, state.rate, state.blocked_until), wait
+
+        wait = self._store.update(key, self._default(now), take)
+        with self._stats_lock:
+            stat = self._stat(key)
+            stat.acquired += 1
+            stat.waited += wait
+        return wait
+
+    def acquire(self, key: str) -> float:
+        """Block until a request for ``key`` may go out; returns the time spent waiting."""
+        wait = self.reserve(key)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def report(self, key: str, status: Optional[int]) -> None:
+        """Feed back the outcome of a request so the rate adapts to what the site tolerates."""
+        now = time.time()
+        throttled = status in THROTTLE_STATUSES
+
+        def adjust(state: BucketState):
+            if throttled:
+                rate = max(self.min_rate, state.rate * self.backoff_factor)
+                return BucketState(min(state.tokens, 0.0), state.updated, rate, now + self.cooldown), rate
+            rate = min(self.max_rate, state.rate + self.recovery_step)
+            return BucketState(state.tokens, state.updated, rate, state.blocked_until), rate
+
+        rate = self._store.update(key, self._default(now), adjust)
+        if throttled:
+            with self._stats_lock:
+                self._stat(key).throttled += 1
+            logger.warning("Throttled on %s (HTTP %s), slowing down to %.1f req/min", key, status, rate * 60)
+
+    def stats(self) -> Dict[str, LimiterStats]:
+        """Per-key counters of this process: requests, seconds spent waiting and throttle responses."""
+        with self._stats_lock:
+            return {k: LimiterStats(v.acquired, v.waited, v.throttled) for k, v in self._stats.items()}
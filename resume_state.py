@@ -1,30 +1,114 @@
 import json
+import os
 from pathlib import Path
 from typing import Set
 
 class ResumeState:
-    def __init__(self, state_file: Path):
+    """
+    Set of completed keys persisted as a snapshot (``progress.json``) plus an append-only journal
+    (``progress.log``, one key per line).
+
+    ``mark_done`` appends a single line, so its cost does not grow with the number of keys. The journal
+    is fsynced every ``fsync_every`` marks and folded into the snapshot every ``compact_every`` marks.
+    Loading replays the snapshot and then the journal; a torn last line from a crash is ignored.
+    """
+
+    def __init__(self, state_file: Path, fsync_every: int = 50, compact_every: int = 5000):
         self.state_file = state_file
+        self.log_file = state_file.with_suffix(".log")
+        self.fsync_every = fsync_every
+        self.compact_every = compact_every
         self.state_file.parent.mkdir(parents=True, exist_ok=True)
         self._done: Set[str] = set()
-        self.load()
+        self._log = None
+        self._unsynced = 0
+        self._logged = 0
+        self._load()
 
     def _load(self):
         if self.state_file.exists():
             try:
                 data = json.loads(self.state_file.read_text())
-                if isinstance(data, dict):
+                # list since the first release; dict accepted for older files
+                if isinstance(data, (list, dict)):
                     self._done = set(data)
             except Exception:
                 self._done = set()
+        if self.log_file.exists():
+            with self.log_file.open(encoding="utf-8") as fh:
+                for line in fh:
+                    if line.endswith("\n"):
+                        self._done.add(line.rstrip("\n"))
+                        self._logged += 1
+
+    def _open_log(self):
+        if self._log is None:
+            torn = False
+            if self.log_file.exists() and self.log_file.stat().st_size:
+                with self.log_file.open("rb") as fh:
+                    fh.seek(-1, os.SEEK_END)
+                    torn = fh.read(1) != b"\n"
+            self._log = self.log_file.open("a", encoding="utf-8")
+            if torn:
+                # terminate a line left half-written by a crash so it is not glued to the next key
+                self._log.write("\n")
+        return self._log
+
+    def flush(self):
+        """fsync the journal so every mark so far survives a power loss."""
+        if self._log is not None and self._unsynced:
+            self._log.flush()
+            os.fsync(self._log.fileno())
+            self._unsynced = 0
+
+    def compact(self):
+        """Write a fresh snapshot atomically and start an empty journal."""
+        tmp = self.state_file.with_suffix(".json.tmp")
+        with tmp.open("w", encoding="utf-8") as fh:
+            json.dump(sorted(self._done), fh)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, self.state_file)
+        # the snapshot now holds every key, so the journal can be dropped
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        self.log_file.unlink(missing_ok=True)
+        self._unsynced = 0
+        self._logged = 0
 
-    def save(self):
-        self.state_file.write_text(json.dumps(sorted(self._done)
+    save = compact
+
+    def close(self):
+        if self._logged:
+            self.compact()
+        elif self._log is not None:
+            self._log.close()
+            self._log = None
 
-    
     def is_done(self, key: str) -> bool:
         return key in self._done
-    
+
+    def done_keys(self) -> Set[str]:
+        """A copy of every completed key."""
+        return set(self._done)
+
     def mark_done(self, key: str):
+        if key in self._done:
+            return
         self._done.add(key)
-        self.save()
+        log = self._open_log()
+        log.write(key + "\n")
+        log.flush()  # hand it to the OS right away; fsync is batched
+        self._unsynced += 1
+        self._logged += 1
+        if self._unsynced >= self.fsync_every:
+            self.flush()
+        if self._logged >= self.compact_every:
+            self.compact()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
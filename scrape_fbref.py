@@ -1,357 +1,223 @@
 from pathlib import Path
 import argparse
 import logging
+import time
+from contextlib import nullcontext
 from utils import league_mapping, get_closest_league, get_season_links, get_scores_and_fixtures_url, get_league_links, \
-    create_driver, rate_limited_get, get_match_links
-from src.db import get_engine, upsert_league, upsert_team
+    get_match_links, scrape_match_links, fetch_page, set_offline, get_html_cache, save_cache, \
+    set_driver_pool_size
+from freshness import PAGE_REPORT, is_current_season
+from html_cache import CacheMiss
+from src.db import get_engine, upsert_league, BulkLoader, bulk_load
+from src.ledger import completed_keys, import_progress_file
+from src.features import update_features
+from src.goal_model import refit_goal_models
+from src.predict import predict_fixtures
 from src.ids import formalize_team_name, produce_match_id
 from sqlalchemy import text
-from selenium.webdriver.common.by import By
-from selenium.common.exceptions import NoSuchElementException, TimeoutException
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-import re
-from resume_state import ResumeState
-from pathlib import Path
-
-
-
-
-STAT_KEYS = [
-    "xg",
-    "xga",
-    "shots",
-    "shots_on_target",
-    "shots_on_target_pct",
-    "corners",
-    "fouls",
-    "yellow",
-    "red",
-    "possession",
-    "crosses",
-    "touches",
-    "tackles",
-    "interceptions",
-    "aerials_won",
-    "clearances",
-    "long_balls",
-    "passes",
-    "passes_completed",
-    "pass_accuracy",
-    "saves",
-    "saves_total",
-    "save_pct",
-]
+from driver_pool import shutdown_driver_pool
+from fbref_parser import STAT_KEYS, parse_match_report_html
+from parallel_ingest import CachedReportIngest, record_to_stats
+from pipeline import StagePipeline
+from metrics import METRICS_FILE, ProgressLine, get_metrics
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 START_SEASON_YEAR = 2010
-
-def match_stats_exists(conn, match_id: str) -> bool:
-    row = conn.execute(
-        text("SELECT 1 FROM team_match_stats WHERE match_id=:{"mid": match_id})
-    ).first()
-    return row is not None
-
-
-def parse_fixtures_table(fixtures_url: str):
-    # Return a list of match dicts from a Scores & Fixtures page.
-    logger.debug("Fetching fixtures from %s", fixtures_url)
-    driver = create_driver()
-    fixtures = []
-    try:
-        rate_limited_get(driver, fixtures_url)
-        try:
-            table = WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located(
-                    (
-                        By.XPATH,
-                        "//table[contains(@id,'sched')][.//th[@data-stat='home_team']]",
-                    )
-                )
+_progress: ProgressLine | None = None
+
+
+def _fixtures_done(n: int = 1) -> None:
+    get_metrics().incr("fixtures", n)
+    if _progress is not None:
+        _progress.advance(n)
+
+
+def add_match_report(loader: BulkLoader, match_row: dict, match_stats: dict, penalties) -> None:
+    """Queue a match together with its parsed report: penalties go into the match row, plus one stats row per side."""
+    match_id = match_row["match_id"]
+    match_row.update(home_penalty=penalties[0], away_penalty=penalties[1])
+    loader.add_match(match_row)
+    match_stats["home"]["xga"] = match_stats["away"].get("xg")
+    match_stats["away"]["xga"] = match_stats["home"].get("xg")
+    for is_home, team_id, side in [
+        (1, match_row["home_team_id"], "home"),
+        (0, match_row["away_team_id"], "away"),
+    ]:
+        stats = {
+            k: match_stats.get(side, {}).get(k) for k in STAT_KEYS
+        }
+        missing = {k for k, v in stats.items() if v is None}
+        if missing:
+            logger.debug(
+                "Missing stats %s for %s from %s",
+                ", ".join(sorted(missing)),
+                side,
+                match_row["source_url"],
             )
-        except TimeoutException:
-            logger.warning("No fixtures table found at %s", fixtures_url)
-            return fixtures
-        rows = table.find_elements(
-            By.XPATH,
-            ".//tbody/tr[not(contains(@class,'spacer')) and not(contains(@class,'thead'))]",
+        stats.update(
+            {
+                "match_id": match_id,
+                "team_id": team_id,
+                "is_home": is_home,
+            }
         )
-        for row in rows:
-            try:
-                date_cell = row.find_element(By.XPATH, "./*[@data-stat='date']")
-            except NoSuchElementException:
-                continue
-            match_date = date_cell.text.strip()
-            if not match_date:
-                continue
-            home = row.find_element(By.XPATH, "./*[@data-stat='home_team']").text.strip()
-            away = row.find_element(By.XPATH, "./*[@data-stat='away_team']").text.strip()
-            try:
-                score_text = row.find_element(By.XPATH, "./*[@data-stat='score']").text.strip()
-                if score_text:
-                    parts = re.split(r"[-–—]", score_text)
-                    if len(parts) >= 2:
-                        try:
-                            home_g, away_g = int(parts[0]), int(parts[1])
-                        except ValueError:
-                            logger.warning(
-                                "Invalid score numbers '%s' for %s vs %s",
-                                score_text,
-                                home,
-                                away,
-                            )
-                            home_g = away_g = None
-                    else:
-                        logger.warning(
-                            "Unexpected score format '%s' for %s vs %s",
-                            score_text,
-                            home,
-                            away,
-                        )
-                        home_g = away_g = None
-                else:
-                    home_g = away_g = None
-            except NoSuchElementException:
-                home_g = away_g = None
-            report_links = row.find_elements(
-                By.XPATH, "./*[@data-stat='match_report']//a"
-            )
-            report_url = (
-                report_links[0].get_attribute("href") if report_links else None
-            )
-            fixtures.append(
-                {
-                    "date": match_date,
-                    "home": home,
-                    "away": away,
-                    "home_g": int(home_g) if home_g else None,
-                    "away_g": int(away_g) if away_g else None,
-                    "url": report_url,
-                }
-            )
-    finally:
-        driver.quit()
-    logger.info("Parsed %d fixtures from %s", len(fixtures), fixtures_url)
-    return fixtures
-
-
-def _parse_percent(text: str) -> float | None:
-    match = re.search(r"(\d+(?:\.\d+)?)", text)
-    return float(match.group(1)) if match else None
-
-
-def _parse_ratio(text: str):
-    nums = re.findall(r"\d+", text)
-    made = int(nums[0]) if len(nums) > 0 else None
-    total = int(nums[1]) if len(nums) > 1 else None
-    pct = float(nums[2]) if len(nums) > 2 else (
-        (made / total * 100) if made is not None and total else None
-    )
-    return made, total, pct
-
+        loader.add_team_stats(stats)
 
-def _parse_number(text: str) -> int | None:
-    match = re.search(r"\d+", text)
-    return int(match.group(0)) if match else None
 
-
-def parse_match_report(report_url: str):
-    """Return per-team stats from a match report page."""
-    stats = {"home": {}, "away": {}}
-    penalties = (None, None)
-    driver = create_driver()
-    try:
-        rate_limited_get(driver, report_url)
-        # extract penalty shootout info from scorebox if present
-        try:
-            scorebox = driver.find_element(By.XPATH, "//div[contains(@class,'scorebox')]")
-            meta_divs = scorebox.find_elements(By.XPATH, ".//div")
-            for div in meta_divs:
-                txt = div.text.strip().lower()
-                if "penalties" in txt:
-                    nums = re.findall(r"\d+", txt)
-                    if len(nums) >= 2:
-                        penalties = (int(nums[0]), int(nums[1]))
-                    break
-        except NoSuchElementException:
-            pass
-        # top stats table
-        try:
-            xg_divs = driver.find_element(By.XPATH, "//div[@class='score_xg']")
-            if len(xg_divs) > 2:
-                stats["home"]["xg"] = float(xg_divs[0].text.strip())
-                stats["home"]["xg"] = float(xg_divs[1].text.strip())
-                logger.debug(
-                    "Parsed scoreboard xG: home=%s away=%s",
-                    stats["home"].get("xg"),
-                    stats["away"].get("xg")
-                )
-        except Exception:
-            logger.debug("score_xg elements not found on %s", report_url)
+def load_season_fixtures(matches_cache: Path, fixtures_url: str, from_cache: bool = False):
+    """
+    Return the fixtures of a season. When rebuilding from cache the stored fixtures page is re-parsed so
+    parser changes take effect; the JSON link cache is only a fallback for pages that were never stored.
+    """
+    if from_cache:
         try:
-            table = driver.find_element(By.XPATH, "//div[@id='team_stats']//table")
-            rows = table.find_elements(By.XPATH, ".//tr")
-            i = 0
-            while i < len(rows):
-                row = rows[i]
-                ths = row.find_elements(By.TAG_NAME, "th")
-                tds = row.find_elements(By.TAG_NAME, "td")
-                label = None
-                cells = None
-                if len(ths) == 1 and len(tds) == 0 and i + 1 < len(rows):
-                    # label row followed by data row
-                    label = ths[0].text.strip().lower()
-                    cells = rows[i + 1].find_elements(By.TAG_NAME, "td")
-                    i += 2
-                elif len(ths) == 1 and len(tds) >= 2:
-                    # label and data in same row
-                    label = ths[0].text.strip().lower()
-                    cells = tds
-                    i += 1
-                else:
-                    i += 1
-                    continue
-                if len(cells) < 2:
-                    continue
-                home_txt = cells[0].text.strip()
-                away_txt = cells[-1].text.strip()
-                logger.debug("Row '%s': home='%s' away='%s'", label, home_txt, away_txt)
-                if label == "possession":
-                    stats["home"]["possession"] = _parse_percent(home_txt)
-                    stats["away"]["possession"] = _parse_percent(away_txt)
-                elif label == "passing accuracy":
-                    h_made, h_tot, h_pct = _parse_ratio(home_txt)
-                    a_made, a_tot, a_pct = _parse_ratio(away_txt)
-                    stats["home"].update(
-                        {
-                            "passes_completed": h_made,
-                            "passes": h_tot,
-                            "pass_accuracy": h_pct,
-                        }
-                    )
-                    stats["away"].update(
-                        {
-                            "passes_completed": a_made,
-                            "passes": a_tot,
-                            "pass_accuracy": a_pct,
-                        }
-                    )
-                elif label == "shots on target":
-                    h_made, h_tot, h_pct = _parse_ratio(home_txt)
-                    a_made, a_tot, a_pct = _parse_ratio(away_txt)
-                    stats["home"].update(
-                        {
-                            "shots_on_target": h_made,
-                            "shots": h_tot,
-                            "shots_on_target_pct": h_pct,
-                        }
-                    )
-                    stats["away"].update(
-                        {
-                            "shots_on_target": a_made,
-                            "shots": a_tot,
-                            "shots_on_target_pct": a_pct,
-                        }
-                    )
-                elif label == "saves":
-                    h_made, h_tot, h_pct = _parse_ratio(home_txt)
-                    a_made, a_tot, a_pct = _parse_ratio(away_txt)
-                    stats["home"].update(
-                        {
-                            "saves": h_made,
-                            "saves_total": h_tot,
-                            "save_pct": h_pct,
-                        }
-                    )
-                    stats["away"].update(
-                        {
-                            "saves": a_made,
-                            "saves_total": a_tot,
-                            "save_pct": a_pct,
-                        }
-                    )
-                elif label == "cards":
-                    stats["home"]["yellow"] = len(
-                        cells[0].find_elements(By.CSS_SELECTOR, ".yellow_card")
-                    ) + len(
-                        cells[0].find_elements(By.CSS_SELECTOR, ".yellow_red_card")
-                    )
-                    stats["home"]["red"] = len(
-                        cells[0].find_elements(By.CSS_SELECTOR, ".red_card")
-                    ) + len(
-                        cells[0].find_elements(By.CSS_SELECTOR, ".yellow_red_card")
-                    )
-                    stats["away"]["yellow"] = len(
-                        cells[-1].find_elements(By.CSS_SELECTOR, ".yellow_card")
-                    ) + len(
-                        cells[-1].find_elements(By.CSS_SELECTOR, ".yellow_red_card")
-                    )
-                    stats["away"]["red"] = len(
-                        cells[-1].find_elements(By.CSS_SELECTOR, ".red_card")
-                    ) + len(
-                        cells[-1].find_elements(By.CSS_SELECTOR, ".yellow_red_card")
-                    )
-                    logger.debug(
-                        "Parsed cards: home_yellow=%s home_red=%s away_yellow=%s away_red=%s",
-                        stats["home"].get("yellow"),
-                        stats["home"].get("red"),
-                        stats["away"].get("yellow"),
-                        stats["away"].get("red"),
-                    )
-        except NoSuchElementException:
-            logger.warning("team_stats table not found on %s", report_url)
-            # extra stats table
-        try:
-            extra = driver.find_element(By.XPATH, "//div[@id='team_stats_extra']")
-            rows = extra.find_elements(By.XPATH, ".//tr")
-            label_map = {
-                "fouls": "fouls",
-                "corners": "corners",
-                "crosses": "crosses",
-                "touches": "touches",
-                "tackles": "tackles",
-                "interceptions": "interceptions",
-                "aerials won": "aerials_won",
-                "clearances": "clearances",
-                "long balls": "long_balls",
-            }
-            for row in rows:
-                try:
-                    label_el = row.find_elements(By.TAG_NAME, "th")
-                    if not label_el:
-                        continue
-                    label = label_el[0].text.strip().lower()
-                    if label not in label_map:
-                        continue
-                        cells = row.find_elements(By.TAG_NAME, "td")
-                        if len(cells) < 2:
-                            continue
-                        home_txt = cells[0].text.strip()
-                        away_txt = cells[-1].text.strip()
-                        key = label_map[label]
-                        stats["home"][key] = _parse_number(home_txt)
-                        stats["away"][key] = _parse_number(away_txt)
-                        logger.debug(
-                            "Parsed %s: home=%s away=%s",
-                            label,
-                            stats["home"].get(key),
-                            stats["away"].get(key),
-                        )
-                except Exception:
-                    continue
-        except NoSuchElementException:
-            logger.warning("team_stats_extra table not found on %s", report_url)
-    finally:
-        driver.quit()
-    #print(stats)
-    return stats, penalties
-
-
-def scrape_league(league_name: str, gender: str) -> None:
+            return scrape_match_links(fixtures_url)
+        except CacheMiss:
+            logger.warning("Fixtures page %s not cached, using %s", fixtures_url, matches_cache)
+    return get_match_links(str(matches_cache), fixtures_url)
+
+
+def ingest_cached_reports(loader: BulkLoader, ingest: CachedReportIngest, pending: dict) -> None:
+    """
+    Parse the cached reports of ``pending`` (match_id -> match row) on the worker pool and queue the
+    results on ``loader`` from this process, which stays the only writer.
+    """
+    cache = get_html_cache()
+    items = []
+    for match_id, match_row in pending.items():
+        entry = cache.lookup(match_row["source_url"])
+        if entry is not None and entry.path.exists():
+            items.append((match_id, str(entry.path)))
+        else:
+            logger.warning("Match report %s not cached", match_row["source_url"])
+    for record in ingest.parse(items):
+        match_id, parse_ms, error = record[0], record[4], record[5]
+        match_row = pending.pop(match_id)
+        get_metrics().observe("parse", parse_ms / 1000, match_row["source_url"])
+        _fixtures_done()
+        ledger_row = {
+            "key": match_id,
+            "url": match_row["source_url"],
+            "league_id": match_row["league_id"],
+            "season": match_row["season"],
+            "parse_ms": parse_ms,
+        }
+        if error is not None:
+            loader.add_match(match_row)
+            loader.add_scrape_state(ledger_row | {"status": "failed", "last_error": error})
+        else:
+            match_stats, penalties = record_to_stats(record)
+            add_match_report(loader, match_row, match_stats, penalties)
+            loader.add_scrape_state(ledger_row | {"status": "done"})
+        loader.end_match()
+    # matches whose report is missing or failed to parse still get their row
+    for match_row in pending.values():
+        loader.add_match(match_row)
+        loader.end_match()
+    _fixtures_done(len(pending))
+
+
+def fixture_match_row(league_alias: str, season_name: str, f: dict) -> dict:
+    """Build the ``match`` row of a parsed fixture."""
+    home_id = formalize_team_name(f["home"])
+    away_id = formalize_team_name(f["away"])
+    return {
+        "match_id": produce_match_id(league_alias, season_name, f["date"], home_id, away_id),
+        "league_id": league_alias,
+        "season": season_name,
+        "match_date": f["date"],
+        "status": "played" if f["home_g"] is not None else "scheduled",
+        "home_team_id": home_id,
+        "away_team_id": away_id,
+        "home_goals": f["home_g"],
+        "away_goals": f["away_g"],
+        "source_url": f["url"],
+    }
+
+
+def fetch_report_stage(match_row: dict) -> dict:
+    """Pipeline stage 1: fetch the report page of ``match_row`` into a record for the next stages."""
+    record = {"match_row": match_row, "html": None, "missing": False, "error": None, "timings": {}}
+    started = time.perf_counter()
+    try:
+        record["html"] = fetch_page(match_row["source_url"], PAGE_REPORT)
+    except CacheMiss:
+        record["missing"] = True
+    except Exception as e:
+        record["error"] = repr(e)
+    record["timings"]["fetch_ms"] = (time.perf_counter() - started) * 1000
+    return record
+
+
+def parse_report_stage(record: dict) -> dict:
+    """Pipeline stage 2: parse the fetched page; the HTML is dropped so it does not sit in the write queue."""
+    page_html, record["html"] = record["html"], None
+    if page_html is None:
+        return record
+    started = time.perf_counter()
+    try:
+        record["stats"], record["penalties"] = parse_match_report_html(page_html, record["match_row"]["source_url"])
+    except Exception as e:
+        record["error"] = repr(e)
+    elapsed = time.perf_counter() - started
+    record["timings"]["parse_ms"] = elapsed * 1000
+    get_metrics().observe("parse", elapsed, record["match_row"]["source_url"])
+    return record
+
+
+def write_report(loader: BulkLoader, record: dict) -> None:
+    """Pipeline stage 3 (runs in the thread that owns ``loader``): queue the match, its stats and ledger row."""
+    _write_report(loader, record)
+    _fixtures_done()
+
+
+def _write_report(loader: BulkLoader, record: dict) -> None:
+    match_row = record["match_row"]
+    ledger_row = {
+        "key": match_row["match_id"],
+        "url": match_row["source_url"],
+        "league_id": match_row["league_id"],
+        "season": match_row["season"],
+    } | record["timings"]
+    if record["missing"]:
+        logger.warning("Match report %s not cached", match_row["source_url"])
+        loader.add_match(match_row)
+    elif record["error"] is not None:
+        logger.error("Failed to scrape %s: %s", match_row["source_url"], record["error"])
+        loader.add_match(match_row)
+        loader.add_scrape_state(ledger_row | {"status": "failed", "last_error": record["error"]})
+    else:
+        logger.debug("Scraped stats for %s: %s", match_row["match_id"], record["stats"])
+        add_match_report(loader, match_row, record["stats"], record["penalties"])
+        loader.add_scrape_state(ledger_row | {"status": "done"})
+    loader.end_match()
+
+
+def scrape_report(loader: BulkLoader, match_row: dict) -> None:
+    """Fetch and parse the report of ``match_row`` and queue it with its ledger row; raises if it failed."""
+    record = parse_report_stage(fetch_report_stage(match_row))
+    write_report(loader, record)
+    if record["error"] is not None:
+        raise RuntimeError(record["error"])
+
+
+def pipeline_reports(loader: BulkLoader, pending: dict, fetch_workers: int = 1, parse_workers: int = 1,
+                     queue_size: int = 64) -> None:
+    """
+    Scrape the reports of ``pending`` (match_id -> match row) with fetching, parsing and writing overlapped:
+    pages load on ``fetch_workers`` threads while earlier ones are parsed and written, and the SQLite write
+    lock is only taken by ``loader``'s batched flushes in this thread, never while a page loads.
+    """
+    stages = [("fetch", fetch_report_stage, fetch_workers), ("parse", parse_report_stage, parse_workers)]
+    for record in StagePipeline(stages, queue_size).run(pending.values()):
+        write_report(loader, record)
+
+
+def resolve_league(league_name: str, gender: str):
+    """Return ``(gender_full, closest, league_alias, league_dir, seasons)``, or None if the league is unknown."""
     gender_full = "Men" if gender.upper() == "M" else "Women"
-    logger.info("Scraping league %s for %s", league_name, gender_full)
     cache_root = Path("data/cache") / gender_full
     cache_root.mkdir(parents=True, exist_ok=True)
     leagues_cache = cache_root / "league_links.json"
@@ -359,16 +225,28 @@ def scrape_league(league_name: str, gender: str) -> None:
     closest, info = get_closest_league(league_name, str(leagues_cache), gender)
     if not closest:
         logger.error("Could not find league %s for %s", league_name, gender_full)
-        return
-    print(f"Scraping league {closest} ({gender_full})...")
+        return None
     league_alias = league_mapping.get(closest, closest)
     league_dir = cache_root / league_alias
     league_dir.mkdir(parents=True, exist_ok=True)
     seasons_cache = league_dir / "season_links.json"
     seasons = get_season_links(str(seasons_cache), info["url"])
+    return gender_full, closest, league_alias, league_dir, seasons
+
+
+def scrape_league(league_name: str, gender: str, from_cache: bool = False,
+                  ingest: CachedReportIngest | None = None, batch_size: int = 500,
+                  fetch_workers: int = 1, parse_workers: int = 1, queue_size: int = 64) -> None:
+    logger.info("Scraping league %s for %s", league_name, gender)
+    resolved = resolve_league(league_name, gender)
+    if resolved is None:
+        return
+    gender_full, closest, league_alias, league_dir, seasons = resolved
+    print(f"Scraping league {closest} ({gender_full})...")
 
     engine = get_engine(gender_full.lower())
-    with engine.connect() as conn:
+    # a rebuild rewrites everything from local files, so it can trade durability for speed
+    with (bulk_load(engine) if from_cache else engine.connect()) as conn:
         with conn.begin():
             upsert_league(conn, league_alias, closest)
         for season_name, season_url in seasons.items():
@@ -378,192 +256,195 @@ def scrape_league(league_name: str, gender: str) -> None:
                     "Skipping season %s with start year %s", season_name, start_year
                 )
                 continue
-            fixtures_url = get_scores_and_fixtures_url(season_url)
+            try:
+                fixtures_url = get_scores_and_fixtures_url(season_url)
+            except CacheMiss:
+                logger.warning("Season page %s not cached, skipping %s", season_url, season_name)
+                continue
             if not fixtures_url:
                 logger.warning("No fixtures URL found for season %s", season_name)
                 continue
             season_dir = league_dir / season_name
             season_dir.mkdir(parents=True, exist_ok=True)
             matches_cache = season_dir / "match_links.json"
-            state = ResumeState(season_dir / "progress.json")
+            imported = import_progress_file(conn, season_dir / "progress.json", league_alias, season_name)
+            if imported:
+                logger.info("Imported %d keys from legacy progress file for %s", imported, season_name)
+            with conn.begin():
+                done = completed_keys(conn, league_alias, season_name)
 
-            fixtures = get_match_links(str(matches_cache), fixtures_url)
+            fixtures = load_season_fixtures(matches_cache, fixtures_url, from_cache)
             logger.info(
                 "Processing %d fixtures for season %s", len(fixtures), season_name
             )
-            for f in fixtures:
-                try:
-                    with conn.begin():
-                        home_id = formalize_team_name(f["home"])
-                        away_id = formalize_team_name(f["away"])
-                        upsert_team(conn, home_id, f["home"])
-                        upsert_team(conn, away_id, f["away"])
-                        match_id = produce_match_id(
-                            league_alias,
-                            season_name,
-                            f["date"],
-                            home_id,
-                            away_id,
-                        )
-
-                        if state.is_done(match_id):
-                            logger.debug("Skipping %s (marked done in progress file)", match_id)
+            if _progress is not None:
+                _progress.add_total(len(fixtures))
+            pending_reports = {}
+            with BulkLoader(conn, batch_size) as loader:
+                for f in fixtures:
+                    try:
+                        match_row = fixture_match_row(league_alias, season_name, f)
+                        match_id = match_row["match_id"]
+
+                        # a cache rebuild re-derives every row, so the ledger does not apply
+                        if not from_cache and match_id in done:
+                            logger.debug("Skipping %s (done according to scrape_state)", match_id)
+                            _fixtures_done()
                             continue
 
-                        if match_stats_exists(conn, match_id):
-                            logger.debug("Skipping %s (stats already exist in DB)", match_id)
-                            state.mark_done(match_id)
-                            continue
-                        
-                        status = (
-                            "played" if f["home_g"] is not None else "scheduled"
+                        loader.add_team(match_row["home_team_id"], f["home"])
+                        loader.add_team(match_row["away_team_id"], f["away"])
+                        if not f["url"]:
+                            loader.add_match(match_row)
+                            loader.end_match()
+                            _fixtures_done()
+                        else:
+                            # reports go through the worker pool (cache rebuild) or the fetch/parse
+                            # pipeline once the season's fixtures are queued
+                            pending_reports[match_id] = match_row
+                    except Exception:
+                        logger.exception(
+                            "Failed to process fixture %s vs %s on %s",
+                            f.get("home"),
+                            f.get("away"),
+                            f.get("date"),
                         )
-                        conn.execute(
-                            text(
-                                """
-                                INSERT INTO match (
-                                    match_id, league_id, season, match_date, status,
-                                    home_team_id, away_team_id, home_goals, away_goals, home_penalty,
-                                    away_penalty, source_url
-                                ) VALUES (
-                                    :match_id, :league_id, :season, :match_date, :status,
-                                    :home_team_id, :away_team_id, :home_goals, :away_goals, :home_penalty,
-                                    :away_penalty, :source_url
-                                )
-                                ON CONFLICT(match_id) DO NOTHING
-                                """
-                            ),
-                            {
-                                "match_id": match_id,
-                                "league_id": league_alias,
-                                "season": season_name,
-                                "match_date": f["date"],
-                                "status": status,
-                                "home_team_id": home_id,
-                                "away_team_id": away_id,
-                                "home_goals": f["home_g"],
-                                "away_goals": f["away_g"],
-                                "home_penalty": None,
-                                "away_penalty": None,
-                                "source_url": f["url"],
-                            },
-                        )
-                        if f["url"]:
-                            match_stats, penalties = parse_match_report(f["url"])
-                            logger.debug(
-                                "Scraped stats for %s vs %s: %s",
-                                f["home"],
-                                f["away"],
-                                match_stats,
-                            )
-                            # Update penalty shootout results if present
-                            if any(p is not None for p in penalties):
-                                conn.execute(
-                                    text(
-                                        """
-                                        UPDATE match
-                                        SET home_penalty=:home_penalty, away_penalty=:away_penalty
-                                        WHERE match_id=:match_id
-                                        """
-                                    ),
-                                    {
-                                        "match_id": match_id,
-                                        "home_penalty": penalties[0],
-                                        "away_penalty": penalties[1],
-                                    },
-                                )
-                            match_stats["home"]["xga"] = match_stats["away"].get("xg")
-                            match_stats["away"]["xga"] = match_stats["home"].get("xg")
-                            for is_home, team_id, side in [
-                                (1, home_id, "home"),
-                                (0, away_id, "away"),
-                            ]:
-                                stats = {
-                                    k: match_stats.get(side, {}).get(k) for k in STAT_KEYS
-                                }
-                                missing = {
-                                    k
-                                    for k in STAT_KEYS
-                                    if match_stats.get(side, {}).get(k) is None
-                                }
-                                if missing:
-                                    logger.debug(
-                                        "Missing stats %s for %s from %s",
-                                        ", ".join(sorted(missing)),
-                                        side,
-                                        f["url"],
-                                    )
-                                stats.update(
-                                    {
-                                        "match_id": match_id,
-                                        "team_id": team_id,
-                                        "is_home": is_home,
-                                    }
-                                )
-                                conn.execute(
-                                    text(
-                                        """
-                                        INSERT INTO team_match_stats (
-                                            match_id, team_id, is_home,
-                                            xg, xga, shots, shots_on_target, shots_on_target_pct, corners, fouls,
-                                            yellow, red, possession, crosses, touches, tackles, interceptions,
-                                            aerials_won, clearances, long_balls, passes, passes_completed,
-                                            pass_accuracy, saves, saves_total, save_pct
-                                        ) VALUES (
-                                            :match_id, :team_id, :is_home,
-                                            :xg, :xga, :shots, :shots_on_target, :shots_on_target_pct, :corners, :fouls,
-                                            :yellow, :red, :possession, :crosses, :touches, :tackles, :interceptions,
-                                            :aerials_won, :clearances, :long_balls, :passes, :passes_completed,
-                                            :pass_accuracy, :saves, :saves_total, :save_pct
-                                        )
-                                        ON CONFLICT(match_id, team_id) DO UPDATE SET
-                                            xg=excluded.xg,
-                                            xga=excluded.xga,
-                                            shots=excluded.shots,
-                                            shots_on_target=excluded.shots_on_target,
-                                            shots_on_target_pct=excluded.shots_on_target_pct,
-                                            corners=excluded.corners,
-                                            fouls=excluded.fouls,
-                                            yellow=excluded.yellow,
-                                            red=excluded.red,
-                                            possession=excluded.possession,
-                                            crosses=excluded.crosses,
-                                            touches=excluded.touches,
-                                            tackles=excluded.tackles,
-                                            interceptions=excluded.interceptions,
-                                            aerials_won=excluded.aerials_won,
-                                            clearances=excluded.clearances,
-                                            long_balls=excluded.long_balls,
-                                            passes=excluded.passes,
-                                            passes_completed=excluded.passes_completed,
-                                            pass_accuracy=excluded.pass_accuracy,
-                                            saves=excluded.saves,
-                                            saves_total=excluded.saves_total,
-                                            save_pct=excluded.save_pct
-                                        """
-                                    ),
-                                    stats,
-                                )
-                            state.mark_done(match_id)
-                except Exception:
-                    logger.exception(
-                        "Failed to process fixture %s vs %s on %s",
-                        f.get("home"),
-                        f.get("away"),
-                        f.get("date"),
-                    )
+                        _fixtures_done()
+                if pending_reports and ingest is not None:
+                    ingest_cached_reports(loader, ingest, pending_reports)
+                elif pending_reports:
+                    pipeline_reports(loader, pending_reports, fetch_workers, parse_workers, queue_size)
+
+
+def current_season(seasons: dict):
+    """``(name, url)`` of the latest season that is still running, or None."""
+    running = [(name, url) for name, url in seasons.items() if is_current_season(name)]
+    return max(running, key=lambda s: s[0]) if running else None
+
+
+def update_league(league_name: str, gender: str, batch_size: int = 500) -> dict:
+    """
+    Matchday update: refresh only the current season's fixtures page and diff it against the stored
+    ``match`` rows. New fixtures are inserted, scheduled matches that now have a result are promoted to
+    played with their report, played matches without a finished report are retried, and scheduled rows
+    that vanished from the page (rescheduled fixtures get a new match_id) are deleted, unless the page
+    came back empty or a fixture failed. Past seasons are not touched. Returns the counts per outcome.
+    """
+    counts = {"new": 0, "promoted": 0, "retried": 0, "unchanged": 0, "removed": 0}
+    resolved = resolve_league(league_name, gender)
+    if resolved is None:
+        return counts
+    gender_full, closest, league_alias, league_dir, seasons = resolved
+    season = current_season(seasons)
+    if season is None:
+        logger.info("No running season for %s, nothing to update", closest)
+        return counts
+    season_name, season_url = season
+    # the season page is served from the cache for FRESHNESS_POLICY's index TTL
+    fixtures_url = get_scores_and_fixtures_url(season_url)
+    if not fixtures_url:
+        logger.warning("No fixtures URL found for season %s", season_name)
+        return counts
+    season_dir = league_dir / season_name
+    season_dir.mkdir(parents=True, exist_ok=True)
+    fixtures = scrape_match_links(fixtures_url)
+    save_cache(fixtures, season_dir / "match_links.json")
 
-
-def main(debug: bool = True):
+    engine = get_engine(gender_full.lower())
+    with engine.connect() as conn:
+        with conn.begin():
+            upsert_league(conn, league_alias, closest)
+            stored = dict(conn.execute(
+                text("SELECT match_id, status FROM match WHERE league_id = :league_id AND season = :season"),
+                {"league_id": league_alias, "season": season_name},
+            ).all())
+            done = completed_keys(conn, league_alias, season_name)
+
+        failed = 0
+        with BulkLoader(conn, batch_size) as loader:
+            for f in fixtures:
+                try:
+                    match_row = fixture_match_row(league_alias, season_name, f)
+                    match_id = match_row["match_id"]
+                    status = stored.pop(match_id, None)
+                    # a played fixture without a report link is as complete as it will get once stored
+                    settled = match_row["status"] == "scheduled" or not f["url"]
+                    if match_id in done or (status == match_row["status"] and settled):
+                        counts["unchanged"] += 1
+                        continue
+                    # a stored 'played' row that is not done had its report fail or go missing last time
+                    counts[{None: "new", "scheduled": "promoted"}.get(status, "retried")] += 1
+                    loader.add_team(match_row["home_team_id"], f["home"])
+                    loader.add_team(match_row["away_team_id"], f["away"])
+                    if f["url"]:
+                        scrape_report(loader, match_row)
+                    else:
+                        loader.add_match(match_row)
+                        loader.end_match()
+                except Exception:
+                    failed += 1
+                    logger.exception("Failed to update fixture %s vs %s on %s", f.get("home"), f.get("away"),
+                                     f.get("date"))
+
+        vanished = [match_id for match_id, status in stored.items() if status == "scheduled"]
+        if vanished and (not fixtures or failed):
+            # an empty or partly unreadable page says nothing about which fixtures are really gone
+            logger.warning("Keeping %d scheduled %s %s fixtures missing from the page (%d fixtures, %d failed)",
+                           len(vanished), league_alias, season_name, len(fixtures), failed)
+        elif vanished:
+            with conn.begin():
+                params = [{"match_id": m} for m in vanished]
+                conn.execute(text("DELETE FROM match_features WHERE match_id = :match_id"), params)
+                conn.execute(text("DELETE FROM prediction WHERE match_id = :match_id"), params)
+                conn.execute(text("DELETE FROM match WHERE match_id = :match_id"), params)
+            counts["removed"] = len(vanished)
+    logger.info("Updated %s %s: %s", league_alias, season_name, counts)
+    return counts
+
+
+def main(debug: bool = True, from_cache: bool = False, workers: int | None = None, chunk_size: int = 16,
+         batch_size: int = 500, update: bool = False, fetch_workers: int = 1, parse_workers: int = 1,
+         queue_size: int = 64, metrics_out: Path | None = METRICS_FILE, progress: bool = False):
+    global _progress
     if debug:
         logging.getLogger().setLevel(logging.DEBUG)
+    if progress:
+        _progress = ProgressLine("fixtures")
+    set_driver_pool_size(fetch_workers)
+    if from_cache:
+        set_offline(True)
+        logger.info("Rebuilding from %d cached pages, no network access", len(get_html_cache()))
     cache_root = Path("data/cache") / "Men"
     cache_root.mkdir(parents=True, exist_ok=True)
     leagues_cache = cache_root / "league_links.json"
-    men_leagues, _ = get_league_links(str(leagues_cache))
-    for league_name in league_mapping:
-        if league_name in men_leagues:
-            scrape_league(league_name, "M")
+    ingest_ctx = CachedReportIngest(max_workers=workers, chunksize=chunk_size) if from_cache else nullcontext()
+    try:
+        with ingest_ctx as ingest:
+            men_leagues, _ = get_league_links(str(leagues_cache))
+            for league_name in league_mapping:
+                if league_name not in men_leagues:
+                    continue
+                if update:
+                    update_league(league_name, "M", batch_size=batch_size)
+                else:
+                    scrape_league(
+                        league_name, "M", from_cache=from_cache, ingest=ingest, batch_size=batch_size,
+                        fetch_workers=fetch_workers, parse_workers=parse_workers, queue_size=queue_size,
+                    )
+            if update:
+                # only the teams that played since the last run get new features
+                update_features("men")
+                # warm-started from the stored fits; leagues without new results are skipped
+                refit_goal_models("men")
+                predict_fixtures("men")
+    finally:
+        shutdown_driver_pool()
+        if _progress is not None:
+            _progress.close()
+        metrics = get_metrics()
+        metrics.log_summary()
+        if metrics_out:
+            logger.info("Run metrics written to %s", metrics.write(metrics_out))
 
 
 if __name__ == "__main__":
@@ -571,8 +452,59 @@ if __name__ == "__main__":
     parser.add_argument(
         "--debug", action="store_true", help="Enable debug logging"
     )
+    parser.add_argument(
+        "--from-cache",
+        action="store_true",
+        help="Rebuild match and team_match_stats from the stored HTML cache without network access",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Parser processes for --from-cache (default: CPU count)"
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, default=16, help="Match reports handed to a parser process at a time"
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=500, help="Matches written per bulk insert transaction"
+    )
+    parser.add_argument(
+        "--fetch-workers", type=int, default=1, help="Browser instances loading match reports concurrently"
+    )
+    parser.add_argument(
+        "--parse-workers", type=int, default=1, help="Threads parsing fetched match reports"
+    )
+    parser.add_argument(
+        "--queue-size", type=int, default=64, help="Reports buffered between fetch, parse and write"
+    )
+    parser.add_argument(
+        "--metrics-out",
+        type=Path,
+        default=METRICS_FILE,
+        help="Where to write the run's timings and counters (.prom for Prometheus textfile, else JSON)",
+    )
+    parser.add_argument(
+        "--progress", action="store_true", help="Show a live fixtures/min and ETA line on stderr"
+    )
+    parser.add_argument(
+        "--update",
+        action="store_true",
+        help="Only refresh the current season's fixtures and fetch reports of newly played matches",
+    )
     args = parser.parse_args()
-    main(debug=args.debug)
+    if args.update and args.from_cache:
+        parser.error("--update needs the network and cannot be combined with --from-cache")
+    main(
+        debug=args.debug,
+        from_cache=args.from_cache,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        batch_size=args.batch_size,
+        update=args.update,
+        fetch_workers=args.fetch_workers,
+        parse_workers=args.parse_workers,
+        queue_size=args.queue_size,
+        metrics_out=args.metrics_out,
+        progress=args.progress,
+    )
 
 
 
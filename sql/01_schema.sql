@@ -71,3 +71,79 @@ CREATE INDEX IF NOT EXISTS idx_match_date ON match(match_date);
 CREATE INDEX IF NOT EXISTS idx_match_league_season ON match(league_id, season);
 CREATE INDEX IF NOT EXISTS idx_tms_team_date ON team_match_stats(team_id);
 
+
+-- scrape ledger: one row per unit of scrape work (a match report, keyed by match_id)
+CREATE TABLE IF NOT EXISTS scrape_state (
+  key           TEXT PRIMARY KEY,       -- match_id for match reports
+  url           TEXT,
+  league_id     TEXT,
+  season        TEXT,
+  status        TEXT NOT NULL,          -- 'done'|'failed'
+  attempts      INTEGER NOT NULL DEFAULT 0,
+  last_error    TEXT,
+  fetch_ms      REAL,                   -- NULL when the report was read from the HTML cache (--from-cache)
+  parse_ms      REAL,
+  updated_at    TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_scrape_state_season ON scrape_state(league_id, season, status);
+CREATE INDEX IF NOT EXISTS idx_scrape_state_status ON scrape_state(status, updated_at);
+
+
+-- rolling form per team going into each match (src/features.py); only matches before match_date count
+CREATE TABLE IF NOT EXISTS match_features (
+  match_id            TEXT NOT NULL REFERENCES match(match_id),
+  team_id             TEXT NOT NULL REFERENCES team(team_id),
+  is_home             INTEGER NOT NULL CHECK (is_home IN (0,1)),
+  opponent_id         TEXT NOT NULL,
+  match_date          DATE NOT NULL,
+  matches_played      INTEGER NOT NULL,   -- played matches in the window, 0 before a team's first match
+  xg_avg              REAL,
+  xga_avg             REAL,
+  shots_avg           REAL,
+  shots_on_target_avg REAL,
+  possession_avg      REAL,
+  pass_accuracy_avg   REAL,
+  goals_for_avg       REAL,
+  goals_against_avg   REAL,
+  points_avg          REAL,
+  venue_xg_avg        REAL,               -- same venue only: home form for the home side, away for the away side
+  venue_xga_avg       REAL,
+  venue_points_avg    REAL,
+  rest_days           INTEGER,
+  updated_at          TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (match_id, team_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_match_features_date ON match_features(match_date);
+
+-- current Elo and Pi-ratings per team (src/ratings.py), one scale across all competitions
+CREATE TABLE IF NOT EXISTS team_rating (
+  team_id         TEXT PRIMARY KEY REFERENCES team(team_id),
+  elo             REAL NOT NULL,
+  pi_home         REAL NOT NULL,
+  pi_away         REAL NOT NULL,
+  matches         INTEGER NOT NULL,
+  last_match_date DATE,
+  updated_at      TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- outcome and scoreline probabilities for scheduled fixtures (src/predict.py), one row per model version
+CREATE TABLE IF NOT EXISTS prediction (
+  match_id           TEXT NOT NULL REFERENCES match(match_id),
+  model_version      TEXT NOT NULL,
+  fitted_as_of       DATE,
+  p_home             REAL NOT NULL,
+  p_draw             REAL NOT NULL,
+  p_away             REAL NOT NULL,
+  exp_home_goals     REAL NOT NULL,
+  exp_away_goals     REAL NOT NULL,
+  likely_home_goals  INTEGER NOT NULL,  -- most likely scoreline
+  likely_away_goals  INTEGER NOT NULL,
+  p_likely_score     REAL NOT NULL,
+  p_over_2_5         REAL NOT NULL,
+  p_btts             REAL NOT NULL,     -- both teams score
+  top_scores         TEXT NOT NULL,     -- JSON [[home, away, p], ...] of the most likely scorelines
+  predicted_at       TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (match_id, model_version)
+);
@@ -1,18 +1,91 @@
+import logging
+from contextlib import contextmanager
 from pathlib import Path
 from sqlalchemy import create_engine, text, event
+from metrics import get_metrics
+from src.ledger import SCRAPE_STATE_COLUMNS, SCRAPE_STATE_UPSERT
 
-def get_engine(gender: str = "men"):
-    """Return a SQLite engine for the specified gender's database."""
+logger = logging.getLogger(__name__)
+
+# PRAGMAs applied to every new connection. WAL lets feature extraction and training read the DB while
+# the scraper writes; synchronous=NORMAL is durable across application crashes under WAL.
+PERFORMANCE_PROFILES = {
+    "default": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 30000,
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,  # negative means KiB, i.e. 64 MiB
+        "temp_store": "MEMORY",
+    },
+    "safe": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "busy_timeout": 30000,
+    },
+    "readonly": {
+        "query_only": "ON",
+        "busy_timeout": 30000,
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,
+        "temp_store": "MEMORY",
+    },
+}
+
+
+def get_engine(gender: str = "men", profile: str = "default"):
+    """Return a SQLite engine for the specified gender's database, tuned with a ``PERFORMANCE_PROFILES`` entry."""
     db_path = Path(f"data/db/{gender.lower()}.sqlite")
     db_path.parent.mkdir(parents=True, exist_ok=True)
     engine = create_engine(f"sqlite:///{db_path}", future=True)
+    pragmas = PERFORMANCE_PROFILES[profile]
 
     @event.listens_for(engine, "connect")
-    def _fk_on(dbapi_conn, _):
+    def _on_connect(dbapi_conn, _):
         dbapi_conn.execute("PRAGMA foreign_keys = ON;")
+        for name, value in pragmas.items():
+            dbapi_conn.execute(f"PRAGMA {name} = {value};")
 
     return engine
 
+
+@contextmanager
+def bulk_load(engine, check: bool = True):
+    """
+    Yield a connection tuned for a large ingest: durability is relaxed (``synchronous=OFF``) and foreign
+    keys are not enforced per statement. On the way out the connection is restored, and with ``check``
+    a foreign key check and ``quick_check`` are run; any problem raises ``RuntimeError``.
+
+    A crash during the load can lose the last transactions but, thanks to WAL, never corrupts the file.
+    """
+    with engine.connect() as conn:
+        # PRAGMAs go through the raw sqlite3 connection so SQLAlchemy does not autobegin a transaction;
+        # foreign_keys cannot be toggled inside one.
+        raw = conn.connection.driver_connection
+        synchronous = raw.execute("PRAGMA synchronous;").fetchone()[0]
+        raw.execute("PRAGMA synchronous = OFF;")
+        raw.execute("PRAGMA foreign_keys = OFF;")
+        try:
+            yield conn
+        except BaseException:
+            if conn.in_transaction():
+                conn.rollback()
+            raise
+        else:
+            if conn.in_transaction():
+                conn.commit()
+        finally:
+            raw.execute(f"PRAGMA synchronous = {synchronous};")
+            raw.execute("PRAGMA foreign_keys = ON;")
+        if check:
+            violations = raw.execute("PRAGMA foreign_key_check;").fetchall()
+            if violations:
+                raise RuntimeError(f"Bulk load left {len(violations)} foreign key violations, e.g. {violations[:5]}")
+            status = raw.execute("PRAGMA quick_check;").fetchone()[0]
+            if status != "ok":
+                raise RuntimeError(f"Integrity check failed after bulk load: {status}")
+            logger.info("Bulk load finished, integrity check ok")
+
 def upsert_league(conn, league_id, name, country=None):
     """
     Function to insert a new row into the 'league' table. If a row with the same 'league_id' already exists, SQLite will
@@ -34,3 +107,119 @@ def upsert_team(conn, team_id, name, country=None):
     VALUES (:team_id, :name, :country)
     ON CONFLICT(team_id) DO UPDATE SET name=excluded.name, country=excluded.country
     """), {"team_id": team_id, "name": name, "country": country})
+
+TEAM_MATCH_STATS_COLUMNS = [
+    "match_id", "team_id", "is_home",
+    "xg", "xga", "shots", "shots_on_target", "shots_on_target_pct", "corners", "fouls",
+    "yellow", "red", "possession", "crosses", "touches", "tackles", "interceptions",
+    "aerials_won", "clearances", "long_balls", "passes", "passes_completed",
+    "pass_accuracy", "saves", "saves_total", "save_pct",
+]
+
+MATCH_COLUMNS = [
+    "match_id", "league_id", "season", "match_date", "status",
+    "home_team_id", "away_team_id", "home_goals", "away_goals",
+    "home_penalty", "away_penalty", "source_url",
+]
+
+_TEAM_UPSERT = text("""
+INSERT INTO team (team_id, name, country)
+VALUES (:team_id, :name, :country)
+ON CONFLICT(team_id) DO UPDATE SET name=excluded.name, country=excluded.country
+""")
+
+_MATCH_UPSERT = text(f"""
+INSERT INTO match ({", ".join(MATCH_COLUMNS)})
+VALUES ({", ".join(":" + c for c in MATCH_COLUMNS)})
+ON CONFLICT(match_id) DO UPDATE SET
+    status=excluded.status,
+    home_goals=excluded.home_goals,
+    away_goals=excluded.away_goals,
+    home_penalty=COALESCE(excluded.home_penalty, match.home_penalty),
+    away_penalty=COALESCE(excluded.away_penalty, match.away_penalty),
+    source_url=excluded.source_url
+""")
+
+_TEAM_MATCH_STATS_UPSERT = text(f"""
+INSERT INTO team_match_stats ({", ".join(TEAM_MATCH_STATS_COLUMNS)})
+VALUES ({", ".join(":" + c for c in TEAM_MATCH_STATS_COLUMNS)})
+ON CONFLICT(match_id, team_id) DO UPDATE SET
+    {", ".join(f"{c}=excluded.{c}" for c in TEAM_MATCH_STATS_COLUMNS[3:])}
+""")
+
+
+class BulkLoader:
+    """
+    Accumulates team, match, team_match_stats and scrape_state rows and writes them with one
+    executemany per table.
+
+    Callers queue a match with its stats and ledger row, then call ``end_match()``; rows are flushed in a
+    single transaction once ``batch_size`` matches are pending at such a boundary, and again when the
+    loader is closed or leaves its ``with`` block. Penalty shootout results travel in the match row
+    (``home_penalty``/``away_penalty``), so no follow-up UPDATE is needed, and ledger entries commit
+    together with the rows they describe. Every flush commits in a transaction of its own; reads on the
+    same connection must be wrapped in ``conn.begin()`` so no implicit transaction is left open.
+    ``on_flush`` is called with the ids of the matches whose stats were written, once they are committed.
+    """
+
+    def __init__(self, conn, batch_size: int = 500, on_flush=None):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.on_flush = on_flush
+        self._teams = {}
+        self._matches = []
+        self._stats = []
+        self._ledger = []
+
+    def add_team(self, team_id, name, country=None):
+        self._teams[team_id] = {"team_id": team_id, "name": name, "country": country}
+
+    def add_match(self, row: dict):
+        """Queue a match row; missing optional columns default to NULL."""
+        self._matches.append({c: row.get(c) for c in MATCH_COLUMNS})
+
+    def add_team_stats(self, row: dict):
+        self._stats.append({c: row.get(c) for c in TEAM_MATCH_STATS_COLUMNS})
+
+    def add_scrape_state(self, row: dict):
+        self._ledger.append({c: row.get(c) for c in SCRAPE_STATE_COLUMNS})
+
+    def end_match(self):
+        """Close the unit of the match queued last (row, stats, ledger) and flush if the batch is full."""
+        if len(self._matches) >= self.batch_size:
+            self.flush()
+
+    def _write(self):
+        # parents first so foreign keys hold inside the transaction
+        if self._teams:
+            self.conn.execute(_TEAM_UPSERT, list(self._teams.values()))
+        if self._matches:
+            self.conn.execute(_MATCH_UPSERT, self._matches)
+        if self._stats:
+            self.conn.execute(_TEAM_MATCH_STATS_UPSERT, self._stats)
+        if self._ledger:
+            self.conn.execute(SCRAPE_STATE_UPSERT, self._ledger)
+
+    def flush(self):
+        if not (self._teams or self._matches or self._stats or self._ledger):
+            return
+        if self.conn.in_transaction():
+            # writing into a transaction someone else (or SQLAlchemy's autobegin) opened would let on_flush
+            # report rows as written that are rolled back when the connection closes
+            raise RuntimeError("BulkLoader.flush() needs its own transaction, but one is already open on the connection")
+        # the rows only reach the database here, so this is where db_write time is spent
+        with get_metrics().timer("db_write"), self.conn.begin():
+            self._write()
+        written = sorted({row["match_id"] for row in self._stats})
+        self._teams, self._matches, self._stats, self._ledger = {}, [], [], []
+        if self.on_flush is not None:
+            self.on_flush(written)
+
+    close = flush
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
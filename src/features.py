@@ -0,0 +1,381 @@
+import argparse
+import json
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, text
+
+from src.db import get_engine
+
+logger = logging.getLogger(__name__)
+
+FEATURE_WINDOW = 5
+FEATURES_SINCE = "2010-07-01"  # first season scraped (scrape_fbref.START_SEASON_YEAR)
+
+# per-team stats averaged over the last FEATURE_WINDOW played matches
+ROLLING_STATS = [
+    "xg", "xga", "shots", "shots_on_target", "possession", "pass_accuracy", "goals_for", "goals_against", "points",
+]
+# the same, restricted to matches at the same venue (home form for the home side, away form for the away side)
+VENUE_STATS = ["xg", "xga", "points"]
+
+FEATURE_COLUMNS = (
+    ["matches_played"]
+    + [f"{s}_avg" for s in ROLLING_STATS]
+    + [f"venue_{s}_avg" for s in VENUE_STATS]
+    + ["rest_days"]
+)
+MATCH_FEATURES_COLUMNS = ["match_id", "team_id", "is_home", "opponent_id", "match_date"] + FEATURE_COLUMNS
+
+# one row per team and match, played or scheduled, built in a single pass over match + team_match_stats
+_TEAM_MATCHES_SQL = """
+SELECT m.match_id, m.match_date, m.status, m.home_team_id AS team_id, m.away_team_id AS opponent_id,
+       1 AS is_home, m.home_goals AS goals_for, m.away_goals AS goals_against,
+       s.xg, s.xga, s.shots, s.shots_on_target, s.possession, s.pass_accuracy, s.match_id IS NOT NULL AS has_stats
+FROM match m
+LEFT JOIN team_match_stats s ON s.match_id = m.match_id AND s.team_id = m.home_team_id
+WHERE m.match_date >= :since
+UNION ALL
+SELECT m.match_id, m.match_date, m.status, m.away_team_id, m.home_team_id,
+       0, m.away_goals, m.home_goals,
+       s.xg, s.xga, s.shots, s.shots_on_target, s.possession, s.pass_accuracy, s.match_id IS NOT NULL AS has_stats
+FROM match m
+LEFT JOIN team_match_stats s ON s.match_id = m.match_id AND s.team_id = m.away_team_id
+WHERE m.match_date >= :since
+"""
+
+_MATCH_FEATURES_UPSERT = text(
+    f"""
+    INSERT INTO match_features ({', '.join(MATCH_FEATURES_COLUMNS)}, updated_at)
+    VALUES ({', '.join(':' + c for c in MATCH_FEATURES_COLUMNS)}, CURRENT_TIMESTAMP)
+    ON CONFLICT(match_id, team_id) DO UPDATE SET
+    {', '.join(f'{c} = excluded.{c}' for c in MATCH_FEATURES_COLUMNS[2:])},
+    updated_at = CURRENT_TIMESTAMP
+    """
+)
+
+
+def state_path_for(gender: str) -> Path:
+    """Running feature state lives next to the gender's database file."""
+    return Path(f"data/db/{gender.lower()}.features_state.json")
+
+
+def load_team_matches(conn, since: str = FEATURES_SINCE) -> pd.DataFrame:
+    """Team-perspective rows of every match since ``since``, with points, sorted by team and date."""
+    df = pd.DataFrame(conn.execute(text(_TEAM_MATCHES_SQL), {"since": since}).mappings().all())
+    if df.empty:
+        return df
+    df["match_date"] = pd.to_datetime(df["match_date"])
+    played = (df["status"] == "played") & df["goals_for"].notna() & df["goals_against"].notna()
+    df["played"] = played
+    diff = df["goals_for"] - df["goals_against"]
+    df["points"] = np.where(played, np.select([diff > 0, diff == 0], [3.0, 1.0], 0.0), np.nan)
+    return df.sort_values(["team_id", "match_date"], kind="stable").reset_index(drop=True)
+
+
+def _form_after(played: pd.DataFrame, keys: list, stats: list, window: int, prefix: str) -> pd.DataFrame:
+    """Rolling means over each group's last ``window`` played matches, as they stand after each match."""
+    rolled = (
+        played.groupby(keys, sort=False)[stats]
+        .rolling(window, min_periods=1)
+        .mean()
+        .reset_index(level=list(range(len(keys))), drop=True)
+    )
+    form = played[keys + ["match_date"]].join(rolled.add_prefix(prefix).add_suffix("_avg"))
+    return form.sort_values("match_date", kind="stable")
+
+
+def compute_features(team_matches: pd.DataFrame, window: int = FEATURE_WINDOW) -> pd.DataFrame:
+    """
+    Rolling form features for every row of ``team_matches``.
+
+    Features of a match only see the team's played matches strictly before its date: the rolling means
+    are taken after each played match and attached to later rows with an as-of join on the date, so
+    nothing from the match itself (or later) leaks in, and scheduled fixtures get the current form.
+    """
+    if team_matches.empty:
+        return pd.DataFrame(columns=MATCH_FEATURES_COLUMNS)
+    played = team_matches[team_matches["played"]].copy()
+    played["matches_played"] = played.groupby("team_id").cumcount() + 1
+    played["last_played"] = played["match_date"]
+
+    form = _form_after(played, ["team_id"], ROLLING_STATS, window, "")
+    form = form.join(played[["matches_played", "last_played"]])
+    venue = _form_after(played, ["team_id", "is_home"], VENUE_STATS, window, "venue_")
+
+    targets = team_matches[["match_id", "team_id", "is_home", "opponent_id", "match_date"]]
+    targets = targets.sort_values("match_date", kind="stable")
+    out = pd.merge_asof(targets, form, on="match_date", by="team_id", allow_exact_matches=False)
+    out = pd.merge_asof(out, venue, on="match_date", by=["team_id", "is_home"], allow_exact_matches=False)
+    out["matches_played"] = out["matches_played"].clip(upper=window).fillna(0).astype(int)
+    out["rest_days"] = (out["match_date"] - out["last_played"]).dt.days
+    out["match_date"] = out["match_date"].dt.strftime("%Y-%m-%d")
+    return out[MATCH_FEATURES_COLUMNS]
+
+
+def _records(features: pd.DataFrame) -> list:
+    # NaN -> None so SQLite stores NULL
+    return features.astype(object).where(features.notna(), None).to_dict("records")
+
+
+def materialize_features(conn, features: pd.DataFrame) -> int:
+    """Upsert ``features`` into ``match_features`` in one transaction; returns the row count."""
+    records = _records(features)
+    if records:
+        with conn.begin():
+            conn.execute(_MATCH_FEATURES_UPSERT, records)
+    return len(records)
+
+
+def _nan_mean(values) -> Optional[float]:
+    vals = [v for v in values if v is not None and not np.isnan(v)]
+    return sum(vals) / len(vals) if vals else None
+
+
+def _value(v) -> Optional[float]:
+    return None if v is None or pd.isna(v) else float(v)
+
+
+@dataclass
+class TeamState:
+    """A team's last ``window`` played matches (overall and per venue), enough to produce its next features."""
+    recent: deque
+    venue: Dict[str, deque]
+    played: int = 0
+    last_played: Optional[str] = None
+
+
+@dataclass
+class FeatureState:
+    """
+    Per-team running state for incremental feature updates, persisted as JSON beside the database.
+
+    ``watermark`` is the latest match date applied and ``watermark_ids`` the matches applied on that date;
+    ``played_rows`` counts the team-match rows applied so far, which detects matches that arrived for an
+    earlier date (those force a full rebuild, as they shift every later window). ``missing_stats`` holds
+    the matches applied without a ``team_match_stats`` row (report failed or not fetched yet); once their
+    stats turn up, every window after them is recomputed.
+    """
+    window: int
+    since: str
+    teams: Dict[str, TeamState] = field(default_factory=dict)
+    watermark: Optional[str] = None
+    watermark_ids: set = field(default_factory=set)
+    played_rows: int = 0
+    missing_stats: Optional[set] = field(default_factory=set)
+
+    def team(self, team_id: str) -> TeamState:
+        if team_id not in self.teams:
+            self.teams[team_id] = TeamState(
+                deque(maxlen=self.window), {"0": deque(maxlen=self.window), "1": deque(maxlen=self.window)}
+            )
+        return self.teams[team_id]
+
+    def features(self, row) -> dict:
+        """Features of a team-match row from the current state, identical to ``compute_features``."""
+        state = self.teams.get(row.team_id)
+        out = {
+            "match_id": row.match_id,
+            "team_id": row.team_id,
+            "is_home": int(row.is_home),
+            "opponent_id": row.opponent_id,
+            "match_date": row.match_date.strftime("%Y-%m-%d"),
+            "matches_played": min(state.played, self.window) if state else 0,
+            "rest_days": None,
+        }
+        for i, s in enumerate(ROLLING_STATS):
+            out[f"{s}_avg"] = _nan_mean(r[i] for r in state.recent) if state else None
+        venue = state.venue[str(int(row.is_home))] if state else ()
+        for i, s in enumerate(VENUE_STATS):
+            out[f"venue_{s}_avg"] = _nan_mean(r[i] for r in venue)
+        if state and state.last_played:
+            out["rest_days"] = (row.match_date - pd.Timestamp(state.last_played)).days
+        return out
+
+    def push(self, row) -> None:
+        """Apply a played team-match row."""
+        state = self.team(row.team_id)
+        state.recent.append([_value(getattr(row, s)) for s in ROLLING_STATS])
+        state.venue[str(int(row.is_home))].append([_value(getattr(row, s)) for s in VENUE_STATS])
+        state.played += 1
+        date = row.match_date.strftime("%Y-%m-%d")
+        state.last_played = date
+        if self.watermark is None or date > self.watermark:
+            self.watermark, self.watermark_ids = date, set()
+        self.watermark_ids.add(row.match_id)
+        self.played_rows += 1
+        if not row.has_stats:
+            self.missing_stats.add(row.match_id)
+
+    @classmethod
+    def from_history(cls, team_matches: pd.DataFrame, window: int, since: str) -> "FeatureState":
+        """State after every played row of ``team_matches``; only each team's last ``window`` rows are kept."""
+        state = cls(window, since)
+        if team_matches.empty:
+            return state
+        played = team_matches[team_matches["played"]]
+        for team_id, group in played.groupby("team_id", sort=False):
+            team = state.team(team_id)
+            team.recent.extend([_value(v) for v in r] for r in group[ROLLING_STATS].tail(window).itertuples(index=False))
+            for is_home, venue_group in group.groupby("is_home"):
+                team.venue[str(int(is_home))].extend(
+                    [_value(v) for v in r] for r in venue_group[VENUE_STATS].tail(window).itertuples(index=False)
+                )
+            team.played = len(group)
+            team.last_played = group["match_date"].iloc[-1].strftime("%Y-%m-%d")
+        last = played["match_date"].max()
+        state.played_rows = len(played)
+        state.missing_stats = set(played.loc[~played["has_stats"].astype(bool), "match_id"])
+        state.watermark = last.strftime("%Y-%m-%d")
+        state.watermark_ids = set(played.loc[played["match_date"] == last, "match_id"])
+        return state
+
+    def save(self, path: Path) -> None:
+        data = {
+            "window": self.window,
+            "since": self.since,
+            "watermark": self.watermark,
+            "watermark_ids": sorted(self.watermark_ids),
+            "played_rows": self.played_rows,
+            "missing_stats": sorted(self.missing_stats),
+            "teams": {
+                team_id: {
+                    "recent": list(t.recent),
+                    "venue": {k: list(v) for k, v in t.venue.items()},
+                    "played": t.played,
+                    "last_played": t.last_played,
+                }
+                for team_id, t in self.teams.items()
+            },
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["FeatureState"]:
+        if not path.exists():
+            return None
+        data = json.loads(path.read_text())
+        w = data["window"]
+        missing = data.get("missing_stats")
+        state = cls(w, data["since"], watermark=data["watermark"], watermark_ids=set(data["watermark_ids"]),
+                    played_rows=data["played_rows"], missing_stats=set(missing) if missing is not None else None)
+        for team_id, t in data["teams"].items():
+            state.teams[team_id] = TeamState(
+                deque(t["recent"], maxlen=w), {k: deque(v, maxlen=w) for k, v in t["venue"].items()},
+                t["played"], t["last_played"],
+            )
+        return state
+
+
+def _played_rows(conn, since: str) -> int:
+    return 2 * conn.execute(text(
+        "SELECT COUNT(*) FROM match WHERE match_date >= :since AND status = 'played'"
+        " AND home_goals IS NOT NULL AND away_goals IS NOT NULL"
+    ), {"since": since}).scalar_one()
+
+
+def _stats_arrived(conn, match_ids: set) -> Dict[str, str]:
+    """``{match_id: match_date}`` of the given matches that have ``team_match_stats`` rows by now."""
+    query = text(
+        "SELECT DISTINCT m.match_id, m.match_date FROM team_match_stats s JOIN match m ON m.match_id = s.match_id"
+        " WHERE s.match_id IN :ids"
+    ).bindparams(bindparam("ids", expanding=True))
+    ids, arrived = sorted(match_ids), {}
+    for i in range(0, len(ids), 500):
+        arrived.update(conn.execute(query, {"ids": ids[i:i + 500]}).all())
+    return arrived
+
+
+def build_features(gender: str = "men", window: int = FEATURE_WINDOW, since: str = FEATURES_SINCE,
+                   rewrite_from: Optional[str] = None) -> int:
+    """
+    Recompute ``match_features`` for every match since ``since`` and reset the running state. With
+    ``rewrite_from`` only the rows of matches on or after that date are written (earlier ones cannot change).
+    """
+    started = time.perf_counter()
+    engine = get_engine(gender)
+    with engine.connect() as conn:
+        with conn.begin():
+            team_matches = load_team_matches(conn, since)
+        features = compute_features(team_matches, window)
+        if rewrite_from is not None:
+            features = features[features["match_date"] >= rewrite_from]
+        written = materialize_features(conn, features)
+    FeatureState.from_history(team_matches, window, since).save(state_path_for(gender))
+    logger.info("Built %d match feature rows in %.1fs", written, time.perf_counter() - started)
+    return written
+
+
+def update_features(gender: str = "men", window: int = FEATURE_WINDOW, since: str = FEATURES_SINCE) -> int:
+    """
+    Apply matches played since the last build or update, touching only the teams involved: each new
+    match gets its pre-match features from the state, is pushed into the state, and the affected teams'
+    upcoming fixtures are refreshed. Falls back to ``build_features`` when there is no usable state or a
+    match turned up for a date before the watermark, and rewrites everything after a match whose stats
+    arrived after it was applied. Returns the number of feature rows written.
+    """
+    path = state_path_for(gender)
+    state = FeatureState.load(path)
+    if state is None or state.window != window or state.since != since or state.missing_stats is None:
+        logger.info("No feature state for window=%d since %s, running a full build", window, since)
+        return build_features(gender, window, since)
+
+    started = time.perf_counter()
+    engine = get_engine(gender)
+    with engine.connect() as conn:
+        with conn.begin():
+            rows = load_team_matches(conn, state.watermark or since)
+            total_played = _played_rows(conn, since)
+            arrived = _stats_arrived(conn, state.missing_stats)
+        if arrived:
+            earliest = min(arrived.values())
+            logger.info("Stats arrived for %d matches applied without them, rebuilding features from %s",
+                        len(arrived), earliest)
+            return build_features(gender, window, since, rewrite_from=earliest)
+        if rows.empty:
+            return 0
+        rows = rows.sort_values("match_date", kind="stable")
+        new = rows[rows["played"] & ((rows["match_date"] > pd.Timestamp(state.watermark or since))
+                                     | ~rows["match_id"].isin(state.watermark_ids))]
+        if state.played_rows + len(new) != total_played:
+            logger.info("Matches arrived for dates before %s, running a full build", state.watermark)
+            return build_features(gender, window, since)
+
+        records = []
+        for row in new.itertuples(index=False):
+            records.append(state.features(row))  # pre-match form, before the match itself is applied
+            state.push(row)
+        affected = set(new["team_id"])
+        upcoming = rows[~rows["played"] & rows["team_id"].isin(affected)]
+        upcoming = upcoming[upcoming["match_date"] > pd.Timestamp(state.watermark)]
+        records += [state.features(row) for row in upcoming.itertuples(index=False)]
+        written = materialize_features(conn, pd.DataFrame(records, columns=MATCH_FEATURES_COLUMNS))
+    state.save(path)
+    logger.info("Updated %d feature rows for %d new team-matches and %d teams in %.2fs",
+                written, len(new), len(affected), time.perf_counter() - started)
+    return written
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Build rolling form features into match_features")
+    parser.add_argument("--gender", default="men", choices=["men", "women"])
+    parser.add_argument("--window", type=int, default=FEATURE_WINDOW, help="Matches per rolling window")
+    parser.add_argument("--since", default=FEATURES_SINCE, help="First match date to include")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only apply matches played since the last run (full build if there is no state)")
+    args = parser.parse_args()
+    if args.incremental:
+        update_features(args.gender, args.window, args.since)
+    else:
+        build_features(args.gender, args.window, args.since)
@@ -0,0 +1,253 @@
+import argparse
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize
+from scipy.special import gammaln
+from sqlalchemy import text
+
+from src.db import get_engine
+
+logger = logging.getLogger(__name__)
+
+GOAL_MODEL_VERSION = "dixon-coles-1"
+DECAY_PER_DAY = 0.0019     # Dixon & Coles' xi = 0.0065 per half-week
+FIT_WINDOW_DAYS = 730      # older matches weigh < 25% and are left out
+RIDGE = 1.0                # L2 penalty on attack/defence; pins the free shift and tames teams with few matches
+MAX_GOALS = 10             # score matrices cover 0..MAX_GOALS goals per side
+RHO_BOUNDS = (-0.2, 0.2)
+
+_PLAYED_SQL = """
+SELECT m.match_id, m.league_id, m.match_date, m.home_team_id, m.away_team_id, m.home_goals, m.away_goals
+FROM match m
+JOIN (
+  SELECT league_id, COALESCE(:as_of, MAX(match_date)) AS as_of
+  FROM match
+  WHERE status = 'played' AND home_goals IS NOT NULL AND away_goals IS NOT NULL
+  GROUP BY league_id
+) w ON w.league_id = m.league_id
+WHERE m.status = 'played' AND m.home_goals IS NOT NULL AND m.away_goals IS NOT NULL
+  AND m.match_date <= w.as_of AND m.match_date > date(w.as_of, :window)
+ORDER BY m.league_id, m.match_date
+"""
+
+
+def model_path_for(gender: str) -> Path:
+    """Fitted goal models live next to the gender's database file."""
+    return Path(f"data/db/{gender.lower()}.goal_models.json")
+
+
+@dataclass
+class GoalModel:
+    """
+    Dixon-Coles model of one league: home goals ~ Poisson(exp(intercept + home + attack[h] - defence[a])),
+    away goals ~ Poisson(exp(intercept + attack[a] - defence[h])), with ``rho`` correcting the
+    probabilities of 0-0, 1-0, 0-1 and 1-1. Teams the model has not seen are rated league-average.
+    """
+    league_id: str
+    team_ids: List[str]
+    attack: np.ndarray
+    defence: np.ndarray
+    intercept: float = 0.25
+    home: float = 0.25
+    rho: float = 0.0
+    fitted_as_of: Optional[str] = None
+    matches: int = 0
+    _slots: Dict[str, int] = field(default=None, init=False, repr=False)
+
+    def __post_init__(self):
+        self._slots = {team_id: i for i, team_id in enumerate(self.team_ids)}
+
+    def _lookup(self, values: np.ndarray, team_ids) -> np.ndarray:
+        slots = np.fromiter((self._slots.get(t, -1) for t in team_ids), dtype=np.int64, count=len(team_ids))
+        return np.where(slots >= 0, values[slots], 0.0)
+
+    def rates(self, home_ids, away_ids):
+        """Expected home and away goals for each pairing."""
+        att_h, def_h = self._lookup(self.attack, home_ids), self._lookup(self.defence, home_ids)
+        att_a, def_a = self._lookup(self.attack, away_ids), self._lookup(self.defence, away_ids)
+        return (np.exp(self.intercept + self.home + att_h - def_a),
+                np.exp(self.intercept + att_a - def_h))
+
+    def score_matrix(self, home_ids, away_ids, max_goals: int = MAX_GOALS) -> np.ndarray:
+        """P(home scores i, away scores j) as an array of shape (n, max_goals + 1, max_goals + 1)."""
+        return score_matrix(*self.rates(home_ids, away_ids), self.rho, max_goals)
+
+    def to_dict(self) -> dict:
+        return {
+            "league_id": self.league_id,
+            "team_ids": self.team_ids,
+            "attack": self.attack.tolist(),
+            "defence": self.defence.tolist(),
+            "intercept": self.intercept,
+            "home": self.home,
+            "rho": self.rho,
+            "fitted_as_of": self.fitted_as_of,
+            "matches": self.matches,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "GoalModel":
+        data = dict(data, attack=np.asarray(data["attack"]), defence=np.asarray(data["defence"]))
+        return cls(**data)
+
+
+def score_matrix(lam: np.ndarray, mu: np.ndarray, rho: float, max_goals: int = MAX_GOALS) -> np.ndarray:
+    goals = np.arange(max_goals + 1)
+    log_fact = gammaln(goals + 1)
+    p_home = np.exp(goals * np.log(lam)[:, None] - lam[:, None] - log_fact)
+    p_away = np.exp(goals * np.log(mu)[:, None] - mu[:, None] - log_fact)
+    matrix = p_home[:, :, None] * p_away[:, None, :]
+    matrix[:, 0, 0] *= 1 - lam * mu * rho
+    matrix[:, 0, 1] *= 1 + lam * rho
+    matrix[:, 1, 0] *= 1 + mu * rho
+    matrix[:, 1, 1] *= 1 - rho
+    return matrix
+
+
+def negative_log_likelihood(theta: np.ndarray, h: np.ndarray, a: np.ndarray, x: np.ndarray, y: np.ndarray,
+                            w: np.ndarray, n_teams: int, ridge: float = RIDGE):
+    """
+    Weighted Dixon-Coles negative log-likelihood and its gradient, for
+    ``theta = [intercept, home, rho, attack..., defence...]``. ``h``/``a`` are team slots, ``x``/``y``
+    the goals and ``w`` the time-decay weights, one entry per match.
+    """
+    intercept, home, rho = theta[:3]
+    attack, defence = theta[3:3 + n_teams], theta[3 + n_teams:]
+    eta_h = intercept + home + attack[h] - defence[a]
+    eta_a = intercept + attack[a] - defence[h]
+    lam, mu = np.exp(eta_h), np.exp(eta_a)
+
+    # low-score correction tau and the derivatives of log(tau)
+    tau = np.ones_like(lam)
+    dtau_h, dtau_a, dtau_rho = np.zeros_like(lam), np.zeros_like(lam), np.zeros_like(lam)
+    m00, m01 = (x == 0) & (y == 0), (x == 0) & (y == 1)
+    m10, m11 = (x == 1) & (y == 0), (x == 1) & (y == 1)
+    tau[m00] = 1 - lam[m00] * mu[m00] * rho
+    tau[m01] = 1 + lam[m01] * rho
+    tau[m10] = 1 + mu[m10] * rho
+    tau[m11] = 1 - rho
+    tau = np.maximum(tau, 1e-10)
+    dtau_h[m00] = dtau_a[m00] = -lam[m00] * mu[m00] * rho / tau[m00]
+    dtau_rho[m00] = -lam[m00] * mu[m00] / tau[m00]
+    dtau_h[m01] = lam[m01] * rho / tau[m01]
+    dtau_rho[m01] = lam[m01] / tau[m01]
+    dtau_a[m10] = mu[m10] * rho / tau[m10]
+    dtau_rho[m10] = mu[m10] / tau[m10]
+    dtau_rho[m11] = -1 / tau[m11]
+
+    ll = w * (np.log(tau) + x * eta_h - lam + y * eta_a - mu)
+    value = -ll.sum() + 0.5 * ridge * (attack @ attack + defence @ defence)
+
+    g_h = w * (x - lam + dtau_h)
+    g_a = w * (y - mu + dtau_a)
+    grad = np.empty_like(theta)
+    grad[0] = -(g_h.sum() + g_a.sum())
+    grad[1] = -g_h.sum()
+    grad[2] = -(w * dtau_rho).sum()
+    grad[3:3 + n_teams] = ridge * attack - np.bincount(h, g_h, n_teams) - np.bincount(a, g_a, n_teams)
+    grad[3 + n_teams:] = ridge * defence + np.bincount(a, g_h, n_teams) + np.bincount(h, g_a, n_teams)
+    return value, grad
+
+
+def fit(matches: pd.DataFrame, league_id: str, as_of: pd.Timestamp, init: Optional[GoalModel] = None,
+        xi: float = DECAY_PER_DAY, ridge: float = RIDGE) -> GoalModel:
+    """
+    Fit one league on ``matches`` (played, on or before ``as_of``), weighting each by
+    exp(-xi * days before as_of). ``init`` warm-starts the optimizer from an earlier fit: teams it
+    knows keep their parameters as the starting point, promoted teams start at league average.
+    """
+    team_ids = sorted(set(matches["home_team_id"]) | set(matches["away_team_id"]))
+    slots = {team_id: i for i, team_id in enumerate(team_ids)}
+    n = len(team_ids)
+    h = matches["home_team_id"].map(slots).to_numpy()
+    a = matches["away_team_id"].map(slots).to_numpy()
+    x = matches["home_goals"].to_numpy(dtype=float)
+    y = matches["away_goals"].to_numpy(dtype=float)
+    days = (as_of - pd.to_datetime(matches["match_date"])).dt.days.to_numpy()
+    w = np.exp(-xi * days)
+
+    theta = np.zeros(3 + 2 * n)
+    if init is not None:
+        theta[:3] = init.intercept, init.home, init.rho
+        theta[3:3 + n] = init._lookup(init.attack, team_ids)
+        theta[3 + n:] = init._lookup(init.defence, team_ids)
+    else:
+        theta[0] = np.log(max((x.mean() + y.mean()) / 2, 0.1))
+        theta[1] = np.log(max(x.mean(), 0.1) / max(y.mean(), 0.1))
+    bounds = [(None, None), (None, None), RHO_BOUNDS] + [(None, None)] * (2 * n)
+    result = minimize(negative_log_likelihood, theta, args=(h, a, x, y, w, n, ridge), jac=True,
+                      method="L-BFGS-B", bounds=bounds)
+    if not result.success:
+        logger.warning("Goal model for %s did not converge: %s", league_id, result.message)
+    theta = result.x
+    return GoalModel(league_id, team_ids, theta[3:3 + n].copy(), theta[3 + n:].copy(), float(theta[0]),
+                     float(theta[1]), float(theta[2]), as_of.strftime("%Y-%m-%d"), len(matches))
+
+
+def save_models(models: Dict[str, GoalModel], path: Path) -> None:
+    data = {"version": GOAL_MODEL_VERSION, "leagues": {lid: m.to_dict() for lid, m in models.items()}}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(data))
+    os.replace(tmp, path)
+
+
+def load_models(path: Path) -> Dict[str, GoalModel]:
+    if not path.exists():
+        return {}
+    data = json.loads(path.read_text())
+    if data.get("version") != GOAL_MODEL_VERSION:
+        logger.info("Ignoring goal models of version %s", data.get("version"))
+        return {}
+    return {lid: GoalModel.from_dict(m) for lid, m in data["leagues"].items()}
+
+
+def refit_goal_models(gender: str = "men", as_of: Optional[str] = None, warm: bool = True,
+                      xi: float = DECAY_PER_DAY, window_days: int = FIT_WINDOW_DAYS) -> Dict[str, GoalModel]:
+    """
+    Refit every league on its last ``window_days`` of results, as of ``as_of`` (default: each league's
+    latest played match), warm-started from the stored models. Leagues with no new results since
+    their stored fit are kept as they are.
+    """
+    started = time.perf_counter()
+    path = model_path_for(gender)
+    previous = load_models(path) if warm else {}
+    cutoff = pd.Timestamp(as_of) if as_of else None
+    # without a cutoff every league is fitted on the window before its own latest match
+    params = {"as_of": cutoff.strftime("%Y-%m-%d") if cutoff else None, "window": f"-{window_days} days"}
+    with get_engine(gender, profile="readonly").connect() as conn:
+        played = pd.DataFrame(conn.execute(text(_PLAYED_SQL), params).mappings().all())
+    if played.empty:
+        logger.info("No played matches to fit")
+        return previous
+
+    models, refitted = dict(previous), 0
+    played["match_date"] = pd.to_datetime(played["match_date"])
+    for league_id, league in played.groupby("league_id", sort=False):
+        league_as_of = cutoff or league["match_date"].max()
+        old = previous.get(league_id)
+        if old and old.fitted_as_of == league_as_of.strftime("%Y-%m-%d") and old.matches == len(league):
+            continue
+        models[league_id] = fit(league, league_id, league_as_of, old, xi)
+        refitted += 1
+    save_models(models, path)
+    logger.info("Refitted %d of %d league goal models in %.2fs", refitted, len(models), time.perf_counter() - started)
+    return models
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Fit Dixon-Coles goal models per league")
+    parser.add_argument("--gender", default="men", choices=["men", "women"])
+    parser.add_argument("--as-of", help="Fit on results up to this date (default: each league's latest match)")
+    parser.add_argument("--cold", action="store_true", help="Ignore stored models instead of warm-starting")
+    args = parser.parse_args()
+    refit_goal_models(args.gender, args.as_of, warm=not args.cold)
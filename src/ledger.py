@@ -0,0 +1,83 @@
+from datetime import datetime
+from pathlib import Path
+from sqlalchemy import text
+from resume_state import ResumeState
+
+SCRAPE_STATE_COLUMNS = [
+    "key", "url", "league_id", "season", "status", "last_error", "fetch_ms", "parse_ms",
+]
+
+SCRAPE_STATE_UPSERT = text("""
+INSERT INTO scrape_state (key, url, league_id, season, status, attempts, last_error, fetch_ms, parse_ms,
+                          updated_at)
+VALUES (:key, :url, :league_id, :season, :status, 1, :last_error, :fetch_ms, :parse_ms, CURRENT_TIMESTAMP)
+ON CONFLICT(key) DO UPDATE SET
+    url=excluded.url,
+    status=excluded.status,
+    attempts=scrape_state.attempts + 1,
+    last_error=excluded.last_error,
+    fetch_ms=excluded.fetch_ms,
+    parse_ms=excluded.parse_ms,
+    updated_at=CURRENT_TIMESTAMP
+""")
+
+
+def completed_keys(conn, league_id: str, season: str) -> set:
+    """
+    Return every match_id of a season that needs no more work, in one indexed query: matches marked
+    done in the ledger plus matches whose stats are already stored (e.g. loaded before the ledger existed).
+    """
+    rows = conn.execute(text("""
+    SELECT key FROM scrape_state
+    WHERE league_id = :league_id AND season = :season AND status = 'done'
+    UNION
+    SELECT m.match_id FROM match m
+    WHERE m.league_id = :league_id AND m.season = :season
+      AND EXISTS (SELECT 1 FROM team_match_stats t WHERE t.match_id = m.match_id)
+    """), {"league_id": league_id, "season": season})
+    return {row[0] for row in rows}
+
+
+def failed_reports(conn, since: datetime | None = None, league_id: str | None = None) -> list:
+    """Rows of reports whose last attempt failed, newest first; ``since`` (UTC) limits it to e.g. the last run."""
+    rows = conn.execute(text("""
+    SELECT key, url, league_id, season, attempts, last_error, updated_at
+    FROM scrape_state
+    WHERE status = 'failed'
+      AND (:since IS NULL OR updated_at >= :since)
+      AND (:league_id IS NULL OR league_id = :league_id)
+    ORDER BY updated_at DESC
+    """), {
+        "since": since.strftime("%Y-%m-%d %H:%M:%S") if since else None,
+        "league_id": league_id,
+    })
+    return [dict(row._mapping) for row in rows]
+
+
+def import_progress_file(conn, state_file: Path, league_id: str, season: str) -> int:
+    """
+    Move the keys of a legacy per-season ``progress.json`` (and its journal) into the ledger, then rename
+    whichever of the two files exist so they are imported only once. The keys are written in a
+    transaction of its own, so ``conn`` must not have one open; the files are renamed only after it
+    commits. Returns the number of keys imported.
+    """
+    log_file = state_file.with_suffix(".log")
+    if not state_file.exists() and not log_file.exists():
+        return 0
+    state = ResumeState(state_file)
+    keys = sorted(state.done_keys())
+    state.close()
+    if keys:
+        with conn.begin():
+            conn.execute(SCRAPE_STATE_UPSERT, [
+                {c: None for c in SCRAPE_STATE_COLUMNS} | {
+                    "key": key, "league_id": league_id, "season": season, "status": "done",
+                }
+                for key in keys
+            ])
+    # reached only once the keys are committed; close() may have folded the journal into a new
+    # snapshot, or left a journal without one
+    for path, suffix in [(state_file, ".json.imported"), (log_file, ".log.imported")]:
+        if path.exists():
+            path.rename(path.with_suffix(suffix))
+    return len(keys)
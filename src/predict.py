@@ -0,0 +1,137 @@
+import argparse
+import json
+import logging
+import time
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from src.db import get_engine
+from src.goal_model import GOAL_MODEL_VERSION, MAX_GOALS, GoalModel, load_models, model_path_for, score_matrix
+
+logger = logging.getLogger(__name__)
+
+TOP_SCORES = 5  # scorelines kept in prediction.top_scores
+
+PREDICTION_COLUMNS = [
+    "match_id", "model_version", "fitted_as_of", "p_home", "p_draw", "p_away", "exp_home_goals", "exp_away_goals",
+    "likely_home_goals", "likely_away_goals", "p_likely_score", "p_over_2_5", "p_btts", "top_scores",
+]
+
+_SCHEDULED_SQL = """
+SELECT match_id, league_id, match_date, home_team_id, away_team_id
+FROM match
+WHERE status = 'scheduled'
+ORDER BY match_date, match_id
+"""
+
+_PREDICTION_UPSERT = text(
+    f"""
+    INSERT INTO prediction ({", ".join(PREDICTION_COLUMNS)}, predicted_at)
+    VALUES ({", ".join(":" + c for c in PREDICTION_COLUMNS)}, CURRENT_TIMESTAMP)
+    ON CONFLICT(match_id, model_version) DO UPDATE SET
+      {", ".join(f"{c} = excluded.{c}" for c in PREDICTION_COLUMNS[2:])},
+      predicted_at = CURRENT_TIMESTAMP
+    """
+)
+
+
+def summarize(matrix: np.ndarray, top: int = TOP_SCORES) -> Dict[str, np.ndarray]:
+    """Outcome probabilities and scoreline summaries of a stack of score matrices (n, goals, goals)."""
+    n, size = matrix.shape[0], matrix.shape[1]
+    matrix = matrix / matrix.sum(axis=(1, 2), keepdims=True)  # mass beyond MAX_GOALS is spread back
+    goals = np.arange(size)
+    home_goals, away_goals = np.meshgrid(goals, goals, indexing="ij")
+    flat = matrix.reshape(n, -1)
+    order = np.argsort(-flat, axis=1)[:, :top]
+    return {
+        "p_home": np.tril(matrix, -1).sum(axis=(1, 2)),
+        "p_draw": np.trace(matrix, axis1=1, axis2=2),
+        "p_away": np.triu(matrix, 1).sum(axis=(1, 2)),
+        "exp_home_goals": (matrix.sum(axis=2) * goals).sum(axis=1),
+        "exp_away_goals": (matrix.sum(axis=1) * goals).sum(axis=1),
+        "likely_home_goals": order[:, 0] // size,
+        "likely_away_goals": order[:, 0] % size,
+        "p_likely_score": flat[np.arange(n), order[:, 0]],
+        "p_over_2_5": flat[:, (home_goals + away_goals).ravel() > 2].sum(axis=1),
+        "p_btts": matrix[:, 1:, 1:].sum(axis=(1, 2)),
+        "top_scores": np.array([
+            json.dumps([[int(i // size), int(i % size), round(float(p), 4)] for i, p in zip(row, flat[k, row])])
+            for k, row in enumerate(order)
+        ]),
+    }
+
+
+def predict_frame(fixtures: pd.DataFrame, models: Dict[str, GoalModel], max_goals: int = MAX_GOALS) -> pd.DataFrame:
+    """
+    Score ``fixtures`` (match_id, league_id, home_team_id, away_team_id) with their league's goal model.
+    Team parameters are gathered per league, then every score matrix is built and summarised in one
+    array pass. Fixtures of leagues without a model are left out.
+    """
+    known = fixtures[fixtures["league_id"].isin(models.keys())]
+    if len(known) < len(fixtures):
+        logger.info("No goal model for %d fixtures in %s", len(fixtures) - len(known),
+                    sorted(set(fixtures["league_id"]) - set(models)))
+    if known.empty:
+        return pd.DataFrame(columns=PREDICTION_COLUMNS)
+    lam, mu, rho = np.empty(len(known)), np.empty(len(known)), np.empty(len(known))
+    fitted = np.empty(len(known), dtype=object)
+    for league_id, rows in known.groupby("league_id", sort=False).indices.items():
+        model = models[league_id]
+        league = known.iloc[rows]
+        lam[rows], mu[rows] = model.rates(league["home_team_id"].tolist(), league["away_team_id"].tolist())
+        rho[rows] = model.rho
+        fitted[rows] = model.fitted_as_of
+    summary = summarize(score_matrix(lam, mu, rho, max_goals))
+    return pd.DataFrame({
+        "match_id": known["match_id"].to_numpy(),
+        "model_version": GOAL_MODEL_VERSION,
+        "fitted_as_of": fitted,
+        **summary,
+    })[PREDICTION_COLUMNS]
+
+
+def save_predictions(conn, predictions: pd.DataFrame) -> int:
+    records = predictions.astype(object).where(predictions.notna(), None).to_dict("records")
+    if records:
+        with conn.begin():
+            conn.execute(_PREDICTION_UPSERT, records)
+    return len(records)
+
+
+def predict_fixtures(gender: str = "men", leagues: Optional[Iterable[str]] = None,
+                     models: Optional[Dict[str, GoalModel]] = None, write: bool = True) -> pd.DataFrame:
+    """
+    Predict every scheduled fixture (optionally only those of ``leagues``) with the stored goal
+    models and upsert the results into ``prediction``. Returns the predictions.
+    """
+    started = time.perf_counter()
+    models = load_models(model_path_for(gender)) if models is None else models
+    with get_engine(gender).connect() as conn:
+        with conn.begin():
+            fixtures = pd.DataFrame(conn.execute(text(_SCHEDULED_SQL)).mappings().all())
+        if fixtures.empty:
+            logger.info("No scheduled fixtures to predict")
+            return pd.DataFrame(columns=PREDICTION_COLUMNS)
+        if leagues is not None:
+            fixtures = fixtures[fixtures["league_id"].isin(set(leagues))]
+        predictions = predict_frame(fixtures, models)
+        if write:
+            save_predictions(conn, predictions)
+    logger.info("Predicted %d of %d scheduled fixtures in %.2fs", len(predictions), len(fixtures),
+                time.perf_counter() - started)
+    return predictions
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Predict outcome and scoreline probabilities of scheduled fixtures")
+    parser.add_argument("--gender", default="men", choices=["men", "women"])
+    parser.add_argument("--league", action="append", dest="leagues", help="Only this league id (repeatable)")
+    parser.add_argument("--dry-run", action="store_true", help="Print the predictions without storing them")
+    args = parser.parse_args()
+    predictions = predict_fixtures(args.gender, args.leagues, write=not args.dry_run)
+    if args.dry_run:
+        print(predictions.drop(columns=["top_scores"]).to_string(index=False))
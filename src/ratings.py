@@ -0,0 +1,351 @@
+import argparse
+import itertools
+import logging
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from src.db import get_engine
+
+logger = logging.getLogger(__name__)
+
+# UEFA competitions in utils.league_mapping; their matches link the domestic leagues into one rating scale
+UEFA_LEAGUES = {"UCL", "UEL", "UECL", "UWCL"}
+
+_RESULTS_SQL = """
+SELECT match_id, league_id, season, match_date, home_team_id, away_team_id, home_goals, away_goals
+FROM match
+WHERE status = 'played' AND home_goals IS NOT NULL AND away_goals IS NOT NULL AND match_date >= :since
+ORDER BY match_date, match_id
+"""
+
+_TEAM_RATING_UPSERT = text(
+    """
+    INSERT INTO team_rating (team_id, elo, pi_home, pi_away, matches, last_match_date, updated_at)
+    VALUES (:team_id, :elo, :pi_home, :pi_away, :matches, :last_match_date, CURRENT_TIMESTAMP)
+    ON CONFLICT(team_id) DO UPDATE SET
+      elo = excluded.elo,
+      pi_home = excluded.pi_home,
+      pi_away = excluded.pi_away,
+      matches = excluded.matches,
+      last_match_date = excluded.last_match_date,
+      updated_at = CURRENT_TIMESTAMP
+    """
+)
+
+
+@dataclass(frozen=True)
+class EloParams:
+    k: float = 20.0
+    home_advantage: float = 65.0   # rating points added to the home side
+    initial: float = 1500.0
+    goal_diff: bool = True         # scale updates by the margin (World Football Elo)
+
+
+@dataclass(frozen=True)
+class PiParams:
+    """Pi-ratings (Constantinou & Fenton, 2013): separate home and away ratings in goal-difference units."""
+    lam: float = 0.035    # learning rate
+    gamma: float = 0.7    # how much a home result moves the away rating and vice versa
+    c: float = 3.0        # base-10 scale of the rating -> goal difference mapping
+
+
+class TeamIndex:
+    """Stable mapping from team_id strings to the integer slots of the rating arrays."""
+
+    def __init__(self, team_ids: Iterable[str] = ()):
+        self.ids: List[str] = []
+        self._slots: Dict[str, int] = {}
+        for team_id in team_ids:
+            self.slot(team_id)
+
+    def slot(self, team_id: str) -> int:
+        slot = self._slots.get(team_id)
+        if slot is None:
+            slot = self._slots[team_id] = len(self.ids)
+            self.ids.append(team_id)
+        return slot
+
+    def encode(self, team_ids) -> np.ndarray:
+        return np.fromiter((self.slot(t) for t in team_ids), dtype=np.int64, count=len(team_ids))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+@dataclass
+class Results:
+    """Played matches as parallel arrays in date order, with teams already encoded."""
+    frame: pd.DataFrame
+    home: np.ndarray
+    away: np.ndarray
+    home_goals: np.ndarray
+    away_goals: np.ndarray
+    rounds: List[np.ndarray]
+
+    @property
+    def goal_diff(self) -> np.ndarray:
+        return self.home_goals - self.away_goals
+
+    @property
+    def score(self) -> np.ndarray:
+        """1 for a home win, 0.5 for a draw, 0 for an away win."""
+        return 0.5 * (1 + np.sign(self.goal_diff))
+
+
+def build_rounds(dates: np.ndarray, home: np.ndarray, away: np.ndarray) -> List[np.ndarray]:
+    """
+    Split matches (sorted by date) into rounds that can be applied in one vectorized step: a round
+    never contains a team twice. Normally a round is a whole date; a team listed twice on one date
+    (replays, data errors) pushes the later match into the next round.
+    """
+    rounds = []
+    bounds = np.flatnonzero(dates[1:] != dates[:-1]) + 1
+    for idx in np.split(np.arange(len(dates)), bounds):
+        teams = np.concatenate([home[idx], away[idx]])
+        if len(np.unique(teams)) == len(teams):
+            rounds.append(idx)
+            continue
+        pending = list(idx)
+        while pending:
+            seen, current, rest = set(), [], []
+            for i in pending:
+                if home[i] in seen or away[i] in seen:
+                    rest.append(i)
+                else:
+                    seen.update((home[i], away[i]))
+                    current.append(i)
+            rounds.append(np.array(current, dtype=np.int64))
+            pending = rest
+    return rounds
+
+
+def load_results(conn, index: TeamIndex, since: str = "1900-01-01", leagues: Optional[Iterable[str]] = None) -> Results:
+    frame = pd.DataFrame(conn.execute(text(_RESULTS_SQL), {"since": since}).mappings().all())
+    if frame.empty:
+        frame = pd.DataFrame(columns=["match_id", "league_id", "season", "match_date", "home_team_id",
+                                      "away_team_id", "home_goals", "away_goals"])
+    if leagues is not None:
+        frame = frame[frame["league_id"].isin(set(leagues))].reset_index(drop=True)
+    return results_from_frame(frame, index)
+
+
+def results_from_frame(frame: pd.DataFrame, index: TeamIndex) -> Results:
+    home = index.encode(frame["home_team_id"].tolist())
+    away = index.encode(frame["away_team_id"].tolist())
+    dates = frame["match_date"].to_numpy().astype(str)
+    return Results(
+        frame,
+        home,
+        away,
+        frame["home_goals"].to_numpy(dtype=float),
+        frame["away_goals"].to_numpy(dtype=float),
+        build_rounds(dates, home, away),
+    )
+
+
+def _goal_diff_multiplier(gd: np.ndarray) -> np.ndarray:
+    margin = np.abs(gd)
+    return np.where(margin <= 1, 1.0, np.where(margin == 2, 1.5, (11 + margin) / 8))
+
+
+class Ratings:
+    """
+    Elo and Pi-ratings of every team in flat float arrays indexed by ``TeamIndex`` slots.
+
+    ``replay`` applies a whole history round by round with array operations (each round touches
+    disjoint teams, so the updates are independent) and returns the pre-match ratings of every
+    match, i.e. leak-free model inputs. ``update`` applies one new result in place (streaming mode).
+    All competitions share one scale, so domestic leagues are linked through the UEFA matches;
+    ``league_strength`` summarises it per league.
+    """
+
+    def __init__(self, index: Optional[TeamIndex] = None, elo: EloParams = EloParams(), pi: PiParams = PiParams()):
+        self.index = index or TeamIndex()
+        self.elo_params = elo
+        self.pi_params = pi
+        self.elo = np.empty(0)
+        self.pi_home = np.empty(0)
+        self.pi_away = np.empty(0)
+        self.matches = np.empty(0, dtype=np.int64)
+        self.last_date = np.empty(0, dtype=object)
+        self._grow()
+
+    def _grow(self) -> None:
+        n, have = len(self.index), len(self.elo)
+        if n <= have:
+            return
+        size = max(n, 2 * have, 64)
+        self.elo = np.concatenate([self.elo, np.full(size - have, self.elo_params.initial)])
+        self.pi_home = np.concatenate([self.pi_home, np.zeros(size - have)])
+        self.pi_away = np.concatenate([self.pi_away, np.zeros(size - have)])
+        self.matches = np.concatenate([self.matches, np.zeros(size - have, dtype=np.int64)])
+        self.last_date = np.concatenate([self.last_date, np.full(size - have, None, dtype=object)])
+
+    def _apply(self, h: np.ndarray, a: np.ndarray, gd: np.ndarray, out: Optional[dict] = None,
+               idx=None) -> None:
+        ep, pp = self.elo_params, self.pi_params
+        # Elo
+        diff = self.elo[h] + ep.home_advantage - self.elo[a]
+        expected = 1.0 / (1.0 + 10 ** (-diff / 400))
+        delta = ep.k * (0.5 * (1 + np.sign(gd)) - expected)
+        if ep.goal_diff:
+            delta = delta * _goal_diff_multiplier(gd)
+        # Pi-rating
+        rh, ra = self.pi_home[h], self.pi_away[a]
+        predicted = np.sign(rh) * (10 ** (np.abs(rh) / pp.c) - 1) - np.sign(ra) * (10 ** (np.abs(ra) / pp.c) - 1)
+        error = gd - predicted
+        step = pp.lam * pp.c * np.log10(1 + np.abs(error)) * np.sign(error)
+        if out is not None:
+            out["elo_home"][idx], out["elo_away"][idx] = self.elo[h], self.elo[a]
+            out["elo_expected"][idx] = expected
+            out["pi_home"][idx], out["pi_away"][idx] = rh, ra
+            out["pi_goal_diff"][idx] = predicted
+        self.elo[h] += delta
+        self.elo[a] -= delta
+        self.pi_home[h] = rh + step
+        self.pi_away[h] += pp.gamma * step
+        self.pi_away[a] = ra - step
+        self.pi_home[a] -= pp.gamma * step
+        self.matches[h] += 1
+        self.matches[a] += 1
+
+    def replay(self, results: Results) -> pd.DataFrame:
+        """Apply every result in ``results`` and return the pre-match ratings, one row per match."""
+        self._grow()
+        n = len(results.home)
+        out = {k: np.empty(n) for k in ("elo_home", "elo_away", "elo_expected", "pi_home", "pi_away", "pi_goal_diff")}
+        gd = results.goal_diff
+        for idx in results.rounds:
+            self._apply(results.home[idx], results.away[idx], gd[idx], out, idx)
+        if n:
+            # interleaved in match order, so the last assignment per team is its latest match
+            slots = np.column_stack([results.home, results.away]).ravel()
+            self.last_date[slots] = np.repeat(results.frame["match_date"].to_numpy(), 2)
+        return pd.DataFrame(out).assign(match_id=results.frame["match_id"].to_numpy())
+
+    def update(self, home_team_id: str, away_team_id: str, home_goals: int, away_goals: int,
+               match_date: Optional[str] = None) -> dict:
+        """Streaming mode: apply one new result and return the ratings both teams had before it."""
+        h, a = self.index.slot(home_team_id), self.index.slot(away_team_id)
+        self._grow()
+        before = {"elo_home": self.elo[h], "elo_away": self.elo[a], "pi_home": self.pi_home[h],
+                  "pi_away": self.pi_away[a]}
+        self._apply(np.array([h]), np.array([a]), np.array([float(home_goals - away_goals)]))
+        if match_date:
+            self.last_date[h] = self.last_date[a] = match_date
+        return before
+
+    def expected_score(self, home_team_id: str, away_team_id: str) -> float:
+        """Elo expectation of the home side (win = 1, draw = 0.5)."""
+        h, a = self.index.slot(home_team_id), self.index.slot(away_team_id)
+        self._grow()
+        diff = self.elo[h] + self.elo_params.home_advantage - self.elo[a]
+        return 1.0 / (1.0 + 10 ** (-diff / 400))
+
+    def expected_goal_diff(self, home_team_id: str, away_team_id: str) -> float:
+        h, a = self.index.slot(home_team_id), self.index.slot(away_team_id)
+        self._grow()
+        c = self.pi_params.c
+        rh, ra = self.pi_home[h], self.pi_away[a]
+        return float(np.sign(rh) * (10 ** (abs(rh) / c) - 1) - np.sign(ra) * (10 ** (abs(ra) / c) - 1))
+
+    def to_frame(self) -> pd.DataFrame:
+        n = len(self.index)
+        return pd.DataFrame({
+            "team_id": self.index.ids,
+            "elo": self.elo[:n],
+            "pi_home": self.pi_home[:n],
+            "pi_away": self.pi_away[:n],
+            "matches": self.matches[:n],
+            "last_match_date": self.last_date[:n],
+        })
+
+    def league_strength(self, results: Results) -> pd.DataFrame:
+        """Mean Elo of the teams in each domestic league's latest season: the cross-league comparison."""
+        frame = results.frame
+        if frame.empty:
+            return pd.DataFrame(columns=["league_id", "season", "teams", "mean_elo"])
+        frame = frame[~frame["league_id"].isin(UEFA_LEAGUES)]
+        latest = frame[frame["season"] == frame.groupby("league_id")["season"].transform("max")]
+        teams = pd.concat([
+            latest[["league_id", "season", "home_team_id"]].rename(columns={"home_team_id": "team_id"}),
+            latest[["league_id", "season", "away_team_id"]].rename(columns={"away_team_id": "team_id"}),
+        ]).drop_duplicates()
+        teams["elo"] = self.elo[self.index.encode(teams["team_id"].tolist())]
+        return (teams.groupby(["league_id", "season"])["elo"].agg(teams="size", mean_elo="mean")
+                .reset_index().sort_values("mean_elo", ascending=False))
+
+
+def score_replay(results: Results, pre: pd.DataFrame, burn_in: int = 0) -> dict:
+    """Brier score of the Elo expectation and RMSE of the Pi goal difference, after ``burn_in`` matches."""
+    s = slice(burn_in, None)
+    return {
+        "elo_brier": float(np.mean((pre["elo_expected"].to_numpy()[s] - results.score[s]) ** 2)),
+        "pi_rmse": float(np.sqrt(np.mean((pre["pi_goal_diff"].to_numpy()[s] - results.goal_diff[s]) ** 2))),
+    }
+
+
+def sweep(results: Results, index: TeamIndex, system: str, grid: Dict[str, list],
+          burn_in: int = 1000) -> pd.DataFrame:
+    """
+    Replay the full history once per combination in ``grid`` (field name -> values of ``EloParams``
+    for ``system="elo"``, of ``PiParams`` for ``"pi"``) and score it. The rounds are computed once and
+    shared, so each configuration costs a single pass of array updates.
+    """
+    params_type, metric = {"elo": (EloParams, "elo_brier"), "pi": (PiParams, "pi_rmse")}[system]
+    rows = []
+    for values in itertools.product(*grid.values()):
+        params = params_type(**dict(zip(grid, values)))
+        started = time.perf_counter()
+        ratings = Ratings(index, **{system: params})
+        scores = score_replay(results, ratings.replay(results), burn_in)
+        rows.append({**asdict(params), metric: scores[metric], "seconds": time.perf_counter() - started})
+    return pd.DataFrame(rows).sort_values(metric).reset_index(drop=True)
+
+
+def save_ratings(conn, ratings: Ratings) -> int:
+    frame = ratings.to_frame()
+    records = frame.astype(object).where(frame.notna(), None).to_dict("records")
+    if records:
+        with conn.begin():
+            conn.execute(_TEAM_RATING_UPSERT, records)
+    return len(records)
+
+
+def build_ratings(gender: str = "men", elo: EloParams = EloParams(), pi: PiParams = PiParams()) -> Ratings:
+    """Replay every played match in date order and store the current ratings in ``team_rating``."""
+    started = time.perf_counter()
+    index = TeamIndex()
+    with get_engine(gender).connect() as conn:
+        with conn.begin():
+            results = load_results(conn, index)
+        ratings = Ratings(index, elo, pi)
+        ratings.replay(results)
+        save_ratings(conn, ratings)
+    logger.info("Rated %d teams from %d matches in %.2fs", len(index), len(results.home),
+                time.perf_counter() - started)
+    return ratings
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Elo and Pi-ratings over the match table")
+    parser.add_argument("--gender", default="men", choices=["men", "women"])
+    parser.add_argument("--sweep", action="store_true", help="Grid-search the rating parameters instead")
+    args = parser.parse_args()
+    if args.sweep:
+        index = TeamIndex()
+        with get_engine(args.gender, profile="readonly").connect() as conn:
+            results = load_results(conn, index)
+        for system, grid in [
+            ("elo", {"k": [10, 15, 20, 30, 40], "home_advantage": [0, 40, 65, 90]}),
+            ("pi", {"lam": [0.02, 0.035, 0.05, 0.07], "gamma": [0.5, 0.7, 0.9]}),
+        ]:
+            print(sweep(results, index, system, grid).to_string(index=False))
+    else:
+        build_ratings(args.gender)
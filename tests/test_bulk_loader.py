@@ -0,0 +1,51 @@
+import sqlite3
+from pathlib import Path
+
+from sqlalchemy import create_engine, text
+
+from src.db import BulkLoader
+
+SCHEMA_SQL = Path(__file__).resolve().parents[1] / "sql" / "01_schema.sql"
+
+
+def _engine(tmp_path):
+    db_path = tmp_path / "men.sqlite"
+    with sqlite3.connect(db_path) as con:
+        con.executescript(SCHEMA_SQL.read_text())
+        # added by init_db's backfill, not by the base schema
+        con.execute("ALTER TABLE match ADD COLUMN home_penalty INTEGER")
+        con.execute("ALTER TABLE match ADD COLUMN away_penalty INTEGER")
+        con.execute("INSERT INTO league (league_id, name) VALUES ('EPL', 'Premier League')")
+    return create_engine(f"sqlite:///{db_path}", future=True)
+
+
+def _counts(engine):
+    with engine.connect() as conn:
+        return tuple(
+            conn.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar_one()
+            for table in ("match", "team_match_stats", "scrape_state")
+        )
+
+
+def _queue_match(loader, match_id):
+    loader.add_team("ars", "Arsenal")
+    loader.add_team("che", "Chelsea")
+    loader.add_match({"match_id": match_id, "league_id": "EPL", "season": "2024-2025", "match_date": "2024-09-01",
+                      "status": "played", "home_team_id": "ars", "away_team_id": "che",
+                      "home_goals": 1, "away_goals": 0})
+    loader.add_team_stats({"match_id": match_id, "team_id": "ars", "is_home": 1})
+    loader.add_team_stats({"match_id": match_id, "team_id": "che", "is_home": 0})
+    loader.add_scrape_state({"key": match_id, "league_id": "EPL", "season": "2024-2025", "status": "done"})
+
+
+def test_a_match_commits_together_with_its_stats_and_ledger_row(tmp_path):
+    engine = _engine(tmp_path)
+    flushed = []
+    with engine.connect() as conn:
+        loader = BulkLoader(conn, batch_size=1, on_flush=flushed.append)
+        for n, match_id in enumerate(["m1", "m2"], start=1):
+            _queue_match(loader, match_id)
+            assert _counts(engine) == (n - 1, 2 * (n - 1), n - 1)  # nothing of the unit written yet
+            loader.end_match()
+            assert _counts(engine) == (n, 2 * n, n)
+    assert flushed == [["m1"], ["m2"]]
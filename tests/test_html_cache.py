@@ -0,0 +1,30 @@
+from html_cache import HtmlCache
+
+URL = "https://fbref.com/en/comps/9/schedule/"
+
+
+def _bodies(root):
+    return sorted(p for p in root.rglob("*.html.*") if not p.name.endswith(".tmp"))
+
+
+def test_reput_with_new_content_drops_the_old_body(tmp_path):
+    cache = HtmlCache(tmp_path)
+    cache.put(URL, "<html>first</html>")
+    cache.put(URL, "<html>second</html>")
+
+    assert len(_bodies(tmp_path)) == 1
+    assert cache.total_size() == sum(p.stat().st_size for p in _bodies(tmp_path))
+    assert cache.get(URL) == "<html>second</html>"
+
+    cache.evict(max_bytes=0)
+    assert _bodies(tmp_path) == []
+
+
+def test_reput_keeps_a_body_shared_with_another_url(tmp_path):
+    cache = HtmlCache(tmp_path)
+    cache.put(URL, "<html>same</html>")
+    cache.put(URL + "?v=2", "<html>same</html>")
+    cache.put(URL, "<html>changed</html>")
+
+    assert cache.get(URL + "?v=2") == "<html>same</html>"
+    assert len(_bodies(tmp_path)) == 2
@@ -0,0 +1,25 @@
+import rate_limiter
+from rate_limiter import RateLimiter
+
+
+def test_waits_after_a_block_are_strictly_increasing(monkeypatch):
+    monkeypatch.setattr(rate_limiter.time, "time", lambda: 1000.0)
+    limiter = RateLimiter(rate=1.0, burst=3.0, cooldown=60.0)
+    limiter.report("fbref.com", 429)
+
+    waits = [limiter.reserve("fbref.com") for _ in range(6)]
+
+    assert waits[0] > 60.0
+    assert all(later > earlier for earlier, later in zip(waits, waits[1:]))
+    # after the cooldown requests are spaced by the backed-off rate (0.5/s), not released as a burst
+    assert [round(b - a, 6) for a, b in zip(waits, waits[1:])] == [2.0] * 5
+
+
+def test_burst_is_free_without_a_block(monkeypatch):
+    monkeypatch.setattr(rate_limiter.time, "time", lambda: 1000.0)
+    limiter = RateLimiter(rate=1.0, burst=3.0)
+
+    waits = [limiter.reserve("fbref.com") for _ in range(4)]
+
+    assert waits[:3] == [0.0, 0.0, 0.0]
+    assert waits[3] == 1.0
@@ -1,30 +1,56 @@
 import json
+import time
 from pathlib import Path
 from functools import lru_cache
-import time
+import requests
 from rapidfuzz import process
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.common.exceptions import NoSuchElementException, TimeoutException
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 import logging
-import re
-
-REQUEST_INTERVAL = 10
-_last_request_time = 0.0
+from driver_pool import get_driver_pool
+from fbref_parser import parse_fixtures_html, parse_league_links_html, parse_season_links_html, \
+    parse_scores_and_fixtures_link
+from freshness import FreshnessPolicy, PAGE_FIXTURES, PAGE_INDEX, PAGE_SEASON
+from html_cache import CacheEntry, HtmlCache, CacheMiss
+from metrics import get_metrics
+from rate_limiter import RateLimiter
+from urllib.parse import urlsplit
+
+REQUESTS_PER_MINUTE = 10  # fbref's published limit for crawlers
+DRIVER_POOL_SIZE = 1
+HTML_CACHE_DIR = Path("data/cache/html")
+RATE_LIMIT_DB = Path("data/cache/rate_limits.sqlite")  # shared by every scraper process on the box
+FRESHNESS_POLICY = FreshnessPolicy()
+USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+              "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/113.0 Safari/537.36")
+_offline = False
+_driver_pool_size = DRIVER_POOL_SIZE
+_html_cache = None
+_rate_limiter = None
 
 logger = logging.getLogger(__name__)
 
 
+def get_rate_limiter() -> RateLimiter:
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter(rate=REQUESTS_PER_MINUTE / 60, state_path=RATE_LIMIT_DB)
+    return _rate_limiter
+
+
 def rate_limited_get(driver, url: str) -> None:
-    global _last_request_time
-    elapsed = time.time() - _last_request_time
-    if elapsed < REQUEST_INTERVAL:
-        time.sleep(REQUEST_INTERVAL - elapsed)
-    driver.get(url)
-    _last_request_time = time.time()
+    host = urlsplit(url).netloc
+    limiter = get_rate_limiter()
+    waited = limiter.acquire(host)
+    get_metrics().observe("rate_limit_wait", waited, url)
+    if waited:
+        logger.debug("Waited %.1fs for the %s rate limit", waited, host)
+    with get_metrics().timer("page_load", url):
+        driver.get(url)
+    # Selenium does not expose the HTTP status, fbref's throttle page is recognisable by its title
+    title = driver.title or ""
+    throttled = "429" in title or "Too Many Requests" in title
+    limiter.report(host, 429 if throttled else 200)
 
 
 def create_driver():
@@ -33,10 +59,108 @@ def create_driver():
     opts.add_argument("--window-size=1920,1080")
     opts.add_argument("--no-sandbox")
     opts.add_argument("--disable-dev-shm-usage")
-    opts.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-        "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/113.0 Safari/537.36"
-    )
-    return webdriver.Chrome(options=opts)
+    opts.add_argument(f"user-agent={USER_AGENT}")
+    with get_metrics().timer("driver_startup"):
+        return webdriver.Chrome(options=opts)
+
+
+def borrow_driver():
+    """Check out a long-lived driver from the shared pool (use as a context manager)."""
+    return get_driver_pool(create_driver, max_size=_driver_pool_size).checkout()
+
+
+def set_driver_pool_size(size: int) -> None:
+    """Number of browsers the pool may start; only has an effect before the first page is fetched."""
+    global _driver_pool_size
+    _driver_pool_size = max(1, size)
+
+
+def get_html_cache() -> HtmlCache:
+    global _html_cache
+    if _html_cache is None:
+        _html_cache = HtmlCache(HTML_CACHE_DIR)
+    return _html_cache
+
+
+def set_offline(offline: bool) -> None:
+    """When offline, pages are served from the HTML cache only and nothing touches the network."""
+    global _offline
+    _offline = offline
+
+
+def _conditional_get(url: str, entry: CacheEntry) -> str | None:
+    """
+    Revalidate a cached page with If-None-Match / If-Modified-Since. Returns the current HTML, or None
+    when the page has no validators or the plain HTTP request did not work out and the browser is needed.
+    """
+    if not (entry.etag or entry.last_modified):
+        return None
+    headers = {"User-Agent": USER_AGENT}
+    if entry.etag:
+        headers["If-None-Match"] = entry.etag
+    if entry.last_modified:
+        headers["If-Modified-Since"] = entry.last_modified
+    host = urlsplit(url).netloc
+    limiter = get_rate_limiter()
+    get_metrics().observe("rate_limit_wait", limiter.acquire(host), url)
+    try:
+        with get_metrics().timer("conditional_get", url):
+            resp = requests.get(url, headers=headers, timeout=20)
+    except requests.RequestException as e:
+        logger.debug("Conditional GET of %s failed: %s", url, e)
+        return None
+    limiter.report(host, resp.status_code)
+    cache = get_html_cache()
+    if resp.status_code == 304:
+        logger.debug("%s not modified", url)
+        get_metrics().incr("cache_not_modified")
+        cache.touch(url)
+        return cache.get(url)
+    if resp.status_code == 200 and resp.text:
+        cache.put(url, resp.text, 200, resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+        return resp.text
+    return None
+
+
+def fetch_page(url: str, page_class: str, rate_limited: bool = True, force: bool = False) -> str:
+    """
+    Return the HTML of ``url``, a page of ``page_class`` (``freshness.PAGE_*``). Online, a cached copy is
+    reused while ``FRESHNESS_POLICY`` considers it fresh (``force`` treats it as stale), a stale copy with
+    validators is revalidated with a conditional GET, and otherwise the page is loaded through a pooled
+    driver and stored in the HTML cache. Offline, it is read back from the cache and ``CacheMiss`` is
+    raised if it was never stored.
+    """
+    max_age = 0 if force else FRESHNESS_POLICY.max_age(page_class, url)
+    cache = get_html_cache()
+    metrics = get_metrics()
+    if _offline:
+        page_html = cache.get(url)
+        if page_html is None:
+            metrics.incr("cache_misses")
+            raise CacheMiss(url)
+        metrics.incr("cache_hits")
+        return page_html
+    entry = cache.lookup(url)
+    if entry is not None:
+        if max_age is None or time.time() - entry.fetched_at <= max_age:
+            page_html = cache.get(url)
+            if page_html is not None:
+                metrics.incr("cache_hits")
+                return page_html
+        page_html = _conditional_get(url, entry)
+        if page_html is not None:
+            return page_html
+    metrics.incr("cache_misses")
+    # Selenium does not expose response headers, so pages loaded here are stored without validators
+    with borrow_driver() as driver:
+        if rate_limited:
+            rate_limited_get(driver, url)
+        else:
+            with metrics.timer("page_load", url):
+                driver.get(url)
+        page_html = driver.page_source
+    cache.put(url, page_html)
+    return page_html
 
 
 # mapping official fbref competition names to short aliases
@@ -138,39 +262,17 @@ def save_cache(data: dict, cache_file: Path) -> None:
     cache_file.write_text(json.dumps(data))
 
 
-def scrape_league_links():
-    url = "https://fbref.com/en/comps/"
-    driver = create_driver()
-    driver.get(url)
-
-    men_league_dict, women_league_dict = {}, {}  # return 2 empty dictionaries
-
-    for table_id in ['comps_1_fa_club_league_senior', 'comps_2_fa_club_league_senior']:
-        try:
-            table = driver.find_element(By.ID, table_id)
-        except NoSuchElementException:
-            continue
-
-        rows = table.find_elements(By.CSS_SELECTOR, "tbody tr")
-        for row in rows:
-            cols = row.find_elements(By.TAG_NAME, "td")
-            headers = row.find_elements(By.TAG_NAME, "th")
-            if not cols or not headers:
-                continue
-            gender = cols[0].text.strip()
+def cache_is_fresh(cache_file: Path, page_class: str, season: str | None = None, data=None) -> bool:
+    """Whether a JSON link cache can be used as is; its mtime is the time it was scraped."""
+    if _offline:
+        return True  # nothing to refresh from
+    return FRESHNESS_POLICY.is_fresh(page_class, cache_file.stat().st_mtime, season, data)
 
-            try:
-                link_tag = headers[0].find_element(By.TAG_NAME, "a")
-            except NoSuchElementException:
-                continue
 
-            league_name = link_tag.text.strip()
-            league_url = link_tag.get_attribute("href")
-            target = men_league_dict if gender == 'M' else women_league_dict
-            target[league_name] = {"url": league_url, "gender": gender}
-
-    driver.quit()
-    return men_league_dict, women_league_dict
+def scrape_league_links():
+    url = "https://fbref.com/en/comps/"
+    page_html = fetch_page(url, PAGE_INDEX, rate_limited=False)
+    return parse_league_links_html(page_html)  # (men, women) league dictionaries
 
 
 @lru_cache(maxsize=32)  # Caches the result in memory for 32 different league scrapes
@@ -180,7 +282,7 @@ def get_league_links(cache_file: str):
     """
     path = Path(cache_file)
     data = load_cache(path)
-    if not data:  # if cache is empty, scrape league URLs
+    if not data or not cache_is_fresh(path, PAGE_INDEX):  # if cache is empty or stale, scrape league URLs
         data = scrape_league_links()
         save_cache(data, path)
     return data
@@ -206,23 +308,8 @@ def scrape_season_links(league_url: str) -> dict:
     """
     function to scrape league links from fbref's main competitions page
     """
-    driver = create_driver()
-    driver.get(league_url)
-    seasons_dict = {}
-    try:
-        table = driver.find_element(By.ID, 'seasons')
-        rows = table.find_elements(By.CSS_SELECTOR, 'tbody th')
-        for row in rows:
-            try:
-                link = row.find_element(By.TAG_NAME, 'a')
-                seasons_dict[link.text.strip()] = link.get_attribute('href')
-            except NoSuchElementException:
-                continue
-    except NoSuchElementException:
-        pass
-    finally:
-        driver.quit()
-    return seasons_dict
+    page_html = fetch_page(league_url, PAGE_INDEX, rate_limited=False)
+    return parse_season_links_html(page_html)
 
 
 @lru_cache(maxsize=64)
@@ -232,117 +319,36 @@ def get_season_links(cache_file: str, league_url: str) -> dict:
     """
     path = Path(cache_file)
     data = load_cache(path)
-    if not data:
+    if not data or not cache_is_fresh(path, PAGE_INDEX):
         data = scrape_season_links(league_url)
         save_cache(data, path)
     return data
 
 
 def scrape_match_links(fixtures_url: str):
-    """Scrape match info from a Scores & Fixtures page."""
+    """Scrape match info from a Scores & Fixtures page, refetching it once a cached copy misses results that are due."""
     logger.debug("Fetching fixtures from %s", fixtures_url)
-    driver = create_driver()
-    fixtures = []
-    try:
-        rate_limited_get(driver, fixtures_url)
-        try:
-            table = WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located(
-                    (
-                        By.XPATH,
-                        "//table[contains(@id,'sched')][.//th[@data-stat='home_team']]",
-                    )
-                )
-            )
-        except TimeoutException:
-            logger.warning("No fixtures table found at %s", fixtures_url)
-            return fixtures
-        rows = table.find_elements(
-            By.XPATH,
-            ".//tbody/tr[not(contains(@class,'spacer')) and not(contains(@class,'thead'))]",
-        )
-        for row in rows:
-            try:
-                date_cell = row.find_element(By.XPATH, "./*[@data-stat='date']")
-            except NoSuchElementException:
-                continue
-            match_date = date_cell.text.strip()
-            if not match_date:
-                continue
-            home = row.find_element(By.XPATH, "./*[@data-stat='home_team']").text.strip()
-            away = row.find_element(By.XPATH, "./*[@data-stat='away_team']").text.strip()
-            try:
-                score_text = row.find_element(By.XPATH, "./*[@data-stat='score']").text.strip()
-                if score_text:
-                    parts = re.split(r"[-–—]", score_text)
-                    if len(parts) >= 2:
-                        try:
-                            home_g, away_g = int(parts[0]), int(parts[1])
-                        except ValueError:
-                            logger.warning(
-                                "Invalid score numbers '%s' for %s vs %s",
-                                score_text,
-                                home,
-                                away,
-                            )
-                            home_g = away_g = None
-                    else:
-                        logger.warning(
-                            "Unexpected score format '%s' for %s vs %s",
-                            score_text,
-                            home,
-                            away,
-                        )
-                        home_g = away_g = None
-                else:
-                    home_g = away_g = None
-            except NoSuchElementException:
-                home_g = away_g = None
-            report_links = row.find_elements(
-                By.XPATH, "./*[@data-stat='match_report']//a"
-            )
-            report_url = (
-                report_links[0].get_attribute("href") if report_links else None
-            )
-            fixtures.append(
-                {
-                    "date": match_date,
-                    "home": home,
-                    "away": away,
-                    "home_g": int(home_g) if home_g is not None else None,
-                    "away_g": int(away_g) if away_g is not None else None,
-                    "url": report_url,
-                }
-            )
-    finally:
-        driver.quit()
+    fixtures = parse_fixtures_html(fetch_page(fixtures_url, PAGE_FIXTURES))
+    entry = get_html_cache().lookup(fixtures_url)
+    if not _offline and entry is not None and not FRESHNESS_POLICY.is_fresh(
+            PAGE_FIXTURES, entry.fetched_at, fixtures_url, fixtures):
+        fixtures = parse_fixtures_html(fetch_page(fixtures_url, PAGE_FIXTURES, force=True))
     logger.info("Parsed %d fixtures from %s", len(fixtures), fixtures_url)
     return fixtures
 
 
 @lru_cache(maxsize=512)
 def get_match_links(cache_file: str, fixtures_url: str):
-    """Return cached match info for a season."""
+    """Return cached match info for a season, refreshed as ``FRESHNESS_POLICY`` requires."""
     path = Path(cache_file)
     data = load_cache(path)
-    if not data:
+    if not data or not cache_is_fresh(path, PAGE_FIXTURES, fixtures_url, data):
         data = scrape_match_links(fixtures_url)
         save_cache(data, path)
     return data
 
 
 def get_scores_and_fixtures_url(competition_url: str):
-    driver = create_driver()
-    rate_limited_get(driver, competition_url)
-    try:
-        inner_nav = driver.find_element(By.ID, 'inner_nav')
-        link = inner_nav.find_element(By.LINK_TEXT, "Scores & Fixtures")
-        return link.get_attribute('href')
-    except NoSuchElementException:
-        return None
-    finally:
-        driver.quit()
-
-
-
-
+    # past seasons' pages never change, so any cached copy will do
+    page_html = fetch_page(competition_url, PAGE_SEASON)
+    return parse_scores_and_fixtures_link(page_html)